@@ -2,13 +2,42 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import joblib
-import matplotlib.pyplot as plt
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
 import time
-import base64
+import io
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from forecasting.assets import STATIC_DIR, build_image, data_uri, minify_css, static_url
+from forecasting.baseline import baseline_forecast, county_arrays
+from forecasting.compact import compact_forest
+from forecasting.database import ForecastDatabase
+from forecasting.downsample import downsample, linear_trend, point_budget
+from forecasting.drift import DriftMonitor
+from forecasting.engine import (
+    DEFAULT_HORIZON,
+    MAX_HORIZON,
+    ForecastCache,
+    add_predict_observer,
+    cached_forecasts,
+    file_fingerprint,
+    forecast_frame,
+    throttled,
+)
+from forecasting.explain import FEATURE_LABELS, TreeExplainer, explain_forecast, explainable_forest
+from forecasting.export import COLUMNS as EXPORT_COLUMNS, FORMATS as EXPORT_FORMATS, export_file, forecast_chunks, frame_chunks
+from forecasting.feedback import FeedbackWriter
+from forecasting.hierarchy import METHODS as RECONCILE_METHODS, NATIONAL, county_shares, reconciled_forecast, state_county_seeds
+from forecasting.metrics import AppMetrics, serve as serve_metrics, start_file_writer
+from forecasting.multitarget import BEV, PHEV, breakdown_frame, breakdown_outputs
+from forecasting.prefetch import ForecastPrefetcher
+from forecasting.registry import ModelRegistry, RegistryWatcher
+from forecasting.profiling import Profiler, configure_perf_log
+from forecasting.scenarios import BASELINE, PRESETS, Scenario, forecast_scenarios
+from forecasting.simulation import fan_percentiles, simulate
+from forecasting.store import load_store
+from forecasting.zoo import ModelZoo
 
 # Set Streamlit page config first thing
 st.set_page_config(
@@ -25,27 +54,99 @@ st.set_page_config(
 
 # Get the directory where the script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
+# EV_FORECASTER_MODEL can point at a compact artifact from forecasting.compact
+model_path = os.environ.get("EV_FORECASTER_MODEL", os.path.join(script_dir, "forecasting_ev_model.pkl"))
+data_path = os.path.join(script_dir, "preprocessed_ev_data.csv")
+# Versioned model directory from forecasting.registry; when set, new versions
+# are loaded in the background and swapped in without a restart
+registry_dir = os.environ.get("EV_FORECASTER_REGISTRY")
+# BEV/PHEV breakdown forest from forecasting.multitarget; the breakdown section is hidden without it
+breakdown_path = os.environ.get(
+    "EV_FORECASTER_BREAKDOWN_MODEL", os.path.join(script_dir, "forecasting_ev_breakdown.pkl")
+)
+# Drift state from forecasting.drift; alerts are shown when it exists
+drift_state_path = os.environ.get("EV_FORECASTER_DRIFT_STATE", os.path.join(script_dir, "drift_monitor.json"))
+# Indexed SQLite copy of the dataset from forecasting.database, loaded once per data version
+database_path = os.environ.get("EV_FORECASTER_DB", os.path.join(script_dir, "ev_forecaster.sqlite"))
 
 # Initialize session state for theme
 if 'theme' not in st.session_state:
     st.session_state.theme = 'dark'
 
-# === Load model with progress bar ===
+# === Performance instrumentation ===
+# Spans are only recorded when an admin token is configured; the panel is shown
+# to sessions opened with ?admin=<token>.
+admin_token = os.environ.get("EV_FORECASTER_ADMIN_TOKEN")
+show_perf_panel = bool(admin_token) and st.query_params.get("admin") == admin_token
+
+@st.cache_resource
+def get_profiler():
+    profiler = Profiler(enabled=bool(admin_token))
+    if profiler.enabled:
+        add_predict_observer(profiler.observe_predict)
+        perf_log_path = os.environ.get("EV_FORECASTER_PERF_LOG")
+        if perf_log_path:
+            configure_perf_log(perf_log_path)
+    return profiler
+
+profiler = get_profiler()
+rerun_started = time.perf_counter()
+
+# === Metrics export ===
+# Enabled by EV_FORECASTER_METRICS_PORT (HTTP /metrics) and/or
+# EV_FORECASTER_METRICS_FILE (rewritten every 15 seconds)
 @st.cache_resource
-def load_model():
-    model_path = os.path.join(script_dir, "forecasting_ev_model.pkl")
-    return joblib.load(model_path)
+def get_metrics():
+    port = os.environ.get("EV_FORECASTER_METRICS_PORT")
+    path = os.environ.get("EV_FORECASTER_METRICS_FILE")
+    if not port and not path:
+        return None
+    metrics = AppMetrics(get_forecast_cache())
+    add_predict_observer(metrics.observe_predict)
+    if port:
+        serve_metrics(metrics, int(port), host=os.environ.get("EV_FORECASTER_METRICS_HOST", "127.0.0.1"))
+    if path:
+        start_file_writer(metrics, path)
+    return metrics
 
-with st.spinner('🤖 Loading AI model...'):
-    model = load_model()
+@st.cache_resource
+def get_forecast_cache():
+    return ForecastCache(max_entries=128)
+
+metrics = get_metrics()
 
-# Helper function for base64 encoding
-def get_image_base64(image_path):
+# === Start loading the model in the background ===
+# Unpickling the forest (and importing sklearn with it) is the slowest part of
+# a cold start, so it runs while the page and the data load; the result is
+# only awaited where the model is first needed.
+@st.cache_resource
+def get_model_watcher():
+    watcher = RegistryWatcher(ModelRegistry(registry_dir))
+    forecast_cache = get_forecast_cache()
+    # Forecasts of the replaced version are never requested again
+    watcher.on_switch(lambda old, new: forecast_cache.invalidate(f"{old}-"))
+    return watcher
+
+@st.cache_resource
+def get_model_loader():
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
     try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except:
-        return ""
+        if registry_dir:
+            return loader.submit(get_model_watcher().start)
+        return loader.submit(joblib.load, model_path)
+    finally:
+        # The submitted load still runs; its thread exits once it finishes or fails
+        loader.shutdown(wait=False)
+
+model_loader = get_model_loader()
+
+@st.cache_resource
+def hero_image_src(fingerprint, image_path):
+    # Resized and recompressed once; referenced by URL when static serving is on
+    path = build_image(image_path, os.path.join(script_dir, STATIC_DIR))
+    if st.get_option("server.enableStaticServing"):
+        return static_url(path)
+    return data_uri(path)
 
 # === Advanced Styling with Theme Support ===
 def get_theme_colors():
@@ -81,7 +182,10 @@ def get_theme_colors():
 colors = get_theme_colors()
 
 # Enhanced CSS with animations and responsiveness
-st.markdown(f"""
+@st.cache_data(max_entries=2)
+def render_css(colors):
+    # Rendered and minified once per theme rather than on every rerun
+    return minify_css(f"""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
     
@@ -322,7 +426,10 @@ st.markdown(f"""
         outline-offset: 2px;
     }}
 </style>
-""", unsafe_allow_html=True)
+""")
+
+with profiler.span("css_injection"):
+    st.markdown(render_css(colors), unsafe_allow_html=True)
 
 # === Sticky Header with Navigation ===
 st.markdown(f"""
@@ -363,6 +470,13 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # === Sidebar for Controls ===
+# Label -> forecasting.baseline method (None is the Random Forest)
+FORECAST_ENGINES = {
+    "🌲 Random Forest": None,
+    "📉 Damped trend": "damped",
+    "📈 Log-linear growth": "loglinear",
+}
+
 with st.sidebar:
     st.markdown(f"""
     <div style="text-align: center; padding: 1rem;">
@@ -383,6 +497,32 @@ with st.sidebar:
     
     st.markdown("---")
     
+    # Forecast engine
+    st.markdown("### 🧮 Forecast Engine")
+    forecast_engine = st.radio(
+        "Forecast engine",
+        list(FORECAST_ENGINES),
+        label_visibility="collapsed",
+        help="The statistical baselines are fitted for every county at once and are near-instant; "
+             "scenarios and the uncertainty fan always use the Random Forest",
+        key="forecast_engine"
+    )
+
+    # Forecast horizon
+    st.markdown("### 🗓️ Forecast Horizon")
+    forecast_years = st.slider(
+        "Forecast horizon (years)",
+        1, MAX_HORIZON // 12, DEFAULT_HORIZON // 12,
+        label_visibility="collapsed",
+        format="%d years",
+        help="Each month is predicted from the previous ones, so longer horizons are less certain",
+        key="forecast_years"
+    )
+    forecast_horizon = forecast_years * 12
+    horizon_label = f"{forecast_years} year" + ("s" if forecast_years > 1 else "")
+    
+    st.markdown("---")
+    
     # Navigation menu
     st.markdown("### 📍 Quick Navigation")
     if st.button("🏠 Home", use_container_width=True):
@@ -422,7 +562,7 @@ with image_container:
         image_path = os.path.join(script_dir, "ev-car-factory.jpg")
         st.markdown(f"""
         <div style="position: relative; border-radius: 20px; overflow: hidden; margin: 2rem 0;">
-            <img src="data:image/jpeg;base64,{get_image_base64(image_path)}" 
+            <img src="{hero_image_src(file_fingerprint(image_path), image_path)}" 
                  style="width: 100%; height: 300px; object-fit: cover; filter: brightness(0.7);">
             <div style="position: absolute; top: 50%; left: 50%; transform: translate(-50%, -50%); 
                         text-align: center; color: white; z-index: 2;">
@@ -447,13 +587,15 @@ with image_container:
 # === Enhanced Data Loading with Progress ===
 @st.cache_data
 def load_data():
-    data_path = os.path.join(script_dir, "preprocessed_ev_data.csv")
+    load_started = time.perf_counter()
     try:
         # Load data with error handling and memory optimization
         df = pd.read_csv(data_path, low_memory=False, encoding='utf-8')
         df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
         # Remove any rows with invalid dates
         df = df.dropna(subset=['Date'])
+        if metrics is not None:
+            metrics.observe_dataset_load(time.perf_counter() - load_started)
         return df
     except pd.errors.ParserError as e:
         st.error(f"Error loading data: {e}")
@@ -474,7 +616,8 @@ def load_data():
 progress_container = st.container()
 with progress_container:
     with st.spinner('📊 Loading county data...'):
-        df = load_data()
+        with profiler.span("data_load"):
+            df = load_data()
     
     # Check if data loaded successfully
     if df.empty:
@@ -491,6 +634,117 @@ with progress_container:
         else:
             st.success(f"✅ Loaded data for {len(unique_counties)} counties", icon="🎉")
 
+# === Shared background prefetcher ===
+@st.cache_resource
+def load_seeds(fingerprint, _df):
+    # Persisted per dataset version, so later starts skip the per-county pandas work
+    store = load_store(data_path, read_data=lambda path: _df)
+    return store, store.states()
+
+@st.cache_resource(max_entries=8)
+def load_baseline_forecasts(fingerprint, method, horizon, _df, _seeds):
+    counties, values = county_arrays(_df)
+    preds = baseline_forecast(values, method, horizon)
+    return {c: forecast_frame(_seeds[c], row) for c, row in zip(counties, preds)}
+
+def engine_forecasts(counties, progress=None, partial=None):
+    """Forecast frames for ``counties`` from the engine picked in the sidebar."""
+    method = FORECAST_ENGINES[forecast_engine]
+    if method is None:
+        return cached_forecasts(
+            model, forecast_cache, fingerprint, seeds, counties, forecast_horizon,
+            progress=progress, metrics=metrics, partial=partial,
+        )
+    frames = load_baseline_forecasts(fingerprint, method, forecast_horizon, df, seeds)
+    return {c: frames[c].copy() for c in counties}
+
+@st.cache_resource(max_entries=2)
+def load_array_model(fingerprint, _model):
+    # Exact flat-array copy of the forest: same predictions, far cheaper per
+    # predict call, which keeps slider updates and simulations interactive
+    if hasattr(_model, "estimators_"):
+        return compact_forest(_model)
+    return _model
+
+@st.cache_data(max_entries=64)
+def load_fan(fingerprint, county, horizon, n_paths, _forest, _seed):
+    # Seeded per county so the bands don't shift between reruns
+    paths = simulate(_forest, [_seed], n_paths, horizon, random_state=int(_seed["county_code"]))
+    return {p: values[0] for p, values in fan_percentiles(paths).items()}
+
+@st.cache_resource
+def get_prefetcher():
+    # One thread pool for the process; new model or data versions are retargeted onto it
+    return ForecastPrefetcher(None, {}, {}, get_forecast_cache(), None)
+
+@st.cache_resource
+def warm_up_new_versions(fingerprint, _watcher, _seeds, _prefetcher):
+    data_fingerprint = file_fingerprint(data_path)
+
+    def prepare(new_model, new_model_fingerprint):
+        # Forecast the most requested counties before the new version goes live
+        cached_forecasts(
+            new_model, get_forecast_cache(), f"{new_model_fingerprint}-{data_fingerprint}",
+            _seeds, _prefetcher.top_counties(), DEFAULT_HORIZON,
+        )
+    _watcher.prepare = prepare
+
+# === Wait for the model ===
+with st.spinner('🤖 Loading AI model...'):
+    with profiler.span("model_load"):
+        try:
+            loaded = model_loader.result()
+        except Exception:
+            # Don't cache a failed load; the next rerun starts a new one
+            get_model_loader.clear()
+            raise
+        if registry_dir:
+            model_version, model_fingerprint, model = loaded.active()
+        else:
+            model = loaded
+            model_fingerprint = file_fingerprint(model_path)
+
+# Every forecast cache is keyed by this, so a new model or dataset never hits stale entries
+fingerprint = f"{model_fingerprint}-{file_fingerprint(data_path)}"
+forecast_cache = get_forecast_cache()
+seeds, county_states = load_seeds(file_fingerprint(data_path), df)
+
+@st.cache_resource(max_entries=2)
+def get_database(fingerprint, model_fingerprint):
+    # Loads the dataset only when its version changed since the last start
+    database = ForecastDatabase(database_path)
+    database.sync_history(data_path)
+    database.record_model(model_fingerprint, registry_dir or model_path)
+    return database
+
+@st.cache_resource
+def get_feedback_writer():
+    # One background writer for all sessions; submissions are batched into the feedback table
+    return FeedbackWriter(ForecastDatabase(database_path))
+
+with profiler.span("database_sync"):
+    database = get_database(fingerprint, model_fingerprint)
+
+prefetcher = get_prefetcher()
+prefetcher.retarget(model, seeds, county_states, fingerprint)
+if registry_dir:
+    warm_up_new_versions(fingerprint, get_model_watcher(), seeds, prefetcher)
+
+# === Drift alerts ===
+@st.cache_data(max_entries=4)
+def load_drift_alerts(fingerprint, state_fingerprint, _df, _model):
+    # Only rows newer than the saved watermark are folded in; the saved state is left to the CLIs
+    monitor = DriftMonitor.load(drift_state_path)
+    monitor.update(_df, _model)
+    return monitor.alerts()
+
+if os.path.exists(drift_state_path):
+    drift_alerts = load_drift_alerts(fingerprint, file_fingerprint(drift_state_path), df, model)
+    if drift_alerts:
+        with st.expander(f"🩺 Data drift: {len(drift_alerts)} feature(s) outside the training distribution"):
+            for message in drift_alerts:
+                st.warning(message, icon="⚠️")
+
 # Initialize session state
 if 'active_section' not in st.session_state:
     st.session_state.active_section = 'single'
@@ -510,7 +764,7 @@ st.markdown(f"""
         </div>
     </h3>
     <p style="color: {colors['text_secondary']}; margin-bottom: 1.5rem;">
-        Select a county to analyze EV adoption trends and view 3-year forecasts powered by machine learning.
+        Select a county to analyze EV adoption trends and view forecasts of up to {MAX_HORIZON // 12} years powered by machine learning.
     </p>
 </div>
 """, unsafe_allow_html=True)
@@ -550,13 +804,17 @@ if county not in df["County"].unique():
 else:
     # Show toast notification for successful selection
     st.toast(f"✅ {county} County selected!", icon="🎯")
+    # Count each new selection once, not every rerun, for prefetch popularity
+    if st.session_state.get('last_selected_county') != county:
+        st.session_state.last_selected_county = county
+        prefetcher.record_selection(county)
 
 # === Enhanced Forecasting Section ===
 st.markdown("---")
 
 # Data preparation
-county_df = df[df["County"] == county].sort_values("Date")
-county_code = county_df["county_encoded"].iloc[0]
+with profiler.span("county_filter"):
+    county_df = database.county_history(county)
 
 # Display current county statistics in an enhanced card
 current_stats_col1, current_stats_col2, current_stats_col3, current_stats_col4 = st.columns(4)
@@ -607,7 +865,7 @@ st.markdown(f"""
         </div>
     </h3>
     <p style="color: {colors['text_secondary']};">
-        Generating 36-month forecast using advanced time series analysis...
+        Generating {forecast_horizon}-month forecast using advanced time series analysis...
     </p>
 </div>
 """, unsafe_allow_html=True)
@@ -615,67 +873,51 @@ st.markdown(f"""
 # Forecasting logic with progress bar
 forecast_progress = st.progress(0)
 forecast_status = st.empty()
-
-historical_ev = list(county_df["Electric Vehicle (EV) Total"].values[-6:])
-cumulative_ev = list(np.cumsum(historical_ev))
-months_since_start = county_df["months_since_start"].max()
-latest_date = county_df["Date"].max()
-
-future_rows = []
-forecast_horizon = 36
-
-for i in range(1, forecast_horizon + 1):
-    # Update progress
-    progress = i / forecast_horizon
-    forecast_progress.progress(progress)
-    forecast_status.text(f"🔄 Forecasting month {i}/{forecast_horizon}...")
-    
-    forecast_date = latest_date + pd.DateOffset(months=i)
-    months_since_start += 1
-    lag1, lag2, lag3 = historical_ev[-1], historical_ev[-2], historical_ev[-3]
-    roll_mean = np.mean([lag1, lag2, lag3])
-    pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-    pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-    recent_cumulative = cumulative_ev[-6:]
-    ev_growth_slope = (
-        np.polyfit(range(len(recent_cumulative)), recent_cumulative, 1)[0]
-        if len(recent_cumulative) == 6
-        else 0
+forecast_preview = st.empty()
+
+def show_forecast_progress(step, horizon):
+    forecast_progress.progress(step / horizon)
+    forecast_status.text(f"🔄 Forecasting month {step}/{horizon}...")
+
+def show_forecast_preview(frames):
+    # Cumulative line of the months forecast so far, redrawn as each year finishes
+    partial = frames[county]
+    base = county_df["Electric Vehicle (EV) Total"].sum()
+    preview = go.Figure(go.Scatter(
+        x=partial["Date"], y=base + partial["Predicted EV Total"].cumsum(),
+        mode='lines', line=dict(color=colors['secondary'], width=3, dash='dash'),
+        name='🔮 AI Forecast'
+    ))
+    preview.update_layout(
+        title=f"🔮 {len(partial)} of {forecast_horizon} months forecast",
+        font=dict(color=colors['text']), height=300,
+        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(range=[partial["Date"].iloc[0], latest_date + pd.DateOffset(months=forecast_horizon)])
     )
+    forecast_preview.plotly_chart(preview, use_container_width=True)
 
-    new_row = {
-        "months_since_start": months_since_start,
-        "county_encoded": county_code,
-        "ev_total_lag1": lag1,
-        "ev_total_lag2": lag2,
-        "ev_total_lag3": lag3,
-        "ev_total_roll_mean_3": roll_mean,
-        "ev_total_pct_change_1": pct_change_1,
-        "ev_total_pct_change_3": pct_change_3,
-        "ev_growth_slope": ev_growth_slope,
-    }
-
-    pred = model.predict(pd.DataFrame([new_row]))[0]
-    future_rows.append({"Date": forecast_date, "Predicted EV Total": round(pred)})
-
-    historical_ev.append(pred)
-    if len(historical_ev) > 6:
-        historical_ev.pop(0)
-
-    cumulative_ev.append(cumulative_ev[-1] + pred)
-    if len(cumulative_ev) > 6:
-        cumulative_ev.pop(0)
+# Served from the shared cache when this county was already forecast or prefetched
+with profiler.span("forecast"):
+    forecast_df = engine_forecasts(
+        [county], progress=throttled(show_forecast_progress), partial=show_forecast_preview
+    )[county]
 
 # Clear progress indicators
 forecast_progress.empty()
+forecast_preview.empty()
 forecast_status.success("✅ Forecast complete! Generating interactive visualizations...")
 
+# Warm the cache for the counties likely to be picked next
+# Only replaces this session's previous prefetch, never another user's
+if 'prefetch_session' not in st.session_state:
+    st.session_state.prefetch_session = uuid.uuid4().hex
+prefetcher.schedule(county, forecast_horizon, session=st.session_state.prefetch_session)
+
 # === Enhanced Data Preparation for Visualization ===
 historical_cum = county_df[["Date", "Electric Vehicle (EV) Total"]].copy()
 historical_cum["Source"] = "Historical"
 historical_cum["Cumulative EV"] = historical_cum["Electric Vehicle (EV) Total"].cumsum()
 
-forecast_df = pd.DataFrame(future_rows)
 forecast_df["Source"] = "Forecast"
 forecast_df["Cumulative EV"] = (
     forecast_df["Predicted EV Total"].cumsum()
@@ -691,6 +933,16 @@ combined = pd.concat(
 )
 
 # === Interactive Plotly Visualization ===
+# Points per trace: the forecast chart fills 3/4 of a wide page, the comparison all of it
+CHART_POINTS = point_budget(1200)
+COMPARISON_POINTS = point_budget(1600)
+
+
+@st.cache_data(max_entries=64)
+def fit_trend(fingerprint, county, horizon, engine, _values):
+    return linear_trend(_values)
+
+
 st.markdown("---")
 chart_col1, chart_col2 = st.columns([3, 1])
 
@@ -703,86 +955,179 @@ with chart_col2:
     show_historical = st.checkbox("📈 Show Historical", value=True, help="Display historical data")
     show_forecast = st.checkbox("🔮 Show Forecast", value=True, help="Display forecast data")
     show_trend = st.checkbox("📉 Show Trend Line", value=True, help="Display trend line")
+    # Trajectories sample individual trees, so the fan needs a single forest
+    show_fan = st.checkbox(
+        "🎲 Show Uncertainty Fan", value=False,
+        help="Shade the 50% and 90% ranges of 500 simulated forecast trajectories",
+        disabled=isinstance(model, ModelZoo)
+    )
     chart_height = st.slider("📏 Chart Height", 400, 800, 600, help="Adjust chart height")
     
     st.markdown("</div>", unsafe_allow_html=True)
 
 with chart_col1:
     # Create interactive Plotly chart
-    fig = go.Figure()
+    with profiler.span("figure_build"):
+        fig = go.Figure()
     
-    if show_historical:
-        historical_data = combined[combined["Source"] == "Historical"]
-        fig.add_trace(go.Scatter(
-            x=historical_data["Date"],
-            y=historical_data["Cumulative EV"],
-            mode='lines+markers',
-            name='📊 Historical Data',
-            line=dict(color=colors['primary'], width=3),
-            marker=dict(size=6, color=colors['primary']),
-            hovertemplate='<b>%{fullData.name}</b><br>Date: %{x}<br>EVs: %{y:,}<extra></extra>'
-        ))
+        if show_fan:
+            with profiler.span("simulation"):
+                fan = load_fan(
+                    fingerprint, county, forecast_horizon, 500,
+                    load_array_model(fingerprint, model), seeds[county],
+                )
+            fan_base = historical_cum["Cumulative EV"].iloc[-1]
+            fan_rgb = ", ".join(str(int(colors['secondary'][i:i + 2], 16)) for i in (1, 3, 5))
+            for low, high, opacity, label in [(5, 95, 0.12, "90% range"), (25, 75, 0.25, "50% range")]:
+                fig.add_trace(go.Scatter(
+                    x=forecast_df["Date"], y=fan_base + fan[high],
+                    mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+                ))
+                fig.add_trace(go.Scatter(
+                    x=forecast_df["Date"], y=fan_base + fan[low],
+                    mode='lines', line=dict(width=0), fill='tonexty',
+                    fillcolor=f"rgba({fan_rgb}, {opacity})", name=f'🎲 {label}',
+                    hovertemplate=f'<b>{label}</b><br>Date: %{{x}}<br>EVs: %{{y:,.0f}}<extra></extra>'
+                ))
     
-    if show_forecast:
-        forecast_data = combined[combined["Source"] == "Forecast"]
-        fig.add_trace(go.Scatter(
-            x=forecast_data["Date"],
-            y=forecast_data["Cumulative EV"],
-            mode='lines+markers',
-            name='🔮 AI Forecast',
-            line=dict(color=colors['secondary'], width=3, dash='dash'),
-            marker=dict(size=6, color=colors['secondary']),
-            hovertemplate='<b>%{fullData.name}</b><br>Date: %{x}<br>Predicted EVs: %{y:,}<extra></extra>'
-        ))
+        if show_historical:
+            historical_data = downsample(combined[combined["Source"] == "Historical"], "Date", "Cumulative EV", CHART_POINTS)
+            fig.add_trace(go.Scatter(
+                x=historical_data["Date"],
+                y=historical_data["Cumulative EV"],
+                mode='lines+markers',
+                name='📊 Historical Data',
+                line=dict(color=colors['primary'], width=3),
+                marker=dict(size=6, color=colors['primary']),
+                hovertemplate='<b>%{fullData.name}</b><br>Date: %{x}<br>EVs: %{y:,}<extra></extra>'
+            ))
     
-    if show_trend:
-        # Add trend line
-        x_trend = list(range(len(combined)))
-        y_trend = combined["Cumulative EV"].values
-        z = np.polyfit(x_trend, y_trend, 1)
-        p = np.poly1d(z)
-        
-        fig.add_trace(go.Scatter(
-            x=combined["Date"],
-            y=p(x_trend),
-            mode='lines',
-            name='📈 Trend Line',
-            line=dict(color=colors['warning'], width=2, dash='dot'),
-            hovertemplate='<b>Trend Line</b><br>Date: %{x}<br>Trend: %{y:,}<extra></extra>'
-        ))
+        if show_forecast:
+            forecast_data = downsample(combined[combined["Source"] == "Forecast"], "Date", "Cumulative EV", CHART_POINTS)
+            fig.add_trace(go.Scatter(
+                x=forecast_data["Date"],
+                y=forecast_data["Cumulative EV"],
+                mode='lines+markers',
+                name='🔮 AI Forecast',
+                line=dict(color=colors['secondary'], width=3, dash='dash'),
+                marker=dict(size=6, color=colors['secondary']),
+                hovertemplate='<b>%{fullData.name}</b><br>Date: %{x}<br>Predicted EVs: %{y:,}<extra></extra>'
+            ))
     
-    # Update layout with theme colors
-    fig.update_layout(
-        title=f"🔮 EV Adoption Forecast - {county} County",
-        title_font=dict(size=20, color=colors['text']),
-        xaxis_title="Date",
-        yaxis_title="Cumulative EV Count",
-        font=dict(color=colors['text']),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        height=chart_height,
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        xaxis=dict(
-            gridcolor=colors['text_secondary'],
-            gridwidth=1,
-            griddash='dot'
-        ),
-        yaxis=dict(
-            gridcolor=colors['text_secondary'],
-            gridwidth=1,
-            griddash='dot'
+        if show_trend:
+            # Fitted once per county, engine and model version; drawn at the kept positions
+            slope, intercept = fit_trend(
+                fingerprint, county, forecast_horizon, forecast_engine, combined["Cumulative EV"].to_numpy()
+            )
+            trend_points = downsample(combined, "Date", "Cumulative EV", CHART_POINTS)
+
+            fig.add_trace(go.Scatter(
+                x=trend_points["Date"],
+                y=intercept + slope * trend_points.index.to_numpy(),
+                mode='lines',
+                name='📈 Trend Line',
+                line=dict(color=colors['warning'], width=2, dash='dot'),
+                hovertemplate='<b>Trend Line</b><br>Date: %{x}<br>Trend: %{y:,}<extra></extra>'
+            ))
+    
+        # Update layout with theme colors
+        fig.update_layout(
+            title=f"🔮 EV Adoption Forecast - {county} County",
+            title_font=dict(size=20, color=colors['text']),
+            xaxis_title="Date",
+            yaxis_title="Cumulative EV Count",
+            font=dict(color=colors['text']),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=chart_height,
+            hovermode='x unified',
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            ),
+            xaxis=dict(
+                gridcolor=colors['text_secondary'],
+                gridwidth=1,
+                griddash='dot'
+            ),
+            yaxis=dict(
+                gridcolor=colors['text_secondary'],
+                gridwidth=1,
+                griddash='dot'
+            )
         )
-    )
     
     st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': True})
 
+# === Why this forecast ===
+@st.cache_resource(max_entries=4)
+def load_explainer(fingerprint, cluster, _forest):
+    # Leaf paths are extracted once per model version (and zoo cluster)
+    return TreeExplainer.from_forest(_forest)
+
+@st.cache_data(max_entries=64)
+def load_explanation(fingerprint, county, horizon, cluster, _explainer, _model, _seed):
+    return explain_forecast(_explainer, _model, _seed, horizon)
+
+with st.expander("🔍 Why this forecast?"):
+    seed = seeds[county]
+    explained_forest = explainable_forest(model, seed["county_code"])
+    if FORECAST_ENGINES[forecast_engine] is not None:
+        st.info(f"The chart shows the {forecast_engine} baseline, a fit of the county's own history "
+                "with no model features to attribute. Pick 🌲 Random Forest to see what drives its forecast.")
+    elif explained_forest is None:
+        st.info("Feature contributions need a scikit-learn forest; compact artifacts don't keep the "
+                "training sample counts they are computed from.")
+    elif st.checkbox("Show feature contributions per forecast month", key="explain_forecast",
+                     help="Exact TreeSHAP attributions of every monthly prediction to the model's inputs"):
+        cluster = int(model.clusters_of([seed["county_code"]])[0]) if isinstance(model, ModelZoo) else 0
+        with profiler.span("explanation"):
+            explanation = load_explanation(
+                fingerprint, county, forecast_horizon, cluster,
+                load_explainer(fingerprint, cluster, explained_forest),
+                load_array_model(fingerprint, model), seed,
+            )
+        base = explanation["base"].iloc[0]
+        contribution_columns = [c for c in FEATURE_LABELS if c in explanation.columns]
+
+        fig_explain = go.Figure()
+        for column in contribution_columns:
+            fig_explain.add_trace(go.Bar(
+                x=forecast_df["Date"], y=explanation[column], name=FEATURE_LABELS[column],
+                hovertemplate=f'<b>{FEATURE_LABELS[column]}</b><br>Date: %{{x}}<br>Contribution: %{{y:+,.2f}}<extra></extra>'
+            ))
+        fig_explain.add_trace(go.Scatter(
+            x=forecast_df["Date"], y=explanation["prediction"] - base, mode='lines+markers',
+            name='🔮 Forecast − average', line=dict(color=colors['text'], width=2),
+            hovertemplate='<b>Forecast − average</b><br>Date: %{x}<br>%{y:+,.2f} EVs<extra></extra>'
+        ))
+        fig_explain.update_layout(
+            title=f"🔍 What drives each month's forecast - {county} County",
+            title_font=dict(size=18, color=colors['text']),
+            barmode='relative',
+            xaxis_title="Date",
+            yaxis_title="EVs per month vs. the average county-month",
+            font=dict(color=colors['text']),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=450,
+            hovermode='x unified',
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+        st.plotly_chart(fig_explain, use_container_width=True)
+
+        summary = explanation[contribution_columns].agg(["mean", lambda v: v.abs().mean()]).T
+        summary.columns = ["Average contribution", "Average size"]
+        summary.index = [FEATURE_LABELS[c] for c in summary.index]
+        st.caption(
+            f"Each bar is a feature's share of the gap between that month's forecast and the "
+            f"average training month ({base:,.1f} EVs); bars add up to the line."
+        )
+        st.dataframe(summary.sort_values("Average size", ascending=False).round(2), use_container_width=True)
+
 # === Enhanced Insights Section ===
 historical_total = historical_cum["Cumulative EV"].iloc[-1]
 forecasted_total = forecast_df["Cumulative EV"].iloc[-1]
@@ -811,7 +1156,7 @@ with insights_col1:
         growth_color = colors['success'] if forecast_growth_pct > 0 else colors['error']
         st.markdown(f"""
         <div class="metric-card" style="border-left: 4px solid {growth_color};">
-            <h4 style="color: {growth_color}; margin: 0;">📈 3-Year Growth</h4>
+            <h4 style="color: {growth_color}; margin: 0;">📈 {forecast_years}-Year Growth</h4>
             <p style="font-size: 2rem; font-weight: bold; margin: 0.5rem 0; color: {colors['text']};">
                 {forecast_growth_pct:+.1f}%
             </p>
@@ -836,7 +1181,7 @@ with insights_col2:
     """, unsafe_allow_html=True)
 
 with insights_col3:
-    monthly_avg = absolute_growth / 36
+    monthly_avg = absolute_growth / forecast_horizon
     st.markdown(f"""
     <div class="metric-card" style="border-left: 4px solid {colors['secondary']};">
         <h4 style="color: {colors['secondary']}; margin: 0;">📅 Monthly Avg</h4>
@@ -874,7 +1219,7 @@ with st.expander("🔍 Detailed Analysis", expanded=False):
     - Data history: {len(county_df)} months
     - Average monthly growth: {avg_growth:.2f}%
     
-    **3-Year Projection (by {(latest_date + pd.DateOffset(months=36)).strftime('%B %Y')})**
+    **{forecast_years}-Year Projection (by {(latest_date + pd.DateOffset(months=forecast_horizon)).strftime('%B %Y')})**
     - Projected total: {forecasted_total:,} EVs
     - Expected growth: {absolute_growth:+,} new EVs ({forecast_growth_pct:+.1f}%)
     - Monthly average: {monthly_avg:+.0f} new EVs
@@ -898,7 +1243,7 @@ if historical_total > 0:
         </h4>
         <p style="color: {colors['text']}; margin: 0.5rem 0;">
             Based on AI analysis, EV adoption in <strong>{county} County</strong> is expected to show a 
-            <strong>{trend} of {abs(forecast_growth_pct):.1f}%</strong> over the next 3 years.
+            <strong>{trend} of {abs(forecast_growth_pct):.1f}%</strong> over the next {horizon_label}.
         </p>
     </div>
     """, unsafe_allow_html=True)
@@ -906,6 +1251,308 @@ else:
     st.warning("⚠️ Historical EV total is zero, so percentage forecast change can't be computed.", icon="📊")
 
 
+# === EV Type Breakdown ===
+@st.cache_resource(max_entries=2)
+def load_breakdown_model(fingerprint):
+    # Built offline with forecasting.multitarget; the section is hidden without it
+    if os.path.exists(breakdown_path):
+        return joblib.load(breakdown_path)
+    return None
+
+@st.cache_data(max_entries=64)
+def load_breakdown(fingerprint, county, horizon, engine, _breakdown, _seed, _totals):
+    # The months' feature rows are replayed from the forecast on the chart, so only
+    # the small breakdown forest runs, once for all months
+    return breakdown_frame(_seed, breakdown_outputs(_breakdown, _seed, _totals))
+
+breakdown_fingerprint = f"{fingerprint}-{file_fingerprint(breakdown_path)}"
+breakdown_model = load_breakdown_model(breakdown_fingerprint)
+
+if breakdown_model is not None:
+    st.markdown("---")
+    st.markdown(f"""
+    <div class="metric-card">
+        <h3 style="color: {colors['primary']}; margin-top: 0;">
+            🔋 EV Type Breakdown
+            <div class="tooltip" style="display: inline-block; margin-left: 10px;">
+                <span style="color: {colors['text_secondary']}; cursor: help;">❓</span>
+                <div class="tooltiptext">
+                    Battery electric (BEV) and plug-in hybrid (PHEV) vehicles forecast alongside the
+                    EV total, plus the share of all registered vehicles that are electric.
+                </div>
+            </div>
+        </h3>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with profiler.span("breakdown"):
+        breakdown_df = load_breakdown(
+            breakdown_fingerprint, county, forecast_horizon, forecast_engine,
+            breakdown_model, seeds[county], forecast_df["Predicted EV Total"].to_numpy(),
+        )
+
+    breakdown_col1, breakdown_col2 = st.columns([3, 1])
+
+    with breakdown_col1:
+        fig_breakdown = go.Figure()
+        for column, forecast_column, label, color in [
+            (BEV, "Predicted BEVs", "🔋 BEVs", colors['primary']),
+            (PHEV, "Predicted PHEVs", "⛽ PHEVs", colors['warning']),
+        ]:
+            fig_breakdown.add_trace(go.Bar(
+                x=county_df["Date"], y=county_df[column], name=f"{label} (historical)",
+                marker_color=color, legendgroup=label,
+                hovertemplate=f'<b>{label}</b><br>Date: %{{x}}<br>EVs: %{{y:,}}<extra></extra>'
+            ))
+            fig_breakdown.add_trace(go.Bar(
+                x=breakdown_df["Date"], y=breakdown_df[forecast_column], name=f"{label} (forecast)",
+                marker_color=color, marker_opacity=0.5, legendgroup=label,
+                hovertemplate=f'<b>{label} forecast</b><br>Date: %{{x}}<br>EVs: %{{y:,.1f}}<extra></extra>'
+            ))
+        fig_breakdown.update_layout(
+            title=f"🔋 Monthly BEVs and PHEVs - {county} County",
+            title_font=dict(size=18, color=colors['text']),
+            barmode='stack',
+            xaxis_title="Date",
+            yaxis_title="EVs per month",
+            font=dict(color=colors['text']),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=400,
+            hovermode='x unified',
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+        )
+        st.plotly_chart(fig_breakdown, use_container_width=True)
+
+    with breakdown_col2:
+        forecast_evs = breakdown_df["Predicted EV Total"].sum()
+        bev_share = breakdown_df["Predicted BEVs"].sum() / forecast_evs if forecast_evs > 0 else 0
+        st.metric(
+            label="🔋 BEV share of new EVs",
+            value=f"{bev_share:.0%}",
+            help=f"Share of forecast new EVs over {forecast_horizon} months that are battery electric"
+        )
+        latest_percent = county_df["Percent Electric Vehicles"].iloc[-1]
+        forecast_percent = breakdown_df["Predicted Percent Electric"].iloc[-1]
+        st.metric(
+            label="⚡ Percent electric (end of forecast)",
+            value=f"{forecast_percent:.2f}%",
+            delta=f"{forecast_percent - latest_percent:+.2f} pts",
+            help="Electric share of all registered vehicles in the county"
+        )
+
+# === What-if Scenarios ===
+st.markdown("---")
+st.markdown(f"""
+<div class="metric-card">
+    <h3 style="color: {colors['primary']}; margin-top: 0;">
+        🧪 What-if Scenarios
+        <div class="tooltip" style="display: inline-block; margin-left: 10px;">
+            <span style="color: {colors['text_secondary']}; cursor: help;">❓</span>
+            <div class="tooltiptext">
+                Adjust growth, add an incentive shock or cap monthly adoption. Growth and cap
+                changes are fed back through the recursive forecast, so they compound over time;
+                a shock changes each month's new EVs by its percentage.
+            </div>
+        </div>
+    </h3>
+</div>
+""", unsafe_allow_html=True)
+
+scenario_col1, scenario_col2 = st.columns([1, 3])
+
+with scenario_col1:
+    growth_multiplier = st.slider(
+        "📈 Growth multiplier", 0.5, 2.0, 1.0, 0.05,
+        help="Scales the model's month-over-month change in new EVs", key="scenario_growth"
+    )
+    shock_pct = st.slider(
+        "💸 Incentive shock (%)", -50, 100, 0, 5,
+        help="Relative change in new EVs from the chosen month on", key="scenario_shock"
+    )
+    shock_month = st.slider(
+        "🗓️ Shock starts in month", 1, forecast_horizon, 12, key="scenario_shock_month"
+    )
+    cap_enabled = st.checkbox("🧢 Cap monthly adoption", key="scenario_cap_enabled")
+    monthly_cap = st.number_input(
+        "Max new EVs per month", min_value=0.0, value=float(max(latest_ev_total * 2, 1)),
+        disabled=not cap_enabled, key="scenario_cap"
+    )
+
+with profiler.span("scenarios"):
+    scenarios = [
+        BASELINE,
+        *PRESETS,
+        Scenario(
+            "Custom scenario",
+            growth=growth_multiplier,
+            shock=shock_pct / 100,
+            shock_start=shock_month,
+            cap=monthly_cap if cap_enabled else None,
+        ),
+    ]
+    # All scenario trajectories share one predict call per forecast month
+    scenario_preds = forecast_scenarios(
+        load_array_model(fingerprint, model), seeds[county], scenarios, forecast_horizon
+    )
+    scenario_totals = historical_total + np.cumsum(np.round(scenario_preds), axis=1)
+
+with scenario_col2:
+    fig_scenarios = go.Figure()
+    scenario_palette = [colors['text_secondary'], colors['warning'], colors['success'], colors['secondary']]
+    for idx, scenario in enumerate(scenarios):
+        is_custom = scenario.name == "Custom scenario"
+        fig_scenarios.add_trace(go.Scatter(
+            x=forecast_df["Date"],
+            y=scenario_totals[idx],
+            mode='lines',
+            name=scenario.name,
+            line=dict(color=scenario_palette[idx % len(scenario_palette)], width=4 if is_custom else 2,
+                      dash='solid' if is_custom else 'dot'),
+            hovertemplate=f'<b>{scenario.name}</b><br>Date: %{{x}}<br>EVs: %{{y:,.0f}}<extra></extra>'
+        ))
+    fig_scenarios.update_layout(
+        title=f"🧪 Scenario Forecasts - {county} County",
+        title_font=dict(size=18, color=colors['text']),
+        xaxis_title="Date",
+        yaxis_title="Cumulative EV Count",
+        font=dict(color=colors['text']),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=450,
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    st.plotly_chart(fig_scenarios, use_container_width=True)
+
+    scenario_delta = scenario_totals[-1, -1] - scenario_totals[0, -1]
+    st.metric(
+        label="🧪 Custom vs Baseline (end of forecast)",
+        value=f"{scenario_totals[-1, -1]:,.0f} EVs",
+        delta=f"{scenario_delta:+,.0f} EVs",
+        help="Cumulative EVs at the end of the forecast under the custom scenario"
+    )
+
+# === Statewide Outlook ===
+@st.cache_resource(max_entries=2)
+def load_state_county_seeds(fingerprint, _df):
+    # County names repeat across states, so the hierarchy seeds each (state, county) pair
+    return state_county_seeds(_df)
+
+@st.cache_resource(max_entries=8)
+def load_hierarchy(fingerprint, horizon, method, _model, _seeds):
+    # Every county on a common calendar, reconciled with state and national totals
+    return reconciled_forecast(_model, _seeds, horizon, method)
+
+st.markdown("---")
+st.markdown(f"""
+<div class="metric-card">
+    <h3 style="color: {colors['primary']}; margin-top: 0;">
+        🗺️ Statewide Outlook
+        <div class="tooltip" style="display: inline-block; margin-left: 10px;">
+            <span style="color: {colors['text_secondary']}; cursor: help;">❓</span>
+            <div class="tooltiptext">
+                All counties are forecast together and reconciled with a forecast of the
+                state total, so county forecasts add up to the state and national totals.
+            </div>
+        </div>
+    </h3>
+</div>
+""", unsafe_allow_html=True)
+
+state_county = load_state_county_seeds(file_fingerprint(data_path), df)
+state_names = sorted({state for state, _ in state_county})
+state_col1, state_col2 = st.columns([1, 3])
+
+with state_col1:
+    selected_state = st.selectbox(
+        "🗺️ State", [NATIONAL] + state_names,
+        index=state_names.index(county_states[county]) + 1 if county in county_states else 0,
+        key="state_selector"
+    )
+    reconcile_method = st.selectbox(
+        "⚖️ Reconciliation", RECONCILE_METHODS, index=RECONCILE_METHODS.index("wls_struct"),
+        help="bottom_up sums the county forecasts; the others also weigh in a forecast of each total",
+        key="reconcile_method"
+    )
+
+with profiler.span("hierarchy"):
+    hierarchy = load_hierarchy(fingerprint, forecast_horizon, reconcile_method, model, state_county)
+    level = "national" if selected_state == NATIONAL else "state"
+    state_forecast = hierarchy[(hierarchy["Level"] == level) & (hierarchy["State"] == selected_state)]
+
+with state_col1:
+    st.metric(
+        label=f"🚗 New EVs over {forecast_horizon} months",
+        value=f"{state_forecast['Reconciled'].sum():,.0f}",
+        delta=f"{state_forecast['Reconciled'].sum() - state_forecast['Base'].sum():+,.0f} vs unreconciled",
+        help="Reconciled total of the selected state (or all states)"
+    )
+
+with state_col2:
+    fig_state = go.Figure()
+    fig_state.add_trace(go.Scatter(
+        x=state_forecast["Date"], y=state_forecast["Base"].cumsum(),
+        mode='lines', name='Total-level forecast',
+        line=dict(color=colors['text_secondary'], width=2, dash='dot'),
+        hovertemplate='<b>Total-level forecast</b><br>Date: %{x}<br>EVs: %{y:,.0f}<extra></extra>'
+    ))
+    fig_state.add_trace(go.Scatter(
+        x=state_forecast["Date"], y=state_forecast["Reconciled"].cumsum(),
+        mode='lines', name='Reconciled',
+        line=dict(color=colors['primary'], width=3),
+        hovertemplate='<b>Reconciled</b><br>Date: %{x}<br>EVs: %{y:,.0f}<extra></extra>'
+    ))
+    fig_state.update_layout(
+        title=f"🗺️ Cumulative New EVs - {selected_state}",
+        title_font=dict(size=18, color=colors['text']),
+        xaxis_title="Date",
+        yaxis_title="New EVs since latest data",
+        font=dict(color=colors['text']),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=400,
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    st.plotly_chart(fig_state, use_container_width=True)
+
+    if selected_state != NATIONAL:
+        shares = county_shares(hierarchy, selected_state).head(10)
+        fig_shares = go.Figure(go.Bar(
+            x=shares["Share"] * 100, y=shares.index, orientation='h',
+            marker_color=colors['secondary'],
+            hovertemplate='<b>%{y}</b><br>Share: %{x:.1f}%<extra></extra>'
+        ))
+        fig_shares.update_layout(
+            title=f"🏛️ County Shares of {selected_state} (top {len(shares)})",
+            title_font=dict(size=16, color=colors['text']),
+            xaxis_title="Share of forecast new EVs (%)",
+            font=dict(color=colors['text']),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=350,
+            yaxis=dict(autorange="reversed")
+        )
+        st.plotly_chart(fig_shares, use_container_width=True)
+
+@st.cache_data(max_entries=16)
+def load_top_growth(data_fingerprint, state, _database):
+    # Aggregated in SQL over the (State, County, Date) index
+    return _database.top_growth(None if state == NATIONAL else state, months=12, limit=10)
+
+with st.expander(f"🚀 Most new EVs in the last 12 months - {selected_state}"):
+    top_growth = load_top_growth(file_fingerprint(data_path), selected_state, database)
+    top_growth["Growth"] = top_growth["Growth"] * 100
+    st.dataframe(
+        top_growth, hide_index=True, use_container_width=True,
+        column_config={
+            "New EVs": st.column_config.NumberColumn(format="%d"),
+            "Previous EVs": st.column_config.NumberColumn(help="New EVs in the 12 months before", format="%d"),
+            "Growth": st.column_config.NumberColumn(help="Change from the 12 months before", format="%+.0f%%"),
+        },
+    )
+
 # === Enhanced Multi-County Comparison ===
 st.markdown("---")
 st.markdown(f"""
@@ -949,198 +1596,244 @@ with comparison_col2:
         </div>
         """, unsafe_allow_html=True)
 
-if multi_counties:
-    # Show loading for comparison
-    with st.spinner(f'🔄 Generating forecasts for {len(multi_counties)} counties...'):
-        comparison_data = []
-        
-        # Progress tracking for multiple counties
-        comparison_progress = st.progress(0)
+with profiler.span("comparison"):
+    if multi_counties:
+        # Show loading for comparison
+        with st.spinner(f'🔄 Generating forecasts for {len(multi_counties)} counties...'):
+            comparison_data = []
         
-        for idx, cty in enumerate(multi_counties):
-            comparison_progress.progress((idx + 1) / len(multi_counties))
-            
-            cty_df = df[df["County"] == cty].sort_values("Date")
-            cty_code = cty_df["county_encoded"].iloc[0]
-
-            hist_ev = list(cty_df["Electric Vehicle (EV) Total"].values[-6:])
-            cum_ev = list(np.cumsum(hist_ev))
-            months_since = cty_df["months_since_start"].max()
-            last_date = cty_df["Date"].max()
-
-            future_rows_cty = []
-            for i in range(1, forecast_horizon + 1):
-                forecast_date = last_date + pd.DateOffset(months=i)
-                months_since += 1
-                lag1, lag2, lag3 = hist_ev[-1], hist_ev[-2], hist_ev[-3]
-                roll_mean = np.mean([lag1, lag2, lag3])
-                pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-                pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-                recent_cum = cum_ev[-6:]
-                ev_slope = (
-                    np.polyfit(range(len(recent_cum)), recent_cum, 1)[0]
-                    if len(recent_cum) == 6
-                    else 0
-                )
+            # Progress tracking for the batched forecast steps
+            comparison_progress = st.progress(0)
 
-                new_row = {
-                    "months_since_start": months_since,
-                    "county_encoded": cty_code,
-                    "ev_total_lag1": lag1,
-                    "ev_total_lag2": lag2,
-                    "ev_total_lag3": lag3,
-                    "ev_total_roll_mean_3": roll_mean,
-                    "ev_total_pct_change_1": pct_change_1,
-                    "ev_total_pct_change_3": pct_change_3,
-                    "ev_growth_slope": ev_slope,
-                }
-                pred = model.predict(pd.DataFrame([new_row]))[0]
-                future_rows_cty.append(
-                    {"Date": forecast_date, "Predicted EV Total": round(pred)}
-                )
-
-                hist_ev.append(pred)
-                if len(hist_ev) > 6:
-                    hist_ev.pop(0)
-
-                cum_ev.append(cum_ev[-1] + pred)
-                if len(cum_ev) > 6:
-                    cum_ev.pop(0)
+            # Uncached counties are forecast together, one predict call per month
+            comparison_forecasts = engine_forecasts(
+                multi_counties, progress=throttled(lambda step, horizon: comparison_progress.progress(step / horizon))
+            )
+        
+            for cty in multi_counties:
+                cty_df = database.county_history(cty)
 
-            hist_cum = cty_df[["Date", "Electric Vehicle (EV) Total"]].copy()
-            hist_cum["Cumulative EV"] = hist_cum["Electric Vehicle (EV) Total"].cumsum()
+                hist_cum = cty_df[["Date", "Electric Vehicle (EV) Total"]].copy()
+                hist_cum["Cumulative EV"] = hist_cum["Electric Vehicle (EV) Total"].cumsum()
 
-            fc_df = pd.DataFrame(future_rows_cty)
-            fc_df["Cumulative EV"] = (
-                fc_df["Predicted EV Total"].cumsum() + hist_cum["Cumulative EV"].iloc[-1]
-            )
+                fc_df = comparison_forecasts[cty]
+                fc_df["Cumulative EV"] = (
+                    fc_df["Predicted EV Total"].cumsum() + hist_cum["Cumulative EV"].iloc[-1]
+                )
 
-            combined_cty = pd.concat(
-                [hist_cum[["Date", "Cumulative EV"]], fc_df[["Date", "Cumulative EV"]]],
-                ignore_index=True,
-            )
+                combined_cty = pd.concat(
+                    [hist_cum[["Date", "Cumulative EV"]], fc_df[["Date", "Cumulative EV"]]],
+                    ignore_index=True,
+                )
 
-            combined_cty["County"] = cty
-            comparison_data.append(combined_cty)
+                combined_cty["County"] = cty
+                comparison_data.append(combined_cty)
         
-        comparison_progress.empty()
+            comparison_progress.empty()
 
-    # Enhanced comparison visualization
-    comp_df = pd.concat(comparison_data, ignore_index=True)
+        # Enhanced comparison visualization
+        comp_df = pd.concat(comparison_data, ignore_index=True)
     
-    # Interactive Plotly comparison chart
-    fig_comparison = go.Figure()
+        # Interactive Plotly comparison chart
+        fig_comparison = go.Figure()
     
-    colors_palette = [colors['primary'], colors['secondary'], colors['warning']]
+        colors_palette = [colors['primary'], colors['secondary'], colors['warning']]
     
-    for idx, (cty, group) in enumerate(comp_df.groupby("County")):
-        color = colors_palette[idx % len(colors_palette)]
-        fig_comparison.add_trace(go.Scatter(
-            x=group["Date"],
-            y=group["Cumulative EV"],
-            mode='lines+markers',
-            name=f'{cty} County',
-            line=dict(color=color, width=3),
-            marker=dict(size=6, color=color),
-            hovertemplate=f'<b>{cty} County</b><br>Date: %{{x}}<br>EVs: %{{y:,}}<extra></extra>'
-        ))
+        for idx, (cty, group) in enumerate(comp_df.groupby("County")):
+            color = colors_palette[idx % len(colors_palette)]
+            group = downsample(group, "Date", "Cumulative EV", COMPARISON_POINTS)
+            fig_comparison.add_trace(go.Scatter(
+                x=group["Date"],
+                y=group["Cumulative EV"],
+                mode='lines+markers',
+                name=f'{cty} County',
+                line=dict(color=color, width=3),
+                marker=dict(size=6, color=color),
+                hovertemplate=f'<b>{cty} County</b><br>Date: %{{x}}<br>EVs: %{{y:,}}<extra></extra>'
+            ))
     
-    fig_comparison.update_layout(
-        title="🏛️ County Comparison: EV Adoption Trends",
-        title_font=dict(size=20, color=colors['text']),
-        xaxis_title="Date",
-        yaxis_title="Cumulative EV Count",
-        font=dict(color=colors['text']),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        height=600,
-        hovermode='x unified',
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=1.02,
-            xanchor="right",
-            x=1
-        ),
-        xaxis=dict(
-            gridcolor=colors['text_secondary'],
-            gridwidth=1,
-            griddash='dot'
-        ),
-        yaxis=dict(
-            gridcolor=colors['text_secondary'],
-            gridwidth=1,
-            griddash='dot'
+        fig_comparison.update_layout(
+            title="🏛️ County Comparison: EV Adoption Trends",
+            title_font=dict(size=20, color=colors['text']),
+            xaxis_title="Date",
+            yaxis_title="Cumulative EV Count",
+            font=dict(color=colors['text']),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=600,
+            hovermode='x unified',
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            ),
+            xaxis=dict(
+                gridcolor=colors['text_secondary'],
+                gridwidth=1,
+                griddash='dot'
+            ),
+            yaxis=dict(
+                gridcolor=colors['text_secondary'],
+                gridwidth=1,
+                griddash='dot'
+            )
         )
-    )
     
-    st.plotly_chart(fig_comparison, use_container_width=True)
+        st.plotly_chart(fig_comparison, use_container_width=True)
     
-    # Enhanced growth comparison
-    st.markdown(f"""
+        # Enhanced growth comparison
+        st.markdown(f"""
     <div class="metric-card">
         <h4 style="color: {colors['primary']}; margin-top: 0;">📈 Growth Comparison</h4>
     </div>
     """, unsafe_allow_html=True)
     
-    growth_cols = st.columns(len(multi_counties))
-    growth_summaries = []
+        growth_cols = st.columns(len(multi_counties))
+        growth_summaries = []
     
-    for idx, cty in enumerate(multi_counties):
-        cty_df_comp = comp_df[comp_df["County"] == cty].reset_index(drop=True)
-        historical_total_comp = cty_df_comp["Cumulative EV"].iloc[
-            len(cty_df_comp) - forecast_horizon - 1
-        ]
-        forecasted_total_comp = cty_df_comp["Cumulative EV"].iloc[-1]
-
-        if historical_total_comp > 0:
-            growth_pct = (
-                (forecasted_total_comp - historical_total_comp) / historical_total_comp
-            ) * 100
-            growth_summaries.append(f"{cty}: {growth_pct:.1f}%")
+        for idx, cty in enumerate(multi_counties):
+            cty_df_comp = comp_df[comp_df["County"] == cty].reset_index(drop=True)
+            historical_total_comp = cty_df_comp["Cumulative EV"].iloc[
+                len(cty_df_comp) - forecast_horizon - 1
+            ]
+            forecasted_total_comp = cty_df_comp["Cumulative EV"].iloc[-1]
+
+            if historical_total_comp > 0:
+                growth_pct = (
+                    (forecasted_total_comp - historical_total_comp) / historical_total_comp
+                ) * 100
+                growth_summaries.append(f"{cty}: {growth_pct:.1f}%")
             
-            with growth_cols[idx]:
-                growth_color = colors['success'] if growth_pct > 0 else colors['error']
-                st.markdown(f"""
+                with growth_cols[idx]:
+                    growth_color = colors['success'] if growth_pct > 0 else colors['error']
+                    st.markdown(f"""
                 <div class="metric-card" style="border-left: 4px solid {growth_color}; text-align: center;">
                     <h4 style="color: {growth_color}; margin: 0;">{cty}</h4>
                     <p style="font-size: 1.8rem; font-weight: bold; margin: 0.5rem 0; color: {colors['text']};">
                         {growth_pct:+.1f}%
                     </p>
                     <p style="color: {colors['text_secondary']}; margin: 0; font-size: 0.9rem;">
-                        3-year growth
+                        {forecast_years}-year growth
                     </p>
                 </div>
                 """, unsafe_allow_html=True)
-        else:
-            growth_summaries.append(f"{cty}: N/A")
+            else:
+                growth_summaries.append(f"{cty}: N/A")
 
-    # Summary insights
-    st.markdown(f"""
+        # Summary insights
+        st.markdown(f"""
     <div style="background: linear-gradient(45deg, {colors['primary']}22, {colors['secondary']}22); 
                 border-radius: 10px; padding: 1.5rem; margin: 1rem 0;">
         <h4 style="color: {colors['primary']}; margin: 0;">
             🎯 Comparison Summary
         </h4>
         <p style="color: {colors['text']}; margin: 0.5rem 0;">
-            3-year EV adoption growth projections: <strong>{' | '.join(growth_summaries)}</strong>
+            {forecast_years}-year EV adoption growth projections: <strong>{' | '.join(growth_summaries)}</strong>
         </p>
     </div>
     """, unsafe_allow_html=True)
     
-    # Download comparison data
-    if st.button("📊 Download Comparison Data", use_container_width=True):
-        csv_data = comp_df.to_csv(index=False)
+        # Download comparison data
         st.download_button(
-            label="💾 Download CSV",
-            data=csv_data,
+            label="📊 Download Comparison Data",
+            data=comp_df.to_csv(index=False),
             file_name=f"ev_comparison_{'-'.join(multi_counties)}.csv",
             mime="text/csv",
             use_container_width=True
         )
 
-else:
-    st.info("👆 Select counties above to enable comparison visualization", icon="🏛️")
+    else:
+        st.info("👆 Select counties above to enable comparison visualization", icon="🏛️")
+
+# === Forecast Export ===
+EXPORT_CHUNK_SIZE = 128
+# Finished exports are files shared by all sessions; only the most recent few are kept
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "ev_forecaster_exports")
+EXPORT_FILES_KEPT = 8
+
+def export_chunks(counties, progress=None):
+    """Forecast chunks for an export from the engine picked in the sidebar."""
+    method = FORECAST_ENGINES[forecast_engine]
+    if method is None:
+        # Bypasses the shared forecast cache so an all-county export doesn't
+        # evict the counties other sessions are looking at
+        return forecast_chunks(model, seeds, counties, forecast_horizon, EXPORT_CHUNK_SIZE, county_states, progress)
+    frames = load_baseline_forecasts(fingerprint, method, forecast_horizon, df, seeds)
+    forecast = pd.concat([frames[c].assign(County=c, State=county_states.get(c)) for c in counties], ignore_index=True)
+    forecast["Cumulative New EVs"] = forecast.groupby("County")["Predicted EV Total"].cumsum()
+    return frame_chunks(forecast[EXPORT_COLUMNS])
+
+try:
+    import xlsxwriter  # noqa: F401
+    export_formats = list(EXPORT_FORMATS)
+except ImportError:
+    export_formats = [fmt for fmt in EXPORT_FORMATS if fmt != "xlsx"]
+
+st.markdown("---")
+st.markdown(f"""
+<div class="metric-card">
+    <h3 style="color: {colors['primary']}; margin-top: 0;">
+        📦 Export Forecasts
+        <div class="tooltip" style="display: inline-block; margin-left: 10px;">
+            <span style="color: {colors['text_secondary']}; cursor: help;">❓</span>
+            <div class="tooltiptext">
+                Counties are forecast and written in chunks, so even an all-county export
+                keeps memory use low. Uses the forecast engine picked in the sidebar.
+            </div>
+        </div>
+    </h3>
+</div>
+""", unsafe_allow_html=True)
+
+county_state = county_states.get(county)
+export_scopes = {
+    f"📍 {county}": [county],
+    f"🗺️ All counties in {county_state}": sorted(c for c, s in county_states.items() if s == county_state),
+    "🌎 All counties": sorted(county_states),
+}
+if multi_counties:
+    export_scopes[f"🏛️ Compared counties ({len(multi_counties)})"] = list(multi_counties)
+
+export_col1, export_col2, export_col3 = st.columns([2, 1, 1])
+with export_col1:
+    export_scope = st.selectbox("Counties", list(export_scopes), key="export_scope")
+with export_col2:
+    export_format = st.selectbox("Format", export_formats, format_func=str.upper, key="export_format")
+
+export_counties = export_scopes[export_scope]
+export_key = (fingerprint, forecast_engine, forecast_horizon, tuple(export_counties), export_format)
+with export_col3:
+    st.markdown("<div style='height: 1.75rem'></div>", unsafe_allow_html=True)
+    build_export = st.button("📦 Prepare Export", use_container_width=True)
+
+if build_export:
+    export_progress = st.progress(0.0, text=f"Forecasting {len(export_counties)} counties...")
+    with profiler.span("export"):
+        export_path = export_file(
+            EXPORT_DIR, export_key, export_format,
+            lambda: export_chunks(export_counties, progress=lambda done, total: export_progress.progress(
+                done / total, text=f"Forecast {done} of {total} counties")),
+            keep=EXPORT_FILES_KEPT,
+        )
+    export_progress.empty()
+    scope_name = county if len(export_counties) == 1 else f"{len(export_counties)}_counties"
+    # Only the path is kept per session, not the export itself
+    st.session_state.forecast_export = (export_key, f"ev_forecast_{scope_name}.{EXPORT_FORMATS[export_format][1]}",
+                                        export_path)
+
+saved_export = st.session_state.get("forecast_export")
+if saved_export is not None and saved_export[0] == export_key and os.path.exists(saved_export[2]):
+    _, export_name, export_path = saved_export
+    with open(export_path, "rb") as export_data:
+        st.download_button(
+            label=f"💾 Download {export_name} ({os.path.getsize(export_path) / 1024:,.0f} KB)",
+            data=export_data,
+            file_name=export_name,
+            mime=EXPORT_FORMATS[export_format][0],
+            use_container_width=True
+        )
 
 # === Enhanced Footer Section ===
 st.markdown("---")
@@ -1207,11 +1900,12 @@ with st.sidebar:
     )
     
     if st.button("📤 Send Feedback", use_container_width=True):
-        if feedback_text:
+        if not feedback_text:
+            st.warning("Please enter your feedback first.", icon="⚠️")
+        elif get_feedback_writer().submit(feedback_type, feedback_text, county=county, fingerprint=fingerprint):
             st.success("Thank you for your feedback! 🙏", icon="✅")
-            # Here you would typically send the feedback to a backend service
         else:
-            st.warning("Please enter your feedback first.", icon="⚠️")
+            st.error("Feedback is piling up faster than it can be saved; please try again shortly.", icon="🚨")
 
 # Enhanced footer with credits
 st.markdown(f"""
@@ -1253,6 +1947,26 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+# === Admin performance panel ===
+profiler.record("rerun_total", time.perf_counter() - rerun_started)
+
+if show_perf_panel:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("⏱️ Performance", expanded=False):
+            if registry_dir:
+                st.caption(f"Model {model_version} · fingerprint {model_fingerprint}")
+            perf_summary = profiler.summary()
+            if perf_summary:
+                st.dataframe(
+                    pd.DataFrame(perf_summary).set_index("span").round(2),
+                    use_container_width=True
+                )
+                perf_span = st.selectbox("Histogram", profiler.span_names(), key="perf_span")
+                st.bar_chart(pd.Series(profiler.buckets(perf_span), name="count"))
+            if st.button("♻️ Reset timings", use_container_width=True):
+                profiler.reset()
+
 # Add some JavaScript for enhanced interactivity
 st.markdown("""
 <script>
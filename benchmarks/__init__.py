@@ -0,0 +1 @@
+"""Performance benchmarks for the EV Adoption Forecaster (see ``benchmarks/run.py``)."""
@@ -0,0 +1,321 @@
+"""Concurrent-session load test of app.py.
+
+Usage::
+
+    python -m benchmarks.load                          # 1, 2, 4 and 8 sessions
+    python -m benchmarks.load --sessions 1,4,16 --actions 20
+    python -m benchmarks.load --compare benchmarks/results/load-a.json benchmarks/results/load-b.json
+
+Every simulated session is a Streamlit ``AppTest`` with its own session
+state, driven from its own thread. All sessions share this process's
+``st.cache_*`` caches, like the sessions of one ``streamlit run`` server.
+Each session loads the page and then performs random user actions:
+selecting a county, toggling chart controls, resizing the chart, moving a
+scenario slider or comparing counties. Every action is one rerun.
+
+For every session count the report has rerun latency percentiles, reruns
+per second, process CPU use (100% is one core) and RSS. The knee is the
+first session count whose throughput gain over the previous count falls
+below ``--knee-gain``.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import warnings
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.run import APP_PATH, DATA_PATH, RESULTS_DIR, environment  # noqa: E402
+from forecasting.engine import ForecastCache  # noqa: E402
+from forecasting.metrics import process_rss_bytes  # noqa: E402
+from forecasting.prefetch import ForecastPrefetcher  # noqa: E402
+
+CHART_TOGGLES = ["📈 Show Historical", "🔮 Show Forecast", "📉 Show Trend Line"]
+
+
+# === Session actions ===
+def _widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+def select_county(at, rng, counties):
+    at.selectbox(key="county_selector").select(rng.choice(counties))
+
+
+def toggle_chart(at, rng, counties):
+    checkbox = _widget(at.checkbox, rng.choice(CHART_TOGGLES))
+    checkbox.set_value(not checkbox.value)
+
+
+def resize_chart(at, rng, counties):
+    _widget(at.slider, "📏 Chart Height").set_value(rng.randrange(400, 801, 50))
+
+
+def move_scenario(at, rng, counties):
+    at.slider(key="scenario_growth").set_value(rng.choice([0.5, 0.75, 1.0, 1.25, 1.5, 2.0]))
+
+
+def compare_counties(at, rng, counties):
+    at.multiselect(key="multi_county_selector").set_value(rng.sample(counties, rng.randint(1, 3)))
+
+
+# Relative frequency of each action in a session
+ACTIONS = [
+    (select_county, 4),
+    (toggle_chart, 3),
+    (resize_chart, 1),
+    (move_scenario, 2),
+    (compare_counties, 2),
+]
+
+
+def run_session(seed, counties, n_actions, timeout, latencies, errors):
+    """Load the page, then perform ``n_actions`` random actions; records seconds per rerun."""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    actions, weights = zip(*ACTIONS)
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        steps = [None] + rng.choices(actions, weights, k=n_actions)
+        for action in steps:
+            if action is not None:
+                action(at, rng, counties)
+            start = time.perf_counter()
+            at.run()
+            latencies.append((action.__name__ if action else "load", time.perf_counter() - start))
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+    except Exception as error:
+        errors.append(f"session {seed}: {type(error).__name__}: {error}")
+
+
+# === Runner ===
+@contextmanager
+def concurrent_app_tests():
+    """Make ``AppTest`` runs from several threads safe to overlap.
+
+    Every ``AppTest`` run installs a mock runtime and patches
+    ``config.get_option`` for its duration, then undoes both. Interleaved,
+    one session finishing pulls the runtime and the app-test config out from
+    under the others. Here both are installed once for all sessions: runtime
+    lookups fall back to a shared mock, and the per-run config patch is a
+    no-op inside the shared one.
+
+    Every run also compiles app.py into a fresh script cache. A server shares
+    one cache between sessions, and concurrent ``ast.parse`` calls can fail
+    on Python 3.11, so all sessions share one cache here too.
+    """
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import patch_config_options
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    fallback = mock.MagicMock(spec=Runtime)
+    fallback.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    fallback.cache_storage_manager = MemoryCacheStorageManager()
+    with mock.patch.object(Runtime, "instance", classmethod(lambda cls: cls._instance or fallback)), \
+            mock.patch.object(Runtime, "exists", classmethod(lambda cls: True)), \
+            patch_config_options({"global.appTest": True}), \
+            mock.patch.object(app_test, "patch_config_options", lambda overrides: nullcontext()), \
+            mock.patch.object(local_script_runner, "ScriptCache", lambda cache=ScriptCache(): cache):
+        yield
+
+
+class RssSampler:
+    """Peak RSS of this process, sampled from a background thread."""
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = process_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, process_rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, process_rss_bytes())
+
+
+def cached_resources():
+    """Every value currently held by ``st.cache_resource``, across all functions."""
+    from streamlit.runtime.caching.cache_resource_api import _resource_caches
+
+    for cache in list(_resource_caches._function_caches.values()):
+        with cache._mem_cache_lock:
+            results = list(cache._mem_cache.values())
+        for result in results:
+            yield result.value
+
+
+def warm_up(counties, timeout):
+    """Empty the forecast caches, then load the page once; returns the load seconds.
+
+    Every level starts from the same state: a server that served a single
+    page load, not one whose forecast caches were filled by the previous
+    level. ``st.cache_resource`` is kept: clearing it would leave the
+    previous level's prefetch pool, feedback writer and registry watcher
+    threads running next to their replacements. Only its shared forecast
+    cache is emptied, after the prefetches that fill it are cancelled.
+    """
+    import streamlit as st
+
+    st.cache_data.clear()
+    for resource in cached_resources():
+        if isinstance(resource, ForecastPrefetcher):
+            resource.cancel()
+    for resource in cached_resources():
+        if isinstance(resource, ForecastCache):
+            resource.clear()
+    latencies, errors = [], []
+    run_session("warm-up", counties, 0, timeout, latencies, errors)
+    if errors:
+        raise RuntimeError(errors[0])
+    return latencies[0][1]
+
+
+def run_level(n_sessions, counties, n_actions, timeout):
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_session, args=(f"{n_sessions}-{i}", counties, n_actions, timeout, latencies, errors))
+        for i in range(n_sessions)
+    ]
+    with concurrent_app_tests():
+        warm_up_seconds = warm_up(counties, timeout)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        with RssSampler() as rss:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    seconds = np.array([s for _, s in latencies])
+    by_action = {}
+    for name, s in latencies:
+        by_action.setdefault(name, []).append(s)
+    return {
+        "sessions": n_sessions,
+        "warm_up_s": warm_up_seconds,
+        "reruns": len(seconds),
+        "errors": errors,
+        "wall_s": wall,
+        "reruns_per_s": len(seconds) / wall,
+        "p50_s": float(np.percentile(seconds, 50)),
+        "p90_s": float(np.percentile(seconds, 90)),
+        "p99_s": float(np.percentile(seconds, 99)),
+        "max_s": float(seconds.max()),
+        "cpu_percent": 100 * cpu / wall,
+        "rss_mb": process_rss_bytes() / 1e6,
+        "peak_rss_mb": rss.peak / 1e6,
+        "actions": {name: {"count": len(s), "median_s": statistics.median(s)} for name, s in by_action.items()},
+    }
+
+
+def find_knee(levels, min_gain):
+    """First session count whose throughput gain over the previous count is below ``min_gain``."""
+    for previous, level in zip(levels, levels[1:]):
+        if level["reruns_per_s"] < previous["reruns_per_s"] * (1 + min_gain):
+            return level["sessions"]
+    return None
+
+
+def print_level(level):
+    print(f"{level['sessions']:>8} {level['reruns']:>7} {level['reruns_per_s']:>9.2f} "
+          f"{level['p50_s'] * 1000:>8.0f} {level['p90_s'] * 1000:>8.0f} {level['p99_s'] * 1000:>8.0f} "
+          f"{level['cpu_percent']:>6.0f}% {level['peak_rss_mb']:>9.0f}"
+          + (f"  {len(level['errors'])} errors" if level["errors"] else ""))
+
+
+def run(session_counts, n_actions, timeout, min_gain):
+    warnings.filterwarnings("ignore")
+    counties = sorted(pd.read_csv(DATA_PATH, usecols=["County"])["County"].dropna().unique())
+
+    print(f"{'sessions':>8} {'reruns':>7} {'reruns/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'cpu':>7} {'peak MB':>9}")
+    levels = []
+    for n_sessions in session_counts:
+        level = run_level(n_sessions, counties, n_actions, timeout)
+        print_level(level)
+        for error in level["errors"][:3]:
+            print(f"         {error}")
+        levels.append(level)
+    knee = find_knee(levels, min_gain)
+    if knee is not None:
+        print(f"Throughput stops scaling at {knee} sessions (gain below {min_gain:.0%})")
+    return {"environment": environment(), "actions_per_session": n_actions, "knee_sessions": knee, "levels": levels}
+
+
+def compare(base_path, new_path, threshold):
+    with open(base_path) as handle:
+        base = {level["sessions"]: level for level in json.load(handle)["levels"]}
+    with open(new_path) as handle:
+        new = {level["sessions"]: level for level in json.load(handle)["levels"]}
+
+    regressions = 0
+    for sessions in sorted(base.keys() & new.keys()):
+        ratio = new[sessions]["p90_s"] / base[sessions]["p90_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{sessions:>3} sessions  p90 {base[sessions]['p90_s'] * 1000:>8.0f} -> "
+              f"{new[sessions]['p90_s'] * 1000:>8.0f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8", help="comma-separated concurrent session counts")
+    parser.add_argument("--actions", type=int, default=10, help="user actions per session after the page load")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds a single rerun may take")
+    parser.add_argument("--knee-gain", type=float, default=0.10,
+                        help="throughput gain below which more sessions count as saturated")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare the p90 latencies of two result files")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative p90 slowdown flagged by --compare (rerun latencies are noisier than the micro-benchmarks)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    report = run([int(n) for n in args.sessions.split(",")], args.actions, args.timeout, args.knee_gain)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"load-{stamp}.json")
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
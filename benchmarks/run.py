@@ -0,0 +1,327 @@
+"""Benchmark suite for loading, feature engineering, inference and full reruns.
+
+Usage::
+
+    python -m benchmarks.run                       # 1x and 10x scales
+    python -m benchmarks.run --scales 1,10,100     # add the 100x scale
+    python -m benchmarks.run --only forecast       # benchmarks whose name contains "forecast"
+    python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+
+Each run writes ``benchmarks/results/<timestamp>.json`` with environment
+details and per-benchmark timing statistics. ``--compare`` reports the
+median ratio of every benchmark present in both files and exits non-zero
+when one slowed down by more than ``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+import joblib  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import plotly.graph_objects as go  # noqa: E402
+import sklearn  # noqa: E402
+
+from benchmarks.synthetic import scale_raw, scale_seeds  # noqa: E402
+from forecasting.engine import FEATURES, TARGET, build_seeds, forecast_batch, forecast_frame  # noqa: E402
+from forecasting.preprocess import OUTLIER_COLUMN, iqr_bounds, preprocess  # noqa: E402
+from forecasting.sketch import sketch_chunks  # noqa: E402
+from forecasting.store import load_store  # noqa: E402
+
+MODEL_PATH = os.path.join(REPO_DIR, "forecasting_ev_model.pkl")
+DATA_PATH = os.path.join(REPO_DIR, "preprocessed_ev_data.csv")
+RAW_PATH = os.path.join(REPO_DIR, "Electric_Vehicle_Population_By_County.csv")
+APP_PATH = os.path.join(REPO_DIR, "app.py")
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+BENCHMARKS = []
+
+
+def benchmark(name, repeat=5, scaled=False):
+    """Register ``func(ctx, scale)``; it returns a zero-argument callable to time."""
+    def register(func):
+        BENCHMARKS.append({"name": name, "func": func, "repeat": repeat, "scaled": scaled})
+        return func
+    return register
+
+
+class Context:
+    """Lazily loaded inputs shared between benchmarks."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, key, factory):
+        if key not in self._cache:
+            self._cache[key] = factory()
+        return self._cache[key]
+
+    @property
+    def model(self):
+        return self.get("model", lambda: joblib.load(MODEL_PATH))
+
+    @property
+    def df(self):
+        return self.get("df", lambda: read_dataset(DATA_PATH))
+
+    @property
+    def raw(self):
+        return self.get("raw", lambda: pd.read_csv(RAW_PATH))
+
+    @property
+    def seeds(self):
+        return self.get("seeds", lambda: build_seeds(self.df))
+
+
+# === Helpers mirroring app.py ===
+def read_dataset(path):
+    """Body of app.py's ``load_data`` without the Streamlit cache."""
+    df = pd.read_csv(path, low_memory=False, encoding="utf-8")
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df.dropna(subset=["Date"])
+
+
+def legacy_forecast(model, seed, horizon=36):
+    """The original per-step, per-county loop from app.py."""
+    historical_ev = list(seed["history"])
+    cumulative_ev = list(np.cumsum(historical_ev))
+    months_since_start = seed["months_since_start"]
+    preds = []
+    for _ in range(horizon):
+        months_since_start += 1
+        lag1, lag2, lag3 = historical_ev[-1], historical_ev[-2], historical_ev[-3]
+        slope = (
+            np.polyfit(range(len(cumulative_ev[-6:])), cumulative_ev[-6:], 1)[0]
+            if len(cumulative_ev[-6:]) == 6 else 0
+        )
+        row = dict(zip(FEATURES, [
+            months_since_start, seed["county_code"], lag1, lag2, lag3,
+            np.mean([lag1, lag2, lag3]),
+            (lag1 - lag2) / lag2 if lag2 != 0 else 0,
+            (lag1 - lag3) / lag3 if lag3 != 0 else 0,
+            slope,
+        ]))
+        pred = model.predict(pd.DataFrame([row]))[0]
+        preds.append(pred)
+        historical_ev = historical_ev[1:] + [pred]
+        cumulative_ev = cumulative_ev[1:] + [cumulative_ev[-1] + pred]
+    return preds
+
+
+def build_forecast_figure(county_df, forecast_df):
+    """The single-county chart from app.py, with the same traces and layout."""
+    historical = county_df[["Date", TARGET]].copy()
+    historical["Cumulative EV"] = historical[TARGET].cumsum()
+    forecast = forecast_df.copy()
+    forecast["Cumulative EV"] = forecast["Predicted EV Total"].cumsum() + historical["Cumulative EV"].iloc[-1]
+    combined = pd.concat([historical[["Date", "Cumulative EV"]], forecast[["Date", "Cumulative EV"]]],
+                         ignore_index=True)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=historical["Date"], y=historical["Cumulative EV"], mode="lines+markers"))
+    fig.add_trace(go.Scatter(x=forecast["Date"], y=forecast["Cumulative EV"], mode="lines+markers",
+                             line=dict(dash="dash")))
+    x_trend = np.arange(len(combined))
+    trend = np.poly1d(np.polyfit(x_trend, combined["Cumulative EV"].values, 1))
+    fig.add_trace(go.Scatter(x=combined["Date"], y=trend(x_trend), mode="lines", line=dict(dash="dot")))
+    fig.update_layout(height=600, hovermode="x unified", plot_bgcolor="rgba(0,0,0,0)")
+    return fig.to_json()
+
+
+# === Benchmarks ===
+@benchmark("load_data", repeat=10)
+def bench_load_data(ctx, scale):
+    return lambda: read_dataset(DATA_PATH)
+
+
+@benchmark("load_model", repeat=5)
+def bench_load_model(ctx, scale):
+    return lambda: joblib.load(MODEL_PATH)
+
+
+@benchmark("build_seeds", repeat=5)
+def bench_build_seeds(ctx, scale):
+    return lambda: build_seeds(ctx.df)
+
+
+@benchmark("load_seed_store", repeat=10)
+def bench_load_seed_store(ctx, scale):
+    load_store(DATA_PATH)  # build and persist outside the timing
+    return lambda: load_store(DATA_PATH)
+
+
+@benchmark("feature_engineering_counties", repeat=3, scaled=True)
+def bench_feature_engineering_counties(ctx, scale):
+    raw = ctx.get(("raw_counties", scale), lambda: scale_raw(ctx.raw, county_factor=scale))
+    return lambda: preprocess(raw)
+
+
+@benchmark("feature_engineering_months", repeat=3, scaled=True)
+def bench_feature_engineering_months(ctx, scale):
+    raw = ctx.get(("raw_months", scale), lambda: scale_raw(ctx.raw, month_factor=scale))
+    return lambda: preprocess(raw)
+
+
+@benchmark("outlier_bounds_exact", repeat=5, scaled=True)
+def bench_outlier_bounds_exact(ctx, scale):
+    raw = ctx.get(("raw_counties", scale), lambda: scale_raw(ctx.raw, county_factor=scale))
+    return lambda: iqr_bounds(raw[OUTLIER_COLUMN])
+
+
+@benchmark("outlier_bounds_sketch", repeat=5, scaled=True)
+def bench_outlier_bounds_sketch(ctx, scale):
+    raw = ctx.get(("raw_counties", scale), lambda: scale_raw(ctx.raw, county_factor=scale))
+    chunks = np.array_split(raw[OUTLIER_COLUMN].to_numpy(dtype=float), max(1, len(raw) // 100_000))
+    return lambda: iqr_bounds(sketch_chunks(chunks, seed=0))
+
+
+@benchmark("forecast_single_county_legacy", repeat=3)
+def bench_forecast_legacy(ctx, scale):
+    seed = ctx.seeds["Los Angeles"]
+    return lambda: legacy_forecast(ctx.model, seed)
+
+
+@benchmark("forecast_single_county", repeat=10)
+def bench_forecast_single(ctx, scale):
+    seeds = [ctx.seeds["Los Angeles"]]
+    return lambda: forecast_batch(ctx.model, seeds)
+
+
+@benchmark("forecast_multi_county", repeat=3, scaled=True)
+def bench_forecast_multi(ctx, scale):
+    seeds = ctx.get(("seeds", scale), lambda: scale_seeds(ctx.seeds, scale))
+    return lambda: forecast_batch(ctx.model, seeds)
+
+
+@benchmark("plotly_figure", repeat=10)
+def bench_plotly_figure(ctx, scale):
+    seed = ctx.seeds["Los Angeles"]
+    county_df = ctx.df[ctx.df["County"] == "Los Angeles"].sort_values("Date")
+    forecast_df = forecast_frame(seed, forecast_batch(ctx.model, [seed])[0])
+    return lambda: build_forecast_figure(county_df, forecast_df)
+
+
+@benchmark("app_full_run", repeat=3)
+def bench_app_full_run(ctx, scale):
+    """Headless rerun of app.py; the warm-up run fills the Streamlit caches."""
+    from streamlit.testing.v1 import AppTest
+
+    def run():
+        at = AppTest.from_file(APP_PATH, default_timeout=300)
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return run
+
+
+# === Runner ===
+def time_callable(func, repeat):
+    func()  # warm-up, excluded from the statistics
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "samples_s": samples,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def run(scales, only=None, repeat=None):
+    ctx = Context()
+    results = []
+    for bench in BENCHMARKS:
+        if only and only not in bench["name"]:
+            continue
+        for scale in (scales if bench["scaled"] else [1]):
+            name = f"{bench['name']}[{scale}x]" if bench["scaled"] else bench["name"]
+            func = bench["func"](ctx, scale)
+            stats = time_callable(func, repeat or bench["repeat"])
+            results.append({"name": name, "scale": scale, **stats})
+            print(f"{name:<40} median {stats['median_s'] * 1000:>10.2f} ms  (min {stats['min_s'] * 1000:.2f} ms)")
+    return {"environment": environment(), "results": results}
+
+
+def compare(base_path, new_path, threshold):
+    with open(base_path) as handle:
+        base = {r["name"]: r for r in json.load(handle)["results"]}
+    with open(new_path) as handle:
+        new = {r["name"]: r for r in json.load(handle)["results"]}
+
+    regressions = 0
+    for name in sorted(base.keys() & new.keys()):
+        ratio = new[name]["median_s"] / base[name]["median_s"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<40} {base[name]['median_s'] * 1000:>10.2f} -> {new[name]['median_s'] * 1000:>10.2f} ms"
+              f"  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10", help="comma-separated synthetic scale factors")
+    parser.add_argument("--only", help="run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, help="override the repeat count of every benchmark")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown flagged by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    warnings.filterwarnings("ignore")
+    scales = [int(s) for s in args.scales.split(",")]
+    report = run(scales, args.only, args.repeat)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}.json")
+    with open(output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
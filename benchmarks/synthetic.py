@@ -0,0 +1,44 @@
+"""Synthetic scaling of the datasets used by the benchmarks."""
+import numpy as np
+import pandas as pd
+
+
+def scale_raw(raw, county_factor=1, month_factor=1):
+    """Grow the raw county export by ``county_factor`` counties and ``month_factor`` months.
+
+    Extra counties are renamed copies with jittered counts; extra months are
+    earlier copies of each county's history shifted back in time, so every
+    county keeps a contiguous monthly series.
+    """
+    dates = pd.to_datetime(raw["Date"], errors="coerce")
+    span_months = (dates.max().year - dates.min().year) * 12 + dates.max().month - dates.min().month + 1
+    rng = np.random.default_rng(0)
+
+    frames = []
+    for period in range(month_factor):
+        shifted = raw.copy()
+        if period:
+            shifted_dates = dates - pd.DateOffset(months=span_months * period)
+            shifted["Date"] = shifted_dates.dt.strftime("%B %d %Y")
+        frames.append(shifted)
+    months_scaled = pd.concat(frames, ignore_index=True)
+
+    frames = [months_scaled]
+    for copy in range(1, county_factor):
+        cloned = months_scaled.copy()
+        cloned["County"] = cloned["County"] + f" #{copy}"
+        counts = pd.to_numeric(cloned["Electric Vehicle (EV) Total"], errors="coerce")
+        jitter = rng.integers(0, 3, size=len(cloned))
+        cloned["Electric Vehicle (EV) Total"] = (counts + jitter).astype(str)
+        frames.append(cloned)
+    return pd.concat(frames, ignore_index=True)
+
+
+def scale_seeds(seeds, county_factor=1):
+    """Replicate forecast seeds ``county_factor`` times with distinct names."""
+    scaled = list(seeds.values())
+    for copy in range(1, county_factor):
+        for seed in seeds.values():
+            # Clones keep their county code so the model sees codes it was trained on
+            scaled.append(dict(seed, county=f"{seed['county']} #{copy}"))
+    return scaled
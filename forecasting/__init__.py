@@ -0,0 +1 @@
+"""Forecasting helpers used by the EV Adoption Forecaster app and its tools."""
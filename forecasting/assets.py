@@ -0,0 +1,82 @@
+"""Web-sized static assets for the app.
+
+The hero image is resized and recompressed once per source version into
+``static/`` (named after a hash of the source, so a new photo gets a new URL
+and browsers can cache the old one for good). With Streamlit's
+``server.enableStaticServing`` the page only references the file;
+otherwise the small encoded copy is inlined as a data URI.
+
+Usage::
+
+    python -m forecasting.assets ev-car-factory.jpg --width 1280 --quality 75
+"""
+import argparse
+import base64
+import os
+import re
+
+from .engine import content_fingerprint
+
+STATIC_DIR = "static"
+MIME_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+
+def build_image(source, static_dir=STATIC_DIR, width=1280, quality=75, fmt="webp"):
+    """Resize ``source`` to at most ``width`` pixels wide and save it into ``static_dir``.
+
+    Returns the path of the built file; an existing build of the same source
+    and settings is reused.
+    """
+    name = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(static_dir, f"{name}-{width}w-q{quality}-{content_fingerprint(source)}.{fmt}")
+    if os.path.exists(path):
+        return path
+
+    from PIL import Image
+
+    os.makedirs(static_dir, exist_ok=True)
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        image.thumbnail((width, width * 4))
+        tmp = f"{path}.tmp"
+        image.save(tmp, format=fmt.upper(), quality=quality, method=6 if fmt == "webp" else 0)
+    os.replace(tmp, path)
+    return path
+
+
+def data_uri(path):
+    with open(path, "rb") as handle:
+        payload = base64.b64encode(handle.read()).decode()
+    return f"data:{MIME_TYPES[os.path.splitext(path)[1].lower()]};base64,{payload}"
+
+
+def static_url(path):
+    """URL Streamlit serves a file in ``static/`` under."""
+    return f"app/static/{os.path.basename(path)}"
+
+
+def minify_css(css):
+    """Drop comments and the whitespace that doesn't change the meaning of ``css``."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", css).replace(";}", "}").strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the web-sized hero image and report payload sizes.")
+    parser.add_argument("source", nargs="?", default="ev-car-factory.jpg")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--quality", type=int, default=75)
+    parser.add_argument("--format", choices=["webp", "jpeg"], default="webp")
+    args = parser.parse_args()
+
+    path = build_image(args.source, args.static_dir, args.width, args.quality, args.format)
+    print(f"{args.source}: {os.path.getsize(args.source) / 1e3:,.0f} kB, "
+          f"{len(data_uri(args.source)) / 1e3:,.0f} kB inlined")
+    print(f"{path}: {os.path.getsize(path) / 1e3:,.0f} kB, {len(data_uri(path)) / 1e3:,.0f} kB inlined, "
+          f"{len(static_url(path))} bytes as a static URL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Statistical baseline forecasts fitted for every county at once.
+
+Two explainable trends of the monthly EV totals, both fitted over a
+``(n_counties, n_months)`` matrix of the county series (left-padded with
+NaN) without any per-county Python loop:
+
+- ``"damped"``: damped-trend exponential smoothing. Every county runs the
+  smoothing recursion for a small grid of ``(alpha, beta, phi)`` at once and
+  keeps the parameters with the lowest one-step-ahead error.
+- ``"loglinear"``: a least-squares line through ``log1p`` of the last
+  ``window`` months, i.e. constant percentage growth, in closed form.
+
+The backtest holds out each county's last months and reports where the
+baseline stays within a tolerance of the forest, so it can stand in for the
+forest as a fast path there.
+
+Usage::
+
+    python -m forecasting.baseline --holdout-months 12 --tolerance 0.1 --report baseline_report.csv
+"""
+import argparse
+import itertools
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, TARGET, build_seeds, forecast_batch
+
+METHODS = ("damped", "loglinear")
+
+# Smoothing parameter grid searched per county by the damped-trend baseline
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.05, 0.2)
+PHIS = (0.8, 0.9, 0.98)
+
+
+def county_arrays(df):
+    """Monthly EV totals of every county as a right-aligned matrix.
+
+    Returns ``(counties, values)`` with counties sorted like
+    :func:`forecasting.engine.build_seeds`; shorter series are left-padded
+    with NaN so the latest month of every county is the last column.
+    """
+    ordered = df.sort_values("Date", kind="stable")
+    groups = ordered.groupby("County", sort=True)
+    counties = list(groups.groups)
+    lengths = groups.size().to_numpy()
+
+    rows = ordered["County"].map({county: row for row, county in enumerate(counties)}).to_numpy()
+    columns = groups.cumcount().to_numpy() + (lengths.max() - lengths[rows])
+    values = np.full((len(counties), lengths.max()), np.nan)
+    values[rows, columns] = ordered[TARGET].to_numpy(dtype=float)
+    return counties, values
+
+
+def damped_trend(values, horizon=DEFAULT_HORIZON):
+    """Damped-trend smoothing forecasts, shape ``(n_counties, horizon)``."""
+    grid = np.array(list(itertools.product(ALPHAS, BETAS, PHIS)))
+    alpha, beta, phi = grid.T
+    n = len(values)
+
+    observed = ~np.isnan(values)
+    started = np.zeros(n, dtype=bool)
+    level = np.zeros((n, len(grid)))
+    trend = np.zeros((n, len(grid)))
+    sse = np.zeros((n, len(grid)))
+
+    for t in range(values.shape[1]):
+        y = values[:, t:t + 1]
+        update = observed[:, t:t + 1]
+        first = update & ~started[:, None]
+        step = update & started[:, None]
+
+        predicted = level + phi * trend
+        sse += np.where(step, (y - predicted) ** 2, 0)
+        new_level = alpha * y + (1 - alpha) * predicted
+        new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+
+        # The first observation initialises the level with a flat trend
+        level = np.where(first, y, np.where(step, new_level, level))
+        trend = np.where(step, new_trend, trend)
+        started |= observed[:, t]
+
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(n)
+    level, trend, phi = level[rows, best], trend[rows, best], phi[best]
+    damping = np.cumsum(phi[:, None] ** np.arange(1, horizon + 1), axis=1)
+    return np.maximum(level[:, None] + damping * trend[:, None], 0)
+
+
+def log_linear(values, horizon=DEFAULT_HORIZON, window=12):
+    """Constant-growth forecasts from a log-linear fit of the last ``window`` months."""
+    recent = values[:, -window:]
+    mask = ~np.isnan(recent)
+    x = np.broadcast_to(np.arange(recent.shape[1], dtype=float), recent.shape)
+    y = np.where(mask, np.log1p(np.nan_to_num(recent)), 0)
+
+    count = mask.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = np.where(mask, x, 0).sum(axis=1) / count
+        y_mean = y.sum(axis=1) / count
+        dx = np.where(mask, x - x_mean[:, None], 0)
+        slope = (dx * (y - y_mean[:, None])).sum(axis=1) / (dx ** 2).sum(axis=1)
+    slope = np.where(count >= 2, slope, 0.0)
+    intercept = np.nan_to_num(y_mean - slope * x_mean)
+
+    future = np.arange(recent.shape[1], recent.shape[1] + horizon, dtype=float)
+    return np.maximum(np.expm1(intercept[:, None] + slope[:, None] * future), 0)
+
+
+def baseline_forecast(values, method="damped", horizon=DEFAULT_HORIZON):
+    """Forecast every row of ``values`` with the chosen baseline."""
+    if method == "damped":
+        return damped_trend(values, horizon)
+    if method == "loglinear":
+        return log_linear(values, horizon)
+    raise ValueError(f"unknown method {method!r}; expected one of {', '.join(METHODS)}")
+
+
+# === Backtest ===
+def backtest(model, df, holdout_months=12, tolerance=0.1, methods=METHODS):
+    """Compare baselines with the forest on each county's last ``holdout_months``.
+
+    Every county is truncated, re-seeded and forecast by the forest and each
+    baseline. ``within_tolerance`` marks counties where the baseline's total
+    over the hold-out is within ``tolerance`` (relative) of the forest's.
+    """
+    ordered = df.sort_values("Date", kind="stable")
+    lengths = ordered.groupby("County").size()
+    # Keep enough history to seed the forest's lags
+    eligible = lengths[lengths > holdout_months + 6].index
+    ordered = ordered[ordered["County"].isin(eligible)]
+    train = ordered.groupby("County").head(-holdout_months)
+    actual = ordered.groupby("County").tail(holdout_months).groupby("County")[TARGET].sum()
+
+    seeds = build_seeds(train)
+    counties, values = county_arrays(train)
+
+    start = time.perf_counter()
+    forest = forecast_batch(model, [seeds[c] for c in counties], holdout_months)
+    forest_seconds = time.perf_counter() - start
+    forest_total = forest.sum(axis=1)
+
+    frames = []
+    for method in methods:
+        start = time.perf_counter()
+        preds = baseline_forecast(values, method, holdout_months)
+        seconds = time.perf_counter() - start
+        total = preds.sum(axis=1)
+        relative = np.abs(total - forest_total) / np.maximum(np.abs(forest_total), 1)
+        frames.append(pd.DataFrame({
+            "County": counties,
+            "method": method,
+            "actual": actual.loc[counties].to_numpy(),
+            "forest": forest_total,
+            "baseline": total,
+            "forest_abs_error": np.abs(forest_total - actual.loc[counties].to_numpy()),
+            "baseline_abs_error": np.abs(total - actual.loc[counties].to_numpy()),
+            "relative_diff": relative,
+            "within_tolerance": relative <= tolerance,
+            "seconds": seconds,
+        }))
+    report = pd.concat(frames, ignore_index=True)
+    report.attrs["forest_seconds"] = forest_seconds
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the statistical baselines against the forest.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--holdout-months", type=int, default=12)
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative difference to the forest's hold-out total counted as agreement")
+    parser.add_argument("--report", help="write the per-county report to this CSV")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+
+    report = backtest(model, df, args.holdout_months, args.tolerance)
+    summary = report.groupby("method").agg(
+        counties=("County", "size"),
+        within_tolerance=("within_tolerance", "sum"),
+        baseline_mae=("baseline_abs_error", "mean"),
+        forest_mae=("forest_abs_error", "mean"),
+        seconds=("seconds", "first"),
+    )
+    print(f"{args.holdout_months}-month hold-out, forest forecast in {report.attrs['forest_seconds']:.2f} s")
+    print(summary.round(3).to_string())
+    for method, rows in report[report["within_tolerance"]].groupby("method"):
+        print(f"{method} within {args.tolerance:.0%} of the forest: {', '.join(rows['County'])}")
+    if args.report:
+        report.to_csv(args.report, index=False)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
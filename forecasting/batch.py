@@ -0,0 +1,131 @@
+"""Batch forecasts for every county, state or the national total.
+
+Usage::
+
+    python -m forecasting.batch --output county_forecasts.csv
+    python -m forecasting.batch --level state --method wls_struct --output state_forecasts.csv
+    python -m forecasting.batch --output county_forecasts.parquet --chunk-size 64
+
+County forecasts come straight from the batched engine. ``--level state``
+and ``--level national`` reconcile the county forecasts with the aggregate
+series (see :mod:`forecasting.hierarchy`); ``--shares STATE`` prints each
+county's share of that state's forecast.
+
+The output format follows the file extension (``.csv``, ``.parquet`` or
+``.xlsx``) unless ``--format`` is given. County-level exports are forecast
+and written chunk by chunk (see :mod:`forecasting.export`).
+
+``--db`` also stores the county forecasts, tagged with the model
+fingerprint, in the SQLite database of :mod:`forecasting.database`.
+
+When the drift state from :mod:`forecasting.drift` exists, rows newer than
+its watermark are folded in first and drifting features are reported.
+"""
+import argparse
+import os
+import time
+import warnings
+
+import joblib
+import pandas as pd
+
+from .database import ForecastDatabase, stored
+from .drift import DriftMonitor
+from .engine import DEFAULT_HORIZON, build_seeds, file_fingerprint, forecast_batch, forecast_frame
+from .export import FORMATS, forecast_chunks, format_for, frame_chunks, write_export
+from .hierarchy import METHODS, county_shares, reconciled_forecast, state_county_seeds
+
+
+def county_forecasts(model, seeds, horizon=DEFAULT_HORIZON):
+    """Forecast frames of every county stacked into one DataFrame with a County column."""
+    counties = sorted(seeds)
+    preds = forecast_batch(model, [seeds[c] for c in counties], horizon)
+    frames = [forecast_frame(seeds[c], row).assign(County=c) for c, row in zip(counties, preds)]
+    return pd.concat(frames, ignore_index=True)[["County", "Date", "Predicted EV Total"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast every county, state or the national total.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--level", choices=["county", "state", "national", "all"], default="county")
+    parser.add_argument("--method", choices=METHODS, default="wls_struct",
+                        help="reconciliation method for aggregate levels")
+    parser.add_argument("--shares", metavar="STATE", help="print county shares of this state's forecast")
+    parser.add_argument("--output", help="write the forecasts to this file")
+    parser.add_argument("--format", choices=list(FORMATS), help="output format (default: from the --output extension)")
+    parser.add_argument("--chunk-size", type=int, default=128, help="counties forecast and written per chunk")
+    parser.add_argument("--db", help="store county forecasts in this forecast database")
+    parser.add_argument("--drift-state", default="drift_monitor.json",
+                        help="drift state to update and check before forecasting (skipped when missing)")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    seeds = build_seeds(df)
+    # County-level forecasts are keyed by name like the model, so a name found in several
+    # states is labelled with its first; the state and national levels use (state, county)
+    states = df.groupby("County")["State"].first().to_dict()
+
+    if os.path.exists(args.drift_state):
+        monitor = DriftMonitor.load(args.drift_state)
+        added = monitor.update(df, model)
+        monitor.save(args.drift_state)
+        alerts = monitor.alerts()
+        print(f"Drift check: {added:,} new rows, {len(alerts)} drifting columns")
+        for message in alerts:
+            print(f"  DRIFT {message}")
+
+    if args.level == "county" and (args.output or args.db) and not args.shares:
+        # Stream straight to disk instead of building every county's frame first
+        counties = sorted(seeds)
+        start = time.perf_counter()
+        frames = forecast_chunks(model, seeds, counties, args.horizon, args.chunk_size, states)
+        if args.db:
+            database = ForecastDatabase(args.db)
+            database.sync_history(args.data)
+            model_fingerprint = file_fingerprint(args.model)
+            database.record_model(model_fingerprint, args.model)
+            frames = stored(database, model_fingerprint, frames)
+        if args.output:
+            fmt = args.format or format_for(args.output)
+            with open(args.output, "wb") as handle:
+                size = write_export(handle, frames, fmt)
+            print(f"{len(counties)} county forecasts written to {args.output} ({size / 1e3:,.0f} kB {fmt}) "
+                  f"in {time.perf_counter() - start:.2f} s")
+        else:
+            rows = sum(len(frame) for frame in frames)
+            print(f"{rows:,} county forecast rows for {len(counties)} counties stored in {args.db} "
+                  f"in {time.perf_counter() - start:.2f} s")
+        return
+
+    start = time.perf_counter()
+    if args.level == "county" and not args.shares:
+        result = county_forecasts(model, seeds, args.horizon)
+    else:
+        # Keyed by (state, county): a county name can be in several states
+        pair_seeds = state_county_seeds(df)
+        hierarchy = reconciled_forecast(model, pair_seeds, args.horizon, args.method)
+        result = hierarchy if args.level == "all" else hierarchy[hierarchy["Level"] == args.level]
+    elapsed = time.perf_counter() - start
+    print(f"{len(result):,} {args.level}-level forecast rows in {elapsed:.2f} s")
+
+    if args.level in ("state", "national"):
+        totals = result.groupby("State")[["Base", "Reconciled"]].sum().sort_values("Reconciled", ascending=False)
+        print(f"New EVs over {args.horizon} months ({args.method}):")
+        print(totals.round(1).head(15).to_string())
+    if args.shares:
+        print(f"County shares of {args.shares}:")
+        print(county_shares(hierarchy, args.shares).round(3).to_string())
+    if args.output:
+        fmt = args.format or format_for(args.output)
+        with open(args.output, "wb") as handle:
+            write_export(handle, frame_chunks(result), fmt)
+        print(f"Forecasts written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Compact model artifacts for serving.
+
+``forecasting_ev_model.pkl`` is a 200-tree RandomForest with deep trees.
+:func:`compact_forest` turns it into a :class:`CompactForest`: optionally
+fewer trees, depth- and leaf-capped trees and float32 thresholds/values,
+stored as flat NumPy arrays and evaluated with a vectorized traversal.
+
+Usage::
+
+    python -m forecasting.compact --estimators 50 --max-depth 10 --float32 \\
+        --output forecasting_ev_model_compact.pkl --report compact_report.json
+
+The report compares size, load time, predict latency and backtest error of
+the original and compact models. Serve a compact artifact by pointing
+``EV_FORECASTER_MODEL`` at it.
+"""
+import argparse
+import heapq
+import json
+import os
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import FEATURES, TARGET, build_seeds, forecast_batch
+
+
+def _floor_float32(thresholds):
+    """Round thresholds down to float32 so ``x <= t`` is unchanged for float32 ``x``."""
+    rounded = thresholds.astype(np.float32)
+    too_high = rounded.astype(np.float64) > thresholds
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def _prune_tree(tree, max_depth=None, max_leaves=None):
+    """Keep the top of a fitted sklearn tree.
+
+    Nodes below ``max_depth`` are cut and, when ``max_leaves`` is set, splits
+    are kept best-first by weighted impurity decrease, like sklearn's own
+    ``max_leaf_nodes`` growth. Internal nodes already store the mean target of
+    their samples, so a cut node is a valid leaf. Returns local arrays
+    ``(left, right, feature, threshold, value)`` with the root at index 0.
+    """
+    left, right = tree.children_left, tree.children_right
+    weighted = tree.weighted_n_node_samples * tree.impurity
+
+    def gain(node):
+        l, r = left[node], right[node]
+        return weighted[node] - weighted[l] - weighted[r]
+
+    def can_split(node, depth):
+        return left[node] != -1 and (max_depth is None or depth < max_depth)
+
+    # Decide which original nodes are split in the compact tree
+    split = set()
+    if max_leaves is None:
+        stack = [(0, 0)]
+        while stack:
+            node, depth = stack.pop()
+            if can_split(node, depth):
+                split.add(node)
+                stack.extend([(left[node], depth + 1), (right[node], depth + 1)])
+    else:
+        leaves = 1
+        frontier = [(-gain(0), 0, 0)] if can_split(0, 0) else []
+        while frontier and leaves < max_leaves:
+            _, node, depth = heapq.heappop(frontier)
+            split.add(node)
+            leaves += 1
+            for child in (left[node], right[node]):
+                if can_split(child, depth + 1):
+                    heapq.heappush(frontier, (-gain(child), child, depth + 1))
+
+    # Renumber the kept nodes breadth-first
+    order = [0]
+    index = {0: 0}
+    for node in order:
+        if node in split:
+            for child in (left[node], right[node]):
+                index[child] = len(order)
+                order.append(child)
+
+    order = np.array(order)
+    is_split = np.array([node in split for node in order])
+    new_left = np.full(len(order), -1, dtype=np.int64)
+    new_right = np.full(len(order), -1, dtype=np.int64)
+    new_left[is_split] = [index[left[n]] for n in order[is_split]]
+    new_right[is_split] = [index[right[n]] for n in order[is_split]]
+    feature = np.where(is_split, tree.feature[order], 0)
+    threshold = np.where(is_split, tree.threshold[order], np.inf)
+    value = tree.value[order, 0, 0]
+    return new_left, new_right, feature, threshold, value
+
+
+class CompactForest:
+    """A tree-averaging regressor stored as flat node arrays.
+
+    Leaves point to themselves, so every row can be advanced ``max_depth``
+    times for all trees at once without tracking which rows have finished.
+    """
+
+    # Feature matrices in FEATURES order can be passed without a DataFrame
+    accepts_arrays = True
+
+    def __init__(self, left, right, feature, threshold, value, roots, max_depth, feature_names):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.value)
+
+    def _as_matrix(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names_in_)].to_numpy()
+        # sklearn trees compare float32 inputs, so do the same
+        return np.asarray(X, dtype=np.float32)
+
+    def apply(self, X):
+        """Leaf index reached in every tree, shape ``(n_estimators, n_rows)``."""
+        X = self._as_matrix(X)
+        rows = np.arange(len(X))
+        nodes = np.repeat(self.roots[:, None], len(X), axis=1)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_sampled(self, X, tree_index):
+        """Prediction of one tree per row, ``tree_index[i]`` for row ``i``."""
+        X = self._as_matrix(X)
+        rows = np.arange(len(X))
+        nodes = self.roots[tree_index]
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].astype(np.float64)
+
+    def predict_trees(self, X):
+        """Per-tree predictions, shape ``(n_estimators, n_rows)``."""
+        return self.value[self.apply(X)].astype(np.float64)
+
+    def predict(self, X):
+        return self.predict_trees(X).mean(axis=0)
+
+
+def compact_forest(model, n_estimators=None, max_depth=None, max_leaves=None, float32=False):
+    """Build a :class:`CompactForest` from a fitted sklearn RandomForestRegressor."""
+    estimators = model.estimators_[:n_estimators] if n_estimators else model.estimators_
+    parts = [_prune_tree(est.tree_, max_depth, max_leaves) for est in estimators]
+
+    sizes = [len(part[0]) for part in parts]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    left, right, feature, threshold, value = (np.concatenate(arrays) for arrays in zip(*parts))
+
+    # Offset children into the flat arrays and make leaves point to themselves
+    node_ids = np.arange(len(value))
+    tree_offsets = np.repeat(offsets, sizes)
+    is_leaf = left == -1
+    left = np.where(is_leaf, node_ids, left + tree_offsets)
+    right = np.where(is_leaf, node_ids, right + tree_offsets)
+
+    index_dtype = np.int32 if len(value) < 2 ** 31 else np.int64
+    value_dtype = np.float32 if float32 else np.float64
+    threshold = _floor_float32(threshold) if float32 else threshold.astype(np.float64)
+    depth = max(est.tree_.max_depth for est in estimators)
+    if max_depth is not None:
+        depth = min(depth, max_depth)
+
+    return CompactForest(
+        left=left.astype(index_dtype),
+        right=right.astype(index_dtype),
+        feature=feature.astype(np.int16),
+        threshold=threshold,
+        value=value.astype(value_dtype),
+        roots=offsets.astype(index_dtype),
+        max_depth=max(int(depth), 1),
+        feature_names=list(getattr(model, "feature_names_in_", FEATURES)),
+    )
+
+
+# === Report ===
+def _load_seconds(path, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        joblib.load(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _predict_seconds(model, X, repeat=20):
+    model.predict(X)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def backtest_split(df):
+    """The notebook's hold-out: the last 10% of rows, unshuffled."""
+    split = len(df) - int(np.ceil(len(df) * 0.1))
+    return df.iloc[:split], df.iloc[split:]
+
+
+def model_report(name, model, path, df, seeds, reference=None):
+    # Imported here: sklearn takes about a second to import and the app only needs CompactForest
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    _, test = backtest_split(df)
+    X_test, y_test = test[FEATURES], test[TARGET]
+    y_pred = model.predict(X_test)
+
+    row = {
+        "model": name,
+        "path": path,
+        "size_bytes": os.path.getsize(path),
+        "load_seconds": _load_seconds(path),
+        "predict_1_row_ms": _predict_seconds(model, X_test.iloc[:1]) * 1000,
+        "predict_all_counties_ms": _predict_seconds(model, X_test.iloc[:len(seeds)]) * 1000,
+        "mae": mean_absolute_error(y_test, y_pred),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "r2": r2_score(y_test, y_pred),
+    }
+    forecast = forecast_batch(model, list(seeds.values()))
+    if reference is not None:
+        ref_pred, ref_forecast = reference
+        row["max_abs_diff_vs_original"] = float(np.max(np.abs(y_pred - ref_pred)))
+        # Drift of the recursive 36-month forecasts relative to the original model
+        row["forecast_36m_mape_vs_original"] = float(
+            np.mean(np.abs(forecast[:, -1] - ref_forecast[:, -1]) / np.maximum(np.abs(ref_forecast[:, -1]), 1))
+        )
+    return row, (y_pred, forecast)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a compact serving artifact and a size/accuracy report.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--output", default="forecasting_ev_model_compact.pkl")
+    parser.add_argument("--report", help="write the report as JSON to this path")
+    parser.add_argument("--estimators", type=int, help="keep only the first N trees")
+    parser.add_argument("--max-depth", type=int, help="cut trees below this depth")
+    parser.add_argument("--max-leaves", type=int, help="keep at most this many leaves per tree")
+    parser.add_argument("--float32", action="store_true", help="store thresholds and values as float32")
+    parser.add_argument("--compress", type=int, default=3, help="joblib compression level (0 disables)")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    seeds = build_seeds(df)
+
+    compact = compact_forest(model, args.estimators, args.max_depth, args.max_leaves, args.float32)
+    joblib.dump(compact, args.output, compress=args.compress)
+
+    original_row, reference = model_report("original", model, args.model, df, seeds)
+    compact_row, _ = model_report("compact", compact, args.output, df, seeds, reference)
+    compact_row.update({
+        "n_estimators": compact.n_estimators,
+        "node_count": compact.node_count,
+        "max_depth": compact.max_depth,
+        "float32": args.float32,
+    })
+
+    report = pd.DataFrame([original_row, compact_row]).set_index("model")
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(report.drop(columns="path").T.to_string())
+    if args.report:
+        with open(args.report, "w") as handle:
+            json.dump([original_row, compact_row], handle, indent=2, default=float)
+
+
+if __name__ == "__main__":
+    # Run from the package module so pickles reference forecasting.compact, not __main__
+    from forecasting.compact import main as package_main
+    package_main()
@@ -0,0 +1,296 @@
+"""Embedded SQLite store for county history, forecasts and model versions.
+
+The app and the tools otherwise answer every question with a scan of the
+whole CSV in memory. The database keeps:
+
+* ``history``: the county-month rows of the dataset, loaded in chunks and
+  indexed on ``(State, County, Date)``, ``(County, Date)`` (the app selects
+  counties by name) and ``Date``;
+* ``forecasts``: forecasts of every county per model version, keyed on
+  ``(model, State, County, Date)`` and indexed on ``(State, County, Date)``,
+  so runs of new model versions accumulate next to the old ones;
+* ``model_versions``: the model fingerprints forecasts were made with;
+* ``feedback``: the app's feedback submissions, append-only, tagged with
+  the county and forecast fingerprint the user was looking at (written in
+  batches by :class:`forecasting.feedback.FeedbackWriter`).
+
+Lookups and aggregations run in SQL and return only the rows asked for.
+Every call opens its own connection (cheap for SQLite), so one
+:class:`ForecastDatabase` can be shared by threads; the database runs in
+WAL mode, so readers are not blocked while a batch writes.
+
+Usage::
+
+    python -m forecasting.database --db ev_forecaster.sqlite sync --data preprocessed_ev_data.csv
+    python -m forecasting.database --db ev_forecaster.sqlite top-growth --state WA --months 12
+    python -m forecasting.database --db ev_forecaster.sqlite month 2024-01
+"""
+import argparse
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from .engine import TARGET, file_fingerprint
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS model_versions (
+    fingerprint TEXT PRIMARY KEY,
+    path TEXT,
+    registered TEXT NOT NULL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS forecasts (
+    model TEXT NOT NULL REFERENCES model_versions (fingerprint),
+    State TEXT,
+    County TEXT NOT NULL,
+    Date TEXT NOT NULL,
+    predicted REAL NOT NULL,
+    cumulative REAL,
+    created TEXT NOT NULL,
+    PRIMARY KEY (model, State, County, Date)
+);
+CREATE INDEX IF NOT EXISTS forecasts_state_county_date ON forecasts (State, County, Date);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submitted TEXT NOT NULL,
+    kind TEXT,
+    message TEXT NOT NULL,
+    County TEXT,
+    fingerprint TEXT
+);
+"""
+
+HISTORY_INDEXES = """
+CREATE INDEX IF NOT EXISTS history_state_county_date ON history (State, County, Date);
+CREATE INDEX IF NOT EXISTS history_county_date ON history (County, Date);
+CREATE INDEX IF NOT EXISTS history_date ON history (Date);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _month_bounds(month):
+    start = pd.Timestamp(month).to_period("M").start_time
+    return start.strftime("%Y-%m-%d"), (start + pd.DateOffset(months=1)).strftime("%Y-%m-%d")
+
+
+class ForecastDatabase:
+    def __init__(self, path):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _query(self, sql, params=(), dates=("Date",)):
+        with closing(self._connect()) as conn:
+            frame = pd.read_sql_query(sql, conn, params=params)
+        for column in dates:
+            if column in frame:
+                frame[column] = pd.to_datetime(frame[column])
+        return frame
+
+    # === History ===
+    def history_fingerprint(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'history_fingerprint'").fetchone()
+        return row[0] if row else None
+
+    def sync_history(self, data_path, chunksize=50_000):
+        """Load ``data_path`` into ``history`` unless this version is already there.
+
+        The CSV is read and inserted chunk by chunk into a staging table,
+        which then replaces ``history`` in one transaction, so readers see
+        either version in full. Returns the rows loaded (0 when already
+        current).
+        """
+        fingerprint = file_fingerprint(data_path)
+        if self.history_fingerprint() == fingerprint:
+            return 0
+        rows = 0
+        with closing(self._connect()) as conn:
+            conn.execute("DROP TABLE IF EXISTS history_new")
+            for chunk in pd.read_csv(data_path, chunksize=chunksize, low_memory=False):
+                chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce").dt.strftime("%Y-%m-%d")
+                chunk = chunk.dropna(subset=["Date"])
+                chunk.to_sql("history_new", conn, if_exists="append", index=False)
+                rows += len(chunk)
+
+            # pandas commits on its own, so the swap manages its transaction explicitly
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DROP TABLE IF EXISTS history")
+                conn.execute("ALTER TABLE history_new RENAME TO history")
+                for statement in HISTORY_INDEXES.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('history_fingerprint', ?)", (fingerprint,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return rows
+
+    def county_history(self, county, state=None):
+        """Every history row of one county (in one state, if given), oldest first.
+
+        Rows of the same month keep their order in the CSV, like a stable sort.
+        """
+        if state is None:
+            return self._query("SELECT * FROM history WHERE County = ? ORDER BY Date, rowid", (county,))
+        return self._query("SELECT * FROM history WHERE State = ? AND County = ? ORDER BY Date, rowid",
+                           (state, county))
+
+    def month_values(self, month, state=None):
+        """Every county's rows in the calendar month containing ``month``."""
+        start, end = _month_bounds(month)
+        sql = "SELECT * FROM history WHERE Date >= ? AND Date < ?"
+        params = [start, end]
+        if state is not None:
+            sql += " AND State = ?"
+            params.append(state)
+        return self._query(sql + " ORDER BY State, County, rowid", params)
+
+    def top_growth(self, state=None, months=12, limit=10):
+        """Counties with the most new EVs in the latest ``months`` months of the state's data.
+
+        ``Growth`` compares them with the ``months`` months before; it is
+        empty when the county had none then.
+        """
+        in_state = "WHERE State = ?" if state else ""
+        sql = f"""
+            WITH bounds AS (
+                SELECT date(MAX(Date), '-{int(months)} months') AS recent,
+                       date(MAX(Date), '-{2 * int(months)} months') AS previous
+                FROM history {in_state}
+            )
+            SELECT State, County,
+                   SUM(CASE WHEN Date > bounds.recent THEN "{TARGET}" ELSE 0 END) AS "New EVs",
+                   SUM(CASE WHEN Date <= bounds.recent THEN "{TARGET}" ELSE 0 END) AS "Previous EVs"
+            FROM history, bounds
+            WHERE Date > bounds.previous {"AND State = ?" if state else ""}
+            GROUP BY State, County
+            ORDER BY "New EVs" DESC
+            LIMIT ?
+        """
+        params = ([state, state] if state else []) + [limit]
+        frame = self._query(sql, params)
+        previous = frame["Previous EVs"].where(frame["Previous EVs"] > 0)
+        frame["Growth"] = frame["New EVs"] / previous - 1
+        return frame
+
+    # === Model versions and forecasts ===
+    def record_model(self, fingerprint, path=None, metadata=None):
+        """Register a model version; registering it again keeps the first record."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO model_versions VALUES (?, ?, ?, ?)",
+                         (fingerprint, path, _now(), json.dumps(metadata) if metadata else None))
+
+    def model_versions(self):
+        return self._query("SELECT * FROM model_versions ORDER BY registered", dates=())
+
+    def store_forecasts(self, model, frame):
+        """Bulk insert export-style rows (County, State, Date, Predicted EV Total, ...) for ``model``.
+
+        Forecasting the same county and month with the same model again
+        replaces the row. Returns the rows written.
+        """
+        cumulative = frame["Cumulative New EVs"] if "Cumulative New EVs" in frame else [None] * len(frame)
+        created = _now()
+        rows = zip(
+            [model] * len(frame), frame["State"], frame["County"],
+            pd.to_datetime(frame["Date"]).dt.strftime("%Y-%m-%d"),
+            frame["Predicted EV Total"].astype(float), cumulative, [created] * len(frame),
+        )
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(frame)
+
+    def forecasts(self, model, county=None, state=None):
+        """Stored forecasts of one model version, optionally for one state and/or county."""
+        sql = "SELECT State, County, Date, predicted, cumulative, created FROM forecasts WHERE model = ?"
+        params = [model]
+        if state is not None:
+            sql += " AND State = ?"
+            params.append(state)
+        if county is not None:
+            sql += " AND County = ?"
+            params.append(county)
+        return self._query(sql + " ORDER BY State, County, Date", params)
+
+    # === Feedback ===
+    def add_feedback(self, records):
+        """Append ``(submitted, kind, message, county, fingerprint)`` tuples in one transaction."""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT INTO feedback (submitted, kind, message, County, fingerprint) "
+                             "VALUES (?, ?, ?, ?, ?)", records)
+        return len(records)
+
+    def feedback(self, limit=20):
+        """Latest feedback first."""
+        return self._query("SELECT * FROM feedback ORDER BY id DESC LIMIT ?", (limit,), dates=())
+
+
+def stored(database, model, frames):
+    """Pass forecast chunks through, storing each one for ``model`` on the way."""
+    for frame in frames:
+        database.store_forecasts(model, frame)
+        yield frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the dataset into the forecast database and query it.")
+    parser.add_argument("--db", default="ev_forecaster.sqlite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sync = commands.add_parser("sync", help="load the current version of the dataset")
+    sync.add_argument("--data", default="preprocessed_ev_data.csv")
+
+    top = commands.add_parser("top-growth", help="counties with the most new EVs recently")
+    top.add_argument("--state")
+    top.add_argument("--months", type=int, default=12)
+    top.add_argument("--limit", type=int, default=10)
+
+    month = commands.add_parser("month", help="every county's values in one month")
+    month.add_argument("month", help="e.g. 2024-01")
+    month.add_argument("--state")
+
+    commands.add_parser("models", help="model versions with stored forecasts")
+
+    feedback = commands.add_parser("feedback", help="latest feedback from the app")
+    feedback.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    database = ForecastDatabase(args.db)
+    start = time.perf_counter()
+    if args.command == "sync":
+        rows = database.sync_history(args.data)
+        print(f"{rows:,} history rows loaded in {time.perf_counter() - start:.2f} s" if rows
+              else f"{args.data} is already loaded")
+        return
+    if args.command == "top-growth":
+        result = database.top_growth(args.state, args.months, args.limit)
+    elif args.command == "month":
+        result = database.month_values(args.month, args.state)
+        result = result[["State", "County", "Vehicle Primary Use", TARGET, "Percent Electric Vehicles"]]
+    elif args.command == "feedback":
+        result = database.feedback(args.limit)
+    else:
+        result = database.model_versions()
+    elapsed = time.perf_counter() - start
+    print(result.to_string(index=False))
+    print(f"{len(result):,} rows in {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
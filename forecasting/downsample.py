@@ -0,0 +1,58 @@
+"""Bounded point counts for chart traces.
+
+A line chart can't show more points than it has pixels, but Plotly sends
+and draws every point it is given. :func:`downsample` keeps at most a
+budget of points per trace with Largest-Triangle-Three-Buckets (LTTB):
+the first and last points, plus from each bucket in between the point that
+spans the largest triangle with its neighbours, which preserves the visible
+shape of the line, its peaks and its turning points.
+"""
+import numpy as np
+import pandas as pd
+
+# Points closer than this many pixels are indistinguishable on a line
+PIXELS_PER_POINT = 3
+
+
+def point_budget(width_px, pixels_per_point=PIXELS_PER_POINT, minimum=32):
+    """Points per trace worth sending to a chart ``width_px`` pixels wide."""
+    return max(minimum, int(width_px // pixels_per_point))
+
+
+def lttb(x, y, n_out):
+    """Positions of the ``n_out`` points LTTB keeps from the series ``(x, y)``."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        area = np.abs((x[anchor] - next_x) * (y[start:stop] - y[anchor])
+                      - (x[anchor] - x[start:stop]) * (next_y - y[anchor]))
+        anchor = start + int(area.argmax())
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def downsample(frame, x, y, n_out):
+    """Rows of ``frame`` LTTB keeps for the line ``y`` over ``x`` (dates are allowed)."""
+    if len(frame) <= n_out:
+        return frame
+    xs = frame[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return frame.iloc[lttb(xs, frame[y], n_out)]
+
+
+def linear_trend(values):
+    """Least-squares ``(slope, intercept)`` of ``values`` over their positions."""
+    return tuple(np.polyfit(np.arange(len(values)), np.asarray(values, dtype=float), 1))
@@ -0,0 +1,289 @@
+"""Streaming drift monitoring of the model features and residuals.
+
+A :class:`DriftMonitor` keeps two summaries of every model feature and of
+the model's residuals: the training reference and everything appended
+since. Each summary is a set of running moments plus a sketch that counts
+values between the reference deciles, so folding in new months costs
+O(new rows) and never rescans history. Both are mergeable, so summaries of
+separate chunks can be combined.
+
+Drift is scored with the population stability index (PSI) of the decile
+counts and the shift of the mean in reference standard deviations.
+Residual references are in-sample and therefore optimistic; a growing
+residual PSI is the signal, not its absolute level.
+
+Usage::
+
+    python -m forecasting.drift reference --data preprocessed_ev_data.csv --output drift_monitor.json
+    python -m forecasting.drift update --data preprocessed_ev_data.csv --state drift_monitor.json
+"""
+import argparse
+import json
+import math
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import FEATURES, TARGET
+
+RESIDUAL = "residual"
+# months_since_start grows with every appended month, so it would always drift
+MONITORED = [feature for feature in FEATURES if feature != "months_since_start"]
+# PSI levels commonly read as "moderate" and "significant" shifts
+PSI_WARN = 0.1
+PSI_ALERT = 0.25
+# Fewer new rows than this are not scored
+MIN_ROWS = 100
+
+
+class RunningMoments:
+    """Count, mean, variance and range, updated in batches and mergeable (Chan et al.)."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=math.inf, maximum=-math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge(RunningMoments(len(values), mean, ((values - mean) ** 2).sum(), values.min(), values.max()))
+        return self
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+            self.count = count
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "minimum": self.minimum, "maximum": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class BinnedSketch:
+    """Counts of values between fixed edges; the edges are the reference quantiles."""
+
+    def __init__(self, edges, counts=None):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64) if counts is None else np.asarray(counts)
+
+    @classmethod
+    def from_reference(cls, values, n_bins=10):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        # Repeated quantiles of discrete features collapse into one edge
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        return cls(edges).update(values)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        self.counts += np.bincount(np.searchsorted(self.edges, values, side="right"), minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def empty_like(self):
+        return BinnedSketch(self.edges)
+
+    @property
+    def fractions(self):
+        total = self.counts.sum()
+        return self.counts / total if total else np.zeros(len(self.counts))
+
+    def quantile(self, q, low, high):
+        """Approximate quantile, interpolating within the bin; ``low``/``high`` bound the outer bins."""
+        bounds = np.concatenate([[low], self.edges, [high]])
+        cumulative = np.concatenate([[0], np.cumsum(self.fractions)])
+        return float(np.interp(q, cumulative, bounds))
+
+    def to_dict(self):
+        return {"edges": self.edges.tolist(), "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["edges"], data["counts"])
+
+
+def psi(reference, current, floor=1e-4):
+    """Population stability index between two sketches with the same edges."""
+    p = np.maximum(reference.fractions, floor)
+    q = np.maximum(current.fractions, floor)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def residuals(model, rows):
+    if model is None or not len(rows):
+        return np.empty(0)
+    return rows[TARGET].to_numpy(dtype=float) - model.predict(rows[FEATURES])
+
+
+class DriftMonitor:
+    """Reference and streaming summaries of every monitored column.
+
+    ``watermark`` is the latest date already folded in; :meth:`update` only
+    reads rows after it.
+    """
+
+    def __init__(self, reference, current, watermark):
+        self.reference = reference
+        self.current = current
+        self.watermark = pd.Timestamp(watermark)
+
+    @classmethod
+    def build(cls, df, model=None, columns=MONITORED, n_bins=10):
+        """Reference summaries of the training rows ``df``."""
+        values = {column: df[column].to_numpy(dtype=float) for column in columns}
+        if model is not None:
+            values[RESIDUAL] = residuals(model, df)
+        reference = {column: (RunningMoments().update(v), BinnedSketch.from_reference(v, n_bins))
+                     for column, v in values.items()}
+        current = {column: (RunningMoments(), sketch.empty_like()) for column, (_, sketch) in reference.items()}
+        return cls(reference, current, df["Date"].max())
+
+    def update(self, df, model=None):
+        """Fold in the rows of ``df`` newer than the watermark; returns how many."""
+        rows = df[df["Date"] > self.watermark]
+        if not len(rows):
+            return 0
+        for column, (moments, sketch) in self.current.items():
+            if column == RESIDUAL:
+                if model is None:
+                    continue
+                values = residuals(model, rows)
+            else:
+                values = rows[column].to_numpy(dtype=float)
+            moments.update(values)
+            sketch.update(values)
+        self.watermark = rows["Date"].max()
+        return len(rows)
+
+    def report(self, min_rows=MIN_ROWS):
+        """One row per column with the drift scores and a status."""
+        records = []
+        for column, (ref_moments, ref_sketch) in self.reference.items():
+            moments, sketch = self.current[column]
+            scored = moments.count >= min_rows
+            shift = (moments.mean - ref_moments.mean) / ref_moments.std if ref_moments.std and moments.count else 0.0
+            score = psi(ref_sketch, sketch) if scored else float("nan")
+            if not scored:
+                status = "insufficient data"
+            elif score >= PSI_ALERT:
+                status = "alert"
+            elif score >= PSI_WARN:
+                status = "warn"
+            else:
+                status = "ok"
+            records.append({
+                "column": column,
+                "rows": moments.count,
+                "reference_mean": ref_moments.mean,
+                "current_mean": moments.mean if moments.count else float("nan"),
+                "mean_shift_sd": shift,
+                "current_p90": sketch.quantile(0.9, moments.minimum, moments.maximum) if moments.count else float("nan"),
+                "psi": score,
+                "status": status,
+            })
+        return pd.DataFrame(records).set_index("column")
+
+    def alerts(self, min_rows=MIN_ROWS):
+        """Human-readable messages for the columns whose status is warn or alert."""
+        report = self.report(min_rows)
+        flagged = report[report["status"].isin(["warn", "alert"])]
+        return [f"{column}: PSI {row.psi:.2f} ({row.status}), mean {row.reference_mean:.3g} -> "
+                f"{row.current_mean:.3g} ({row.mean_shift_sd:+.1f} sd) over {row.rows:,} new rows"
+                for column, row in flagged.iterrows()]
+
+    def to_dict(self):
+        def summaries(columns):
+            return {column: {"moments": m.to_dict(), "sketch": s.to_dict()} for column, (m, s) in columns.items()}
+        return {"watermark": self.watermark.isoformat(), "reference": summaries(self.reference),
+                "current": summaries(self.current)}
+
+    @classmethod
+    def from_dict(cls, data):
+        def summaries(columns):
+            return {column: (RunningMoments.from_dict(s["moments"]), BinnedSketch.from_dict(s["sketch"]))
+                    for column, s in columns.items()}
+        return cls(summaries(data["reference"]), summaries(data["current"]), data["watermark"])
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as handle:
+            json.dump(self.to_dict(), handle, indent=1, default=float)
+        # Replaced atomically so the app never reads a half-written state
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as handle:
+            return cls.from_dict(json.load(handle))
+
+
+def read_data(path):
+    df = pd.read_csv(path)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df.dropna(subset=["Date"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a drift reference or fold new rows into the drift state.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reference = commands.add_parser("reference", help="summarize the training data as the reference")
+    reference.add_argument("--data", default="preprocessed_ev_data.csv")
+    reference.add_argument("--model", default="forecasting_ev_model.pkl", help="model for the residual reference")
+    reference.add_argument("--output", default="drift_monitor.json")
+    reference.add_argument("--bins", type=int, default=10)
+
+    update = commands.add_parser("update", help="fold rows newer than the watermark into the state and report")
+    update.add_argument("--data", default="preprocessed_ev_data.csv")
+    update.add_argument("--model", default="forecasting_ev_model.pkl")
+    update.add_argument("--state", default="drift_monitor.json")
+    update.add_argument("--min-rows", type=int, default=MIN_ROWS)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model) if args.model else None
+    df = read_data(args.data)
+
+    if args.command == "reference":
+        monitor = DriftMonitor.build(df, model, n_bins=args.bins)
+        monitor.save(args.output)
+        print(f"Reference of {len(df):,} rows up to {monitor.watermark.date()} written to {args.output}")
+        return
+
+    monitor = DriftMonitor.load(args.state)
+    added = monitor.update(df, model)
+    monitor.save(args.state)
+    print(f"Folded in {added:,} new rows; watermark {monitor.watermark.date()}")
+    print(monitor.report(args.min_rows).round(3).to_string())
+    for message in monitor.alerts(args.min_rows):
+        print(f"DRIFT {message}")
+
+
+if __name__ == "__main__":
+    main()
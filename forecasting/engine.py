@@ -0,0 +1,323 @@
+"""Batched recursive forecasting and the shared forecast cache.
+
+The app forecasts a county by feeding each prediction back in as the next
+lag. Doing that one county at a time costs one ``model.predict`` per county
+per month, so this module advances many counties together: every step builds
+one feature matrix for all rows and makes a single predict call.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Feature order used when the model was trained in the notebook
+FEATURES = [
+    "months_since_start",
+    "county_encoded",
+    "ev_total_lag1",
+    "ev_total_lag2",
+    "ev_total_lag3",
+    "ev_total_roll_mean_3",
+    "ev_total_pct_change_1",
+    "ev_total_pct_change_3",
+    "ev_growth_slope",
+]
+TARGET = "Electric Vehicle (EV) Total"
+DEFAULT_HORIZON = 36
+# Longest horizon the app offers (10 years); errors compound over recursive steps
+MAX_HORIZON = 120
+HISTORY_WINDOW = 6
+
+# x-offsets of the 6-month window used for the growth slope
+_SLOPE_X = np.arange(HISTORY_WINDOW, dtype=float) - (HISTORY_WINDOW - 1) / 2
+_SLOPE_DENOM = float(np.sum(_SLOPE_X ** 2))
+
+
+# === Predict observers ===
+# Callables receiving (seconds, batch_size) after every model.predict made by
+# the engine. With no observers registered predict is not timed at all.
+_predict_observers = []
+
+
+def add_predict_observer(observer):
+    if observer not in _predict_observers:
+        _predict_observers.append(observer)
+
+
+def remove_predict_observer(observer):
+    if observer in _predict_observers:
+        _predict_observers.remove(observer)
+
+
+def predict(model, X):
+    """``model.predict`` that reports its latency and batch size to observers."""
+    if not _predict_observers:
+        return model.predict(X)
+    start = time.perf_counter()
+    result = model.predict(X)
+    elapsed = time.perf_counter() - start
+    for observer in _predict_observers:
+        observer(elapsed, len(X))
+    return result
+
+
+def _model_input(model, X):
+    """``X`` as the model expects it: the raw matrix or a DataFrame with feature names."""
+    if getattr(model, "accepts_arrays", False):
+        return X
+    return pd.DataFrame(X, columns=FEATURES)
+
+
+# === Fingerprints ===
+def file_fingerprint(path):
+    """Short fingerprint of a file based on its size and modification time."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+    token = f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(token.encode()).hexdigest()[:12]
+
+
+def content_fingerprint(path, chunk_size=1 << 20):
+    """Short sha1 of a file's contents; unlike mtimes it survives copies between hosts."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def forecast_fingerprint(model_path, data_path):
+    """Fingerprint identifying forecasts made by one model on one dataset."""
+    return f"{file_fingerprint(model_path)}-{file_fingerprint(data_path)}"
+
+
+# === County seeds ===
+def county_seed(county_df, county):
+    """Extract the state the recursive forecaster starts from for one county.
+
+    ``county_df`` must already be sorted by date.
+    """
+    return {
+        "county": county,
+        "county_code": county_df["county_encoded"].iloc[0],
+        "history": county_df[TARGET].values[-HISTORY_WINDOW:].astype(float),
+        "months_since_start": county_df["months_since_start"].max(),
+        "latest_date": county_df["Date"].max(),
+    }
+
+
+def build_seeds(df):
+    """Build seeds for every county in the dataset, keyed by county name."""
+    seeds = {}
+    for county, county_df in df.groupby("County", sort=True):
+        seeds[county] = county_seed(county_df.sort_values("Date"), county)
+    return seeds
+
+
+# === Batched recursive forecast ===
+def throttled(progress, interval=0.1):
+    """Wrap ``progress(done, total)`` to run at most once per ``interval`` seconds.
+
+    The final call (``done == total``) always goes through. Every UI update
+    is a message to the browser, so per-step updates of a long forecast
+    would mostly queue up behind each other.
+    """
+    last = -float("inf")
+
+    def update(done, total):
+        nonlocal last
+        now = time.monotonic()
+        if done >= total or now - last >= interval:
+            last = now
+            progress(done, total)
+    return update
+
+
+def forecast_batch(model, seeds, horizon=DEFAULT_HORIZON, progress=None, should_stop=None, adjust=None,
+                   partial=None, chunk=12):
+    """Forecast ``horizon`` months for every seed with one predict call per step.
+
+    Returns an array of shape ``(len(seeds), horizon)``, or ``None`` when
+    ``should_stop`` returns True between steps. ``progress(step, horizon)`` is
+    called after each step. ``adjust(step, pred, lag1)`` may rewrite each
+    step's predictions before they are fed back as lags (used by scenarios).
+    ``partial(preds)`` receives the months forecast so far, shape
+    ``(len(seeds), step)``, after every ``chunk`` steps before the last, so
+    callers can show a long forecast while it is still running.
+
+    ``seeds`` is a list of seed dicts or a structured array of records from
+    :mod:`forecasting.store`, which needs no per-row preparation.
+
+    Models with a ``route(codes)`` method (see :class:`forecasting.zoo.ModelZoo`)
+    are split once into ``(sub_model, rows)`` groups; every step then makes
+    one predict call per sub-model on its rows.
+    """
+    n = len(seeds)
+    if n == 0:
+        return np.empty((0, horizon))
+
+    # Histories shorter than the window are left-padded; the valid counts
+    # reproduce the "not enough history" fallbacks of the original loop.
+    if isinstance(seeds, np.ndarray) and seeds.dtype.names:
+        hist = seeds["history"].astype(float)
+        cum = np.cumsum(hist, axis=1)
+        valid = np.minimum(seeds["n_history"], HISTORY_WINDOW)
+        months = seeds["months_since_start"].astype(float)
+        codes = seeds["county_code"].astype(float)
+    else:
+        hist = np.zeros((n, HISTORY_WINDOW))
+        cum = np.zeros((n, HISTORY_WINDOW))
+        valid = np.zeros(n, dtype=int)
+        for row, seed in enumerate(seeds):
+            values = np.asarray(seed["history"], dtype=float)[-HISTORY_WINDOW:]
+            hist[row, HISTORY_WINDOW - len(values):] = values
+            cum[row, HISTORY_WINDOW - len(values):] = np.cumsum(values)
+            valid[row] = len(values)
+        months = np.array([seed["months_since_start"] for seed in seeds], dtype=float)
+        codes = np.array([seed["county_code"] for seed in seeds], dtype=float)
+    routes = model.route(codes) if hasattr(model, "route") else None
+
+    preds = np.empty((n, horizon))
+    for step in range(horizon):
+        if should_stop is not None and should_stop():
+            return None
+
+        months += 1
+        lag1, lag2, lag3 = hist[:, -1], hist[:, -2], hist[:, -3]
+        roll_mean = (lag1 + lag2 + lag3) / 3
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change_1 = np.where(lag2 != 0, (lag1 - lag2) / lag2, 0.0)
+            pct_change_3 = np.where(lag3 != 0, (lag1 - lag3) / lag3, 0.0)
+        # Closed-form least-squares slope, same as np.polyfit(range(6), y, 1)[0]
+        slope = (cum - cum.mean(axis=1, keepdims=True)) @ _SLOPE_X / _SLOPE_DENOM
+        slope = np.where(valid >= HISTORY_WINDOW, slope, 0.0)
+
+        X = np.column_stack([
+            months, codes, lag1, lag2, lag3, roll_mean,
+            pct_change_1, pct_change_3, slope,
+        ])
+        if routes is None:
+            pred = predict(model, _model_input(model, X))
+        else:
+            pred = np.empty(n)
+            for sub_model, rows in routes:
+                pred[rows] = predict(sub_model, _model_input(sub_model, X[rows]))
+        if adjust is not None:
+            pred = adjust(step, pred, lag1)
+        preds[:, step] = pred
+
+        hist = np.column_stack([hist[:, 1:], pred])
+        cum = np.column_stack([cum[:, 1:], cum[:, -1] + pred])
+        valid = np.minimum(valid + 1, HISTORY_WINDOW)
+
+        if progress is not None:
+            progress(step + 1, horizon)
+        if partial is not None and (step + 1) % chunk == 0 and step + 1 < horizon:
+            partial(preds[:, :step + 1])
+
+    return preds
+
+
+def forecast_frame(seed, preds):
+    """Turn one row of predictions into the app's forecast DataFrame."""
+    latest_date = pd.Timestamp(seed["latest_date"])
+    dates = [latest_date + pd.DateOffset(months=i) for i in range(1, len(preds) + 1)]
+    return pd.DataFrame({"Date": dates, "Predicted EV Total": np.round(preds)})
+
+
+# === Forecast cache ===
+class ForecastCache:
+    """Thread-safe LRU cache of forecast frames keyed by fingerprint, county and horizon.
+
+    Shared between Streamlit sessions and the background prefetcher, so the
+    number of entries is capped to keep memory bounded.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(fingerprint, county, horizon):
+        return (fingerprint, county, horizon)
+
+    def get(self, key):
+        with self._lock:
+            frame = self._entries.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frame.copy()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key, frame):
+        with self._lock:
+            self._entries[key] = frame
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, fingerprint_prefix):
+        """Drop every entry whose fingerprint starts with ``fingerprint_prefix``."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0].startswith(fingerprint_prefix)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+def cached_forecasts(model, cache, fingerprint, seeds, counties, horizon=DEFAULT_HORIZON,
+                     progress=None, metrics=None, partial=None):
+    """Return forecast frames for ``counties``, batch-forecasting only the cache misses.
+
+    ``metrics`` (an :class:`forecasting.metrics.AppMetrics`) counts how many
+    forecasts were served from the cache and how many were computed.
+    ``partial(frames)`` receives the shorter frames of the counties being
+    forecast as each 12-month chunk finishes (see :func:`forecast_batch`).
+    """
+    frames = {}
+    missing = []
+    for county in counties:
+        frame = cache.get(ForecastCache.key(fingerprint, county, horizon))
+        if frame is None:
+            missing.append(county)
+        else:
+            frames[county] = frame
+    if metrics is not None:
+        metrics.observe_forecasts(cached=len(frames), computed=len(missing))
+
+    if missing:
+        # A SeedStore hands over its records without building per-county dicts
+        batch = seeds.select(missing) if hasattr(seeds, "select") else [seeds[c] for c in missing]
+        on_chunk = None if partial is None else lambda done: partial(
+            {county: forecast_frame(seeds[county], row) for county, row in zip(missing, done)}
+        )
+        preds = forecast_batch(model, batch, horizon, progress=progress, partial=on_chunk)
+        for county, row in zip(missing, preds):
+            frame = forecast_frame(seeds[county], row)
+            cache.put(ForecastCache.key(fingerprint, county, horizon), frame)
+            frames[county] = frame.copy()
+
+    return frames
@@ -0,0 +1,289 @@
+"""Per-month feature attributions of a forecast (exact path-dependent TreeSHAP).
+
+The forest's prediction for a row is the average over trees of the sum over
+leaves of ``value * [row reaches leaf]``. With a feature hidden, TreeSHAP
+sends the row down both sides of that feature's splits, weighted by the
+training samples on each side. So each leaf contributes, for every feature,
+either 1/0 ("one": the row satisfies all of that feature's conditions on the
+path) or the cover fraction of those edges ("zero"). That makes every leaf a
+product of per-feature factors, and its Shapley values follow from the
+coefficients of ``prod_j (zero_j + one_j * t)``.
+
+:class:`TreeExplainer` stores every leaf's feature intervals and cover
+fractions as arrays, grouped by how many distinct features the path splits
+on (features off the path cannot change a leaf's value and get no credit
+from it). :meth:`TreeExplainer.shap_values` evaluates all rows against all
+leaves of all trees at once, one array expression per group. Only the
+extraction of the paths, done once per model, walks the trees in Python.
+
+Usage::
+
+    python -m forecasting.explain --county Kings --horizon 36
+"""
+import argparse
+import math
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, FEATURES, _model_input, build_seeds, forecast_batch
+
+FEATURE_LABELS = {
+    "months_since_start": "Months since start",
+    "county_encoded": "County code",
+    "ev_total_lag1": "EVs last month",
+    "ev_total_lag2": "EVs 2 months ago",
+    "ev_total_lag3": "EVs 3 months ago",
+    "ev_total_roll_mean_3": "3-month average",
+    "ev_total_pct_change_1": "1-month % change",
+    "ev_total_pct_change_3": "3-month % change",
+    "ev_growth_slope": "6-month growth slope",
+}
+
+
+def _leaf_paths(tree, n_features):
+    """Intervals and cover fractions of every leaf of a fitted sklearn tree."""
+    left, right = tree.children_left, tree.children_right
+    feature, threshold = tree.feature, tree.threshold
+    cover = tree.weighted_n_node_samples
+    values = tree.value[:, 0, 0]
+
+    lowers, uppers, zeros, leaf_values = [], [], [], []
+    stack = [(0, np.full(n_features, -np.inf), np.full(n_features, np.inf), np.ones(n_features))]
+    while stack:
+        node, lower, upper, zero = stack.pop()
+        if left[node] == -1:
+            lowers.append(lower)
+            uppers.append(upper)
+            zeros.append(zero)
+            leaf_values.append(values[node])
+            continue
+        f, t = feature[node], threshold[node]
+        # x <= t goes left
+        child_upper = upper.copy()
+        child_upper[f] = min(upper[f], t)
+        child_zero = zero.copy()
+        child_zero[f] *= cover[left[node]] / cover[node]
+        stack.append((left[node], lower, child_upper, child_zero))
+
+        child_lower = lower.copy()
+        child_lower[f] = max(lower[f], t)
+        child_zero = zero.copy()
+        child_zero[f] *= cover[right[node]] / cover[node]
+        stack.append((right[node], child_lower, upper, child_zero))
+    return np.array(lowers), np.array(uppers), np.array(zeros), np.array(leaf_values)
+
+
+def _shapley_weights(n_players):
+    """Shapley weight of a coalition of size k among the other ``n_players - 1``."""
+    return np.array([math.factorial(k) * math.factorial(n_players - 1 - k) / math.factorial(n_players)
+                     for k in range(n_players)])
+
+
+class _LeafGroup:
+    """Leaves whose paths split on the same number ``d`` of distinct features.
+
+    A feature a path does not split on cannot change that leaf's value, so
+    it is a null player there and every leaf only needs a ``d``-player game.
+    """
+
+    def __init__(self, features, lower, upper, zero, value, n_features):
+        self.features = features
+        self.lower = lower
+        self.upper = upper
+        self.zero = zero
+        self.value = value
+        d = features.shape[1]
+        self.weights = _shapley_weights(d)
+        # Dividing the coefficients by (zero_i + t) and weighting the quotient is a dot
+        # product with unwind[leaf, :, i], which only depends on the leaf: entry m is
+        # sum_{k<m} weight_k * (-zero_i) ** (m - 1 - k)
+        unwind = np.zeros((len(value), d + 1, d))
+        for m in range(1, d + 1):
+            unwind[:, m] = -zero * unwind[:, m - 1] + self.weights[m - 1]
+        self.unwind = unwind
+        # Scatters (leaf, slot) contributions onto the model's features
+        self.scatter = np.zeros((len(value) * d, n_features))
+        self.scatter[np.arange(features.size), features.ravel()] = 1.0
+
+    def shap_values(self, X):
+        d = self.features.shape[1]
+        x = X[:, self.features]
+        one = ((x > self.lower) & (x <= self.upper)).astype(float)
+
+        # coefficients[k]: sum over coalitions S of size k of prod_{S} one * prod_{not S} zero
+        coefficients = np.zeros((d + 1,) + one.shape[:2])
+        coefficients[0] = 1.0
+        for j in range(d):
+            shifted = coefficients[:j + 1] * one[..., j]
+            coefficients[:j + 1] *= self.zero[:, j]
+            coefficients[1:j + 2] += shifted
+
+        # Weighted quotient after dividing feature i back out: by zero_i when the row
+        # fails its conditions, by (zero_i + t) when it satisfies them
+        satisfied = np.matmul(coefficients.transpose(2, 1, 0), self.unwind).transpose(1, 0, 2)
+        failed = np.tensordot(self.weights, coefficients[:-1], axes=1)[..., None] / self.zero
+        contributions = (one - self.zero) * np.where(one > 0, satisfied, failed) * self.value[:, None]
+        return contributions.reshape(len(X), -1) @ self.scatter
+
+
+def _positional_names(n):
+    """Names of the features of a forest fitted without feature names."""
+    return [f"x{i}" for i in range(n)]
+
+
+class TreeExplainer:
+    """Exact path-dependent SHAP values of a tree-averaging regressor."""
+
+    def __init__(self, lower, upper, zero, value, n_trees, feature_names):
+        self.lower = lower
+        self.upper = upper
+        self.zero = zero
+        # Leaf values are pre-divided by the tree count, so sums over leaves average over trees
+        self.value = value / n_trees
+        self.n_trees = n_trees
+        self.feature_names = list(feature_names)
+
+        on_path = np.isfinite(lower) | np.isfinite(upper)
+        n_path = on_path.sum(axis=1)
+        self._groups = []
+        for d in np.unique(n_path[n_path > 0]):
+            leaves = np.flatnonzero(n_path == d)
+            # Path features first, in feature order
+            features = np.argsort(~on_path[leaves], axis=1, kind="stable")[:, :d]
+            rows = leaves[:, None]
+            self._groups.append(_LeafGroup(features, lower[rows, features], upper[rows, features],
+                                           zero[rows, features], self.value[leaves], len(self.feature_names)))
+
+    @classmethod
+    def from_forest(cls, model):
+        """Explainer of a fitted sklearn forest (trees need ``weighted_n_node_samples``)."""
+        if not hasattr(model, "estimators_"):
+            raise TypeError(f"{type(model).__name__} is not a fitted sklearn forest")
+        if hasattr(model, "feature_names_in_"):
+            feature_names = list(model.feature_names_in_)
+        else:
+            feature_names = _positional_names(model.n_features_in_)
+        paths = [_leaf_paths(estimator.tree_, len(feature_names)) for estimator in model.estimators_]
+        lower, upper, zero, value = (np.concatenate(parts) for parts in zip(*paths))
+        return cls(lower, upper, zero, value, len(model.estimators_), feature_names)
+
+    @property
+    def n_leaves(self):
+        return len(self.value)
+
+    @property
+    def expected_value(self):
+        """Prediction with every feature hidden: the forest's training mean."""
+        return float(self.value @ self.zero.prod(axis=1))
+
+    def shap_values(self, X, max_cells=4_000_000):
+        """SHAP values, shape ``(n_rows, n_features)``.
+
+        Rows are processed in blocks of at most ``max_cells`` row-leaf pairs
+        to bound memory. DataFrame columns are matched by name. Only forests
+        fitted without feature names (``x0`` ... ``x{n-1}``) take frames
+        without those names in column order.
+        """
+        if isinstance(X, pd.DataFrame):
+            missing = [name for name in self.feature_names if name not in X.columns]
+            if not missing:
+                X = X[self.feature_names]
+            elif self.feature_names != _positional_names(len(self.feature_names)):
+                raise ValueError(f"X lacks the forest's features {missing}")
+            X = X.to_numpy()
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"X has {X.shape[1]} features, the forest was fitted on {len(self.feature_names)}")
+        # Trees compare float32 inputs, like sklearn's predict
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        block = max(1, max_cells // max(self.n_leaves, 1))
+        phi = np.zeros(X.shape)
+        for start in range(0, len(X), block):
+            for group in self._groups:
+                phi[start:start + block] += group.shap_values(X[start:start + block])
+        return phi
+
+
+def explainable_forest(model, county_code=None):
+    """The sklearn forest behind ``model`` for ``county_code``, or None.
+
+    Zoo bundles are explained with the county's cluster forest; compact
+    forests keep no training covers and cannot be explained.
+    """
+    if hasattr(model, "route") and county_code is not None:
+        model = model.models[model.clusters_of([county_code])[0]]
+    return model if hasattr(model, "estimators_") else None
+
+
+class _FeatureRecorder:
+    """Model wrapper that keeps the feature matrix of every predict call."""
+
+    accepts_arrays = True
+
+    def __init__(self, model):
+        self.model = model
+        self.matrices = []
+
+    def predict(self, X):
+        self.matrices.append(np.array(X, dtype=float))
+        return self.model.predict(_model_input(self.model, X))
+
+
+def forecast_features(model, seed, horizon=DEFAULT_HORIZON):
+    """Feature rows the recursive forecast of one county feeds the model, one per month."""
+    recorder = _FeatureRecorder(model)
+    preds = forecast_batch(recorder, [seed], horizon)[0]
+    return pd.DataFrame(np.concatenate(recorder.matrices), columns=FEATURES), preds
+
+
+def explain_forecast(explainer, model, seed, horizon=DEFAULT_HORIZON):
+    """Per-month contributions: a frame with one column per feature plus ``base`` and ``prediction``.
+
+    ``model`` runs the forecast (any predictor with the explained forest's
+    predictions, such as its compact copy); ``explainer`` attributes it.
+    """
+    features, preds = forecast_features(model, seed, horizon)
+    contributions = pd.DataFrame(explainer.shap_values(features), columns=explainer.feature_names)
+    contributions.insert(0, "month", np.arange(1, horizon + 1))
+    contributions["base"] = explainer.expected_value
+    contributions["prediction"] = preds
+    return contributions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain one county's forecast month by month.")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--county", default="Kings")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    seed = build_seeds(df.dropna(subset=["Date"]))[args.county]
+    forest = explainable_forest(model, seed["county_code"])
+    if forest is None:
+        parser.error(f"{args.model} has no sklearn forest with training covers to explain")
+
+    start = time.perf_counter()
+    explainer = TreeExplainer.from_forest(forest)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    contributions = explain_forecast(explainer, forest, seed, args.horizon)
+    explained = time.perf_counter() - start
+
+    print(f"{explainer.n_trees} trees, {explainer.n_leaves:,} leaves: paths in {built:.2f} s, "
+          f"{args.horizon} months explained in {explained:.2f} s (forecast included)")
+    attributed = contributions[explainer.feature_names].sum(axis=1) + contributions["base"]
+    print(f"Largest gap between base + contributions and the prediction: "
+          f"{np.abs(attributed - contributions['prediction']).max():.2e}")
+    print(contributions.set_index("month").round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Chunked forecast exports as CSV, Parquet or Excel.
+
+Counties are forecast in chunks by the batched engine and every chunk is
+encoded as soon as it is ready, so memory stays bounded by the chunk size
+and CSV/Parquet bytes start flowing after the first chunk even for an
+all-county export. XLSX is a zip container that is only complete on close:
+rows are still flushed to disk as they are written (``constant_memory``),
+but its bytes arrive at the end.
+
+Parquet uses ``pyarrow`` (installed with Streamlit); XLSX uses
+``xlsxwriter`` (in requirements.txt, but still optional for the tools).
+Written to a file, an XLSX export goes straight into it rather than into
+memory first.
+
+:func:`export_file` keeps finished exports as files, so the app holds a
+path per session instead of the export's bytes.
+"""
+import hashlib
+import io
+import os
+import uuid
+
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, forecast_batch, forecast_frame
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+COLUMNS = ["County", "State", "Date", "Predicted EV Total", "Cumulative New EVs"]
+
+
+def forecast_chunks(model, seeds, counties, horizon=DEFAULT_HORIZON, chunk_size=128, states=None, progress=None):
+    """Yield one forecast DataFrame per chunk of ``counties``.
+
+    ``progress(done, total)`` is called with the number of counties done.
+    """
+    states = states or {}
+    for start in range(0, len(counties), chunk_size):
+        chunk = counties[start:start + chunk_size]
+        batch = seeds.select(chunk) if hasattr(seeds, "select") else [seeds[c] for c in chunk]
+        preds = forecast_batch(model, batch, horizon)
+        frames = []
+        for county, row in zip(chunk, preds):
+            frame = forecast_frame(seeds[county], row)
+            frame.insert(0, "County", county)
+            frame.insert(1, "State", states.get(county))
+            frame["Cumulative New EVs"] = frame["Predicted EV Total"].cumsum()
+            frames.append(frame)
+        yield pd.concat(frames, ignore_index=True)[COLUMNS]
+        if progress is not None:
+            progress(min(start + chunk_size, len(counties)), len(counties))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def csv_bytes(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+
+
+def parquet_bytes(frames):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema, compression="snappy")
+        # Each chunk becomes one row group
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def write_xlsx(handle, frames, sheet_name="Forecasts"):
+    """Write the chunks as one worksheet into an open binary file."""
+    try:
+        import xlsxwriter
+    except ImportError as error:
+        raise RuntimeError("XLSX export needs the xlsxwriter package: pip install xlsxwriter") from error
+
+    workbook = xlsxwriter.Workbook(handle, {
+        "constant_memory": True,
+        "in_memory": False,
+        "default_date_format": "yyyy-mm-dd",
+        "nan_inf_to_errors": True,
+    })
+    sheet = workbook.add_worksheet(sheet_name)
+    row = 0
+    for frame in frames:
+        if row == 0:
+            sheet.write_row(0, 0, list(frame.columns))
+            row = 1
+        # constant_memory flushes each finished row, so rows must be written in order
+        for record in frame.itertuples(index=False):
+            sheet.write_row(row, 0, record)
+            row += 1
+    workbook.close()
+
+
+def xlsx_bytes(frames, sheet_name="Forecasts"):
+    sink = io.BytesIO()
+    write_xlsx(sink, frames, sheet_name)
+    yield sink.getvalue()
+
+
+def export_bytes(frames, fmt="csv"):
+    """Encode an iterable of forecast chunks, yielding bytes as they are ready."""
+    if fmt == "csv":
+        return csv_bytes(frames)
+    if fmt == "parquet":
+        return parquet_bytes(frames)
+    if fmt == "xlsx":
+        return xlsx_bytes(frames)
+    raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+
+def write_export(handle, frames, fmt="csv"):
+    """Stream an export into an open binary file; returns the bytes written."""
+    if fmt == "xlsx":
+        start = handle.tell()
+        write_xlsx(handle, frames)
+        return handle.tell() - start
+    written = 0
+    for data in export_bytes(frames, fmt):
+        handle.write(data)
+        written += len(data)
+    return written
+
+
+def export_file(directory, key, fmt, frames, keep=8):
+    """Path of the export identified by ``key``, written from ``frames()`` unless already there.
+
+    Files are named by a hash of ``key`` and shared by every caller; after a
+    new one is written only the ``keep`` most recently used remain, so disk
+    use is bounded and no export has to be held in memory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    path = os.path.join(directory, f"{digest}.{FORMATS[fmt][1]}")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    # Written under a unique name first, so a concurrent build or download never sees half a file
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as handle:
+        write_export(handle, frames(), fmt)
+    os.replace(tmp, path)
+
+    finished = [os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith(".tmp")]
+    for stale in sorted(finished, key=os.path.getmtime, reverse=True)[keep:]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    return path
+
+
+def format_for(path, default="csv"):
+    """Export format implied by a file name's extension."""
+    extension = path.rsplit(".", 1)[-1].lower() if "." in path else ""
+    return next((fmt for fmt, (_, ext) in FORMATS.items() if ext == extension), default)
+
+
+def frame_chunks(frame, chunk_size=10_000):
+    """Split an already computed frame (e.g. reconciled totals) into export chunks."""
+    for start in range(0, len(frame), chunk_size):
+        yield frame.iloc[start:start + chunk_size]
+
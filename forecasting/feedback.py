@@ -0,0 +1,88 @@
+"""Non-blocking, batched persistence of the app's feedback submissions.
+
+:meth:`FeedbackWriter.submit` only puts the submission on a queue, so the
+rerun that handles a click never waits for disk. A daemon thread takes
+whatever has queued up (up to ``batch_size`` items, waiting at most
+``interval`` seconds for the first) and appends it to the ``feedback`` table
+of the forecast database in one transaction. A batch that fails to write is
+retried up to ``max_retries`` times and then logged and dropped, so one bad
+batch never blocks later submissions. Whatever is queued is flushed when
+the process exits.
+"""
+import atexit
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger("ev_forecaster.feedback")
+
+
+class FeedbackWriter:
+    def __init__(self, database, batch_size=100, interval=1.0, max_queue=10_000, max_retries=5):
+        self.database = database
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, kind, message, county=None, fingerprint=None):
+        """Queue one submission; returns False (and drops it) when the queue is full."""
+        record = (datetime.now(timezone.utc).isoformat(timespec="seconds"), kind, message, county, fingerprint)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logger.warning("feedback queue full, dropping a submission")
+            return False
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batch, failures = [], 0
+        while not (self._stop.is_set() and not batch and self._queue.empty()):
+            batch = batch or self._take_batch()
+            if not batch:
+                continue
+            try:
+                self.database.add_feedback(batch)
+            except Exception:
+                failures += 1
+                if failures <= self.max_retries:
+                    # Keep the batch and try again, e.g. after a lock held by a batch job
+                    logger.exception("writing %d feedback submissions failed; retrying", len(batch))
+                    self._stop.wait(self.interval)
+                    continue
+                # Still failing (e.g. a schema mismatch): drop it so later submissions get through
+                logger.exception("writing %d feedback submissions failed %d times; dropping them",
+                                 len(batch), failures)
+            for _ in batch:
+                self._queue.task_done()
+            batch, failures = [], 0
+
+    def flush(self):
+        """Block until everything submitted so far is written."""
+        self._queue.join()
+
+    def close(self, timeout=10.0):
+        """Write what is queued and stop the thread."""
+        self._stop.set()
+        self._thread.join(timeout)
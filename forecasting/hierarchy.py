@@ -0,0 +1,149 @@
+"""Statewide and national totals reconciled with the county forecasts.
+
+Every county is forecast in one batch onto a common calendar: counties
+whose data stop before the latest month are simply forecast for more steps,
+so all rows line up month by month. The hierarchy is a summing matrix ``S``
+whose rows are the national total, each state and each county. Aggregate
+rows get their own base forecast (a least-squares trend of the recent
+aggregated series) and all levels are reconciled in one matrix product::
+
+    reconciled = S @ G @ base,    G = (S' W^-1 S)^-1 S' W^-1
+
+``method="bottom_up"`` uses only the county forecasts; ``"ols"``,
+``"wls_struct"`` and ``"wls_var"`` are MinT-style estimators with identity,
+structural (number of counties below a node) and recent-variance ``W``.
+Counties pushed below zero by the reconciliation are set to zero and the
+aggregates re-summed, so every level still adds up.
+
+The bottom level is keyed by ``(state, county)``: county names repeat across
+states ("Lake" is in four), so each pair gets its own seed built from that
+state's rows (:func:`state_county_seeds`). The model itself is keyed by
+county name, so the pairs of one name share its county code.
+"""
+import numpy as np
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, HISTORY_WINDOW, county_seed, forecast_batch
+
+METHODS = ("bottom_up", "ols", "wls_struct", "wls_var")
+NATIONAL = "All states"
+
+
+def state_county_seeds(df):
+    """Seeds keyed by ``(state, county)``, each from that state's rows only."""
+    return {
+        (state, county): county_seed(rows.sort_values("Date"), county)
+        for (state, county), rows in df.groupby(["State", "County"], sort=True)
+    }
+
+
+def calendar_gaps(seeds, end_date=None):
+    """Months between each seed's latest date and ``end_date`` (default: the latest seed)."""
+    latest = pd.DatetimeIndex([seed["latest_date"] for seed in seeds])
+    end = latest.max() if end_date is None else pd.Timestamp(end_date)
+    return (end.year - latest.year) * 12 + (end.month - latest.month), end
+
+
+def calendar_forecasts(model, seeds, horizon=DEFAULT_HORIZON, progress=None):
+    """County forecasts on the common calendar.
+
+    Returns ``(window, preds, end)``: the last ``HISTORY_WINDOW`` months up
+    to ``end`` (observed where available, forecast through each county's
+    gap) and the ``horizon`` months after ``end``, both ``(len(seeds), ...)``.
+    """
+    gaps, end = calendar_gaps(seeds)
+    gaps = np.asarray(gaps)
+    steps = horizon + int(gaps.max(initial=0))
+    raw = forecast_batch(model, seeds, steps, progress=progress)
+
+    history = np.zeros((len(seeds), HISTORY_WINDOW))
+    for row, seed in enumerate(seeds):
+        values = np.asarray(seed["history"], dtype=float)[-HISTORY_WINDOW:]
+        history[row, HISTORY_WINDOW - len(values):] = values
+    extended = np.hstack([history, raw])
+
+    rows = np.arange(len(seeds))[:, None]
+    window = extended[rows, gaps[:, None] + np.arange(HISTORY_WINDOW)]
+    preds = extended[rows, HISTORY_WINDOW + gaps[:, None] + np.arange(horizon)]
+    return window, preds, end
+
+
+def summing_matrix(counties):
+    """Summing matrix and row labels ``(level, state, county)`` for ``(state, county)`` pairs."""
+    state_names = sorted({state for state, _ in counties})
+    labels = [("national", NATIONAL, None)]
+    labels += [("state", state, None) for state in state_names]
+    labels += [("county", state, county) for state, county in counties]
+
+    membership = np.array([[s == state for s, _ in counties] for state in state_names], dtype=float)
+    S = np.vstack([np.ones((1, len(counties))), membership, np.eye(len(counties))])
+    return S, labels
+
+
+def trend_forecast(window, horizon):
+    """Least-squares linear trend of each row of ``window``, extrapolated and floored at zero."""
+    x = np.arange(window.shape[1], dtype=float)
+    slope, intercept = np.polyfit(x, window.T, 1)
+    future = np.arange(window.shape[1], window.shape[1] + horizon, dtype=float)
+    return np.maximum(intercept[:, None] + slope[:, None] * future, 0)
+
+
+def reconcile(base, S, method="wls_struct", window=None):
+    """Reconcile stacked base forecasts ``(len(S), horizon)`` so every level adds up."""
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}; expected one of {', '.join(METHODS)}")
+    n_bottom = S.shape[1]
+    if method == "bottom_up":
+        return S @ base[-n_bottom:]
+
+    if method == "ols":
+        weights = np.ones(len(S))
+    elif method == "wls_struct":
+        weights = S.sum(axis=1)
+    else:
+        if window is None:
+            raise ValueError("method='wls_var' needs the recent window of every series")
+        weights = np.var(np.diff(window, axis=1), axis=1)
+    # Series with no recent variation keep (almost) their base forecast
+    inv_w = 1 / np.maximum(weights, 1e-6)
+
+    StW = S.T * inv_w
+    G = np.linalg.solve(StW @ S, StW)
+    return S @ np.maximum(G @ base, 0)
+
+
+def reconciled_forecast(model, seeds, horizon=DEFAULT_HORIZON, method="wls_struct", progress=None):
+    """Base and reconciled forecasts for every level as a long DataFrame.
+
+    Columns: Level, State, County, Date, Base, Reconciled. ``seeds`` maps
+    ``(state, county)`` to seed, as :func:`state_county_seeds` builds them.
+    """
+    counties = sorted(seeds)
+    county_window, county_preds, end = calendar_forecasts(
+        model, [seeds[c] for c in counties], horizon, progress=progress,
+    )
+    S, labels = summing_matrix(counties)
+
+    n_agg = len(S) - len(counties)
+    window = S @ county_window
+    base = np.vstack([trend_forecast(window[:n_agg], horizon), county_preds])
+    reconciled = reconcile(base, S, method, window)
+
+    dates = [end + pd.DateOffset(months=i) for i in range(1, horizon + 1)]
+    level, state, county = zip(*labels)
+    return pd.DataFrame({
+        "Level": np.repeat(level, horizon),
+        "State": np.repeat(state, horizon),
+        "County": np.repeat(np.array(county, dtype=object), horizon),
+        "Date": np.tile(dates, len(labels)),
+        "Base": base.ravel(),
+        "Reconciled": reconciled.ravel(),
+    })
+
+
+def county_shares(frame, state):
+    """Each county's share of ``state``'s reconciled new EVs over the horizon."""
+    counties = frame[(frame["Level"] == "county") & (frame["State"] == state)]
+    totals = counties.groupby("County")["Reconciled"].sum()
+    shares = totals / totals.sum() if totals.sum() > 0 else totals * 0
+    return pd.DataFrame({"Forecast EVs": totals, "Share": shares}).sort_values("Forecast EVs", ascending=False)
@@ -0,0 +1,288 @@
+"""Prometheus text-format metrics for the forecaster.
+
+The app feeds a process-wide :class:`AppMetrics` from its forecast and data
+loading paths. The metrics can be scraped from a small HTTP endpoint
+(``EV_FORECASTER_METRICS_PORT``) or written periodically to a file
+(``EV_FORECASTER_METRICS_FILE``) for the node-exporter textfile collector.
+
+Run ``python -m forecasting.metrics`` to forecast a few counties, serve the
+metrics on a local port and print one scrape of them.
+"""
+import argparse
+import math
+import os
+import resource
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+# === Metric types ===
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        self.name = name
+        self.help = help_text
+        self._callback = callback
+        self._value = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def samples(self):
+        value = self._callback() if self._callback is not None else self._value
+        if value is None:
+            return []
+        return [(self.name, {}, value)]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for idx, upper in enumerate(self.buckets):
+                if value <= upper:
+                    self._counts[idx] += 1
+                    break
+            self._sum += value
+            self._count += 1
+
+    def samples(self):
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        samples = []
+        cumulative = 0
+        for upper, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            samples.append((f"{self.name}_bucket", {"le": _format_value(upper)}, cumulative))
+        samples.append((f"{self.name}_sum", {}, total))
+        samples.append((f"{self.name}_count", {}, count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes():
+    """Current resident set size, falling back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# === App metrics ===
+class AppMetrics:
+    """The forecaster's metrics, fed by the engine and the app's loaders."""
+
+    def __init__(self, cache=None):
+        self.registry = MetricsRegistry()
+        self.cache = cache
+        self.forecasts_served = self.registry.register(Counter(
+            "ev_forecasts_served_total", "County forecasts returned, by whether they came from the cache."))
+        self.predict_latency = self.registry.register(Histogram(
+            "ev_predict_latency_seconds", "Latency of model.predict calls.", LATENCY_BUCKETS))
+        self.predict_batch_size = self.registry.register(Histogram(
+            "ev_predict_batch_size", "Rows per model.predict call.", BATCH_BUCKETS))
+        self.registry.register(Gauge(
+            "ev_forecast_cache_hit_ratio", "Share of forecast lookups served from the cache.",
+            callback=self._cache_hit_ratio))
+        self.registry.register(Gauge(
+            "ev_forecast_cache_entries", "Forecasts currently held in the cache.",
+            callback=lambda: len(self.cache) if self.cache is not None else None))
+        self.dataset_load_seconds = self.registry.register(Gauge(
+            "ev_dataset_load_seconds", "Time taken by the most recent dataset load."))
+        self.dataset_loads = self.registry.register(Counter(
+            "ev_dataset_loads_total", "Dataset loads (cache misses of load_data)."))
+        self.registry.register(Gauge(
+            "ev_process_resident_memory_bytes", "Resident memory of the app process.",
+            callback=process_rss_bytes))
+
+    def _cache_hit_ratio(self):
+        if self.cache is None:
+            return None
+        lookups = self.cache.hits + self.cache.misses
+        return self.cache.hits / lookups if lookups else 0.0
+
+    def observe_predict(self, seconds, batch_size):
+        """Predict observer for :func:`forecasting.engine.add_predict_observer`."""
+        self.predict_latency.observe(seconds)
+        self.predict_batch_size.observe(batch_size)
+
+    def observe_forecasts(self, cached, computed):
+        if cached:
+            self.forecasts_served.inc(cached, source="cache")
+        if computed:
+            self.forecasts_served.inc(computed, source="computed")
+
+    def observe_dataset_load(self, seconds):
+        self.dataset_load_seconds.set(seconds)
+        self.dataset_loads.inc()
+
+    def render(self):
+        return self.registry.render()
+
+
+# === Exporters ===
+def serve(metrics, port, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread; returns the running server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(metrics, path):
+    """Atomically write the current metrics to ``path``."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(metrics.render())
+    os.replace(tmp_path, path)
+
+
+def start_file_writer(metrics, path, interval=15.0):
+    """Rewrite ``path`` every ``interval`` seconds from a daemon thread."""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            write_file(metrics, path)
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    return stop
+
+
+def scrape(url, timeout=5.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def main():
+    import joblib
+    import pandas as pd
+
+    from .engine import ForecastCache, add_predict_observer, build_seeds, cached_forecasts
+
+    parser = argparse.ArgumentParser(description="Serve forecaster metrics locally and print one scrape.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--counties", type=int, default=5, help="number of counties to forecast")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    args = parser.parse_args()
+
+    cache = ForecastCache()
+    metrics = AppMetrics(cache)
+    add_predict_observer(metrics.observe_predict)
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    metrics.observe_dataset_load(time.perf_counter() - start)
+
+    model = joblib.load(args.model)
+    seeds = build_seeds(df)
+    counties = sorted(seeds)[:args.counties]
+    # Second pass is served from the cache
+    for _ in range(2):
+        cached_forecasts(model, cache, "local", seeds, counties, metrics=metrics)
+
+    server = serve(metrics, args.port)
+    try:
+        print(scrape(f"http://127.0.0.1:{server.server_port}/metrics"), end="")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
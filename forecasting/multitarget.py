@@ -0,0 +1,188 @@
+"""BEV / PHEV / percent-electric forecasts from the same feature pass.
+
+The shipped model predicts only ``Electric Vehicle (EV) Total``. A small
+multi-output "breakdown" forest trained on the same features predicts the
+BEV share of that total and ``Percent Electric Vehicles``. :class:`JointModel`
+evaluates both forests on the feature matrix the engine builds each month,
+so one recursive pass yields every series. BEVs and PHEVs always add up to
+the forecast total, as they do in the data.
+
+For a forecast that was already made (the app's is usually cached or
+prefetched), :func:`breakdown_outputs` rebuilds its monthly feature rows
+from the seed and the forecast totals with the engine's own feature code
+and runs the breakdown forest once on all of them, without calling the EV
+total model again. Its lags are the forecast's monthly totals as stored,
+i.e. rounded to whole vehicles.
+
+Usage::
+
+    python -m forecasting.multitarget --output forecasting_ev_breakdown.pkl
+"""
+import argparse
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, FEATURES, TARGET, build_seeds, forecast_batch
+
+BEV = "Battery Electric Vehicles (BEVs)"
+PHEV = "Plug-In Hybrid Electric Vehicles (PHEVs)"
+PERCENT = "Percent Electric Vehicles"
+
+# Columns of JointModel.predict and of forecast_breakdown's last axis
+OUTPUTS = ["Predicted EV Total", "Predicted BEVs", "Predicted PHEVs", "Predicted Percent Electric"]
+
+
+def breakdown_targets(df):
+    """Rows with EVs and their ``(BEV share, percent electric)`` targets."""
+    rows = df[df[TARGET] > 0]
+    return rows, np.column_stack([rows[BEV] / rows[TARGET], rows[PERCENT]])
+
+
+def train_breakdown(df, n_estimators=40, max_depth=12, random_state=42):
+    """Fit the multi-output breakdown forest on the model's features."""
+    # Imported on first training only, so importing this module stays cheap for the app
+    from sklearn.ensemble import RandomForestRegressor
+
+    rows, y = breakdown_targets(df)
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                  random_state=random_state, n_jobs=-1)
+    model.fit(rows[FEATURES], y)
+    # Forecast batches are small; thread start-up would dominate
+    return model.set_params(n_jobs=1)
+
+
+def _outputs(total, share, percent):
+    bev = total * np.clip(share, 0, 1)
+    return np.column_stack([total, bev, total - bev, np.clip(percent, 0, 100)])
+
+
+class JointModel:
+    """The EV total model and the breakdown forest behind one ``predict``.
+
+    ``predict`` returns ``(n_rows, 4)`` columns in :data:`OUTPUTS` order.
+    """
+
+    accepts_arrays = False
+
+    def __init__(self, model, breakdown):
+        self.model = model
+        self.breakdown = breakdown
+
+    def predict(self, X):
+        total = self.model.predict(X)
+        share, percent = self.breakdown.predict(X).T
+        return _outputs(total, share, percent)
+
+
+class _Replay:
+    """Stand-in model that "predicts" a given forecast and keeps the feature rows."""
+
+    accepts_arrays = True
+
+    def __init__(self, totals):
+        self.totals = iter(totals)
+        self.rows = []
+
+    def predict(self, X):
+        self.rows.append(np.array(X, dtype=float))
+        return np.full(len(X), next(self.totals), dtype=float)
+
+
+def replay_features(seed, totals):
+    """Feature rows, one per month, of the recursive forecast of ``totals`` from ``seed``."""
+    replay = _Replay(totals)
+    forecast_batch(replay, [seed], len(totals))
+    return np.concatenate(replay.rows)
+
+
+def forecast_breakdown(model, breakdown, seeds, horizon=DEFAULT_HORIZON, progress=None):
+    """Forecast every output for ``seeds``; returns ``(len(seeds), horizon, 4)``.
+
+    The EV total column is identical to :func:`forecast_batch` with ``model``.
+    """
+    outputs = np.empty((len(seeds), horizon, len(OUTPUTS)))
+
+    def adjust(step, pred, lag1):
+        # Keep every output and feed only the EV total back as the next lag
+        outputs[:, step] = pred
+        return pred[:, 0]
+
+    forecast_batch(JointModel(model, breakdown), seeds, horizon, progress=progress, adjust=adjust)
+    return outputs
+
+
+def breakdown_outputs(breakdown, seed, totals):
+    """Every output ``(len(totals), 4)`` for a forecast of ``totals`` made from ``seed``.
+
+    One breakdown predict over all months; the EV total column is ``totals``.
+    """
+    totals = np.asarray(totals, dtype=float)
+    X = pd.DataFrame(replay_features(seed, totals), columns=FEATURES)
+    share, percent = breakdown.predict(X).T
+    return _outputs(totals, share, percent)
+
+
+def breakdown_frame(seed, outputs):
+    """Turn one county's outputs into a forecast DataFrame like ``forecast_frame``."""
+    dates = [seed["latest_date"] + pd.DateOffset(months=i) for i in range(1, len(outputs) + 1)]
+    frame = pd.DataFrame(outputs, columns=OUTPUTS)
+    frame.insert(0, "Date", dates)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the BEV/PHEV/percent breakdown forest and time the joint forecast.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--output", default="forecasting_ev_breakdown.pkl")
+    parser.add_argument("--estimators", type=int, default=40)
+    parser.add_argument("--max-depth", type=int, default=12)
+    parser.add_argument("--holdout-months", type=int, default=6, help="most recent months held out for scoring")
+    args = parser.parse_args()
+
+    from sklearn.metrics import mean_absolute_error
+
+    from .retrain import holdout_split
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+
+    # Score on the most recent months against a constant-mean baseline, then refit on every row
+    train, test = holdout_split(df, args.holdout_months)
+    holdout = train_breakdown(train, args.estimators, args.max_depth)
+    _, y_train = breakdown_targets(train)
+    rows, y_test = breakdown_targets(test)
+    y_pred = holdout.predict(rows[FEATURES])
+    baseline = np.broadcast_to(y_train.mean(axis=0), y_test.shape)
+    for name, pred in [("breakdown", y_pred), ("mean baseline", baseline)]:
+        print(f"Hold-out MAE ({name}): BEVs {mean_absolute_error(rows[BEV], pred[:, 0] * rows[TARGET]):.3f}, "
+              f"percent electric {mean_absolute_error(y_test[:, 1], pred[:, 1]):.3f} points")
+
+    breakdown = train_breakdown(df, args.estimators, args.max_depth)
+    joblib.dump(breakdown, args.output, compress=3)
+
+    seeds = list(build_seeds(df).values())
+    start = time.perf_counter()
+    forecast_batch(model, seeds)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    forecast_breakdown(model, breakdown, seeds)
+    joint = time.perf_counter() - start
+    print(f"{len(seeds)} counties x {DEFAULT_HORIZON} months: EV total only {single:.2f} s, "
+          f"all outputs {joint:.2f} s (x{joint / single:.2f})")
+    seed = seeds[0]
+    totals = np.round(forecast_batch(model, [seed])[0])
+    start = time.perf_counter()
+    breakdown_outputs(breakdown, seed, totals)
+    print(f"Breakdown of one existing forecast: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"Breakdown model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Background prefetching of likely-next county forecasts.
+
+After a county is shown, the next pick is usually a nearby county or one of
+the counties users ask for most. The prefetcher forecasts those in a small
+thread pool and stores the results in the shared :class:`ForecastCache`, so
+the next selection is a cache hit instead of a month-by-month forecast loop.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from .engine import DEFAULT_HORIZON, ForecastCache, forecast_batch, forecast_frame
+
+
+def county_neighbors(seeds, states, county, limit=4):
+    """Counties a user is likely to look at after ``county``.
+
+    The dataset has no geometry, so "adjacent" means counties in the same
+    state (largest EV counts first) followed by the entries either side of
+    ``county`` in the alphabetical selector list.
+    """
+    names = sorted(seeds)
+    same_state = [c for c in names if c != county and states.get(c) == states.get(county)]
+    same_state.sort(key=lambda c: seeds[c]["history"][-1], reverse=True)
+
+    selector = []
+    if county in seeds:
+        idx = names.index(county)
+        selector = names[max(idx - 1, 0):idx] + names[idx + 1:idx + 2]
+
+    # Keep room for the selector neighbours ahead of the rest of the state
+    split = max(limit - len(selector), 0)
+    neighbors = same_state[:split] + selector + same_state[split:]
+
+    unique = []
+    for name in neighbors:
+        if name != county and name not in unique:
+            unique.append(name)
+    return unique[:limit]
+
+
+class ForecastPrefetcher:
+    """Warm the forecast cache for the counties most likely to be picked next.
+
+    CPU use is bounded by ``max_workers`` and ``max_batch`` (counties per
+    prefetch), memory by the cache's own entry limit. One prefetcher serves
+    every session: a new prefetch only cancels (between forecast steps) the
+    previous one of the same session, and :meth:`retarget` moves it to a new
+    model or dataset version without starting another thread pool.
+    """
+
+    def __init__(self, model, seeds, states, cache, fingerprint,
+                 horizon=DEFAULT_HORIZON, top_k=3, max_neighbors=4,
+                 max_batch=8, max_workers=1):
+        self.model = model
+        self.seeds = seeds
+        self.states = states
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.horizon = horizon
+        self.top_k = top_k
+        self.max_neighbors = max_neighbors
+        self.max_batch = max_batch
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._selections = Counter()
+        # session -> (cancel event, future) of its latest prefetch
+        self._pending = {}
+
+    def retarget(self, model, seeds, states, fingerprint):
+        """Prefetch for another model or dataset version from now on.
+
+        Prefetches still running for the old version are cancelled.
+        """
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            self.model, self.seeds, self.states, self.fingerprint = model, seeds, states, fingerprint
+        self.cancel()
+
+    def record_selection(self, county):
+        with self._lock:
+            self._selections[county] += 1
+
+    def top_counties(self):
+        """Most-requested counties, falling back to the largest ones before any selections."""
+        with self._lock:
+            popular = [c for c, _ in self._selections.most_common(self.top_k)]
+        if len(popular) < self.top_k:
+            largest = sorted(self.seeds, key=lambda c: self.seeds[c]["history"][-1], reverse=True)
+            popular.extend(c for c in largest if c not in popular)
+        return popular[:self.top_k]
+
+    def candidates(self, county, horizon=None):
+        """Uncached counties to prefetch after ``county`` is shown."""
+        horizon = horizon or self.horizon
+        wanted = county_neighbors(self.seeds, self.states, county, self.max_neighbors)
+        wanted += self.top_counties()
+
+        result = []
+        for name in wanted:
+            key = ForecastCache.key(self.fingerprint, name, horizon)
+            if name != county and name in self.seeds and name not in result and key not in self.cache:
+                result.append(name)
+        return result[:self.max_batch]
+
+    def schedule(self, county, horizon=None, session=None):
+        """Start a prefetch for the counties around ``county``.
+
+        It replaces the prefetch ``session`` scheduled before, if that one
+        is still running; other sessions' prefetches are left alone.
+        ``horizon`` defaults to the prefetcher's; pass the one being viewed.
+        """
+        horizon = horizon or self.horizon
+        counties = self.candidates(county, horizon)
+        self.cancel(session)
+        if not counties:
+            return None
+
+        cancel = threading.Event()
+        with self._lock:
+            # The version is fixed per prefetch, so a retarget can't mix models and keys
+            version = (self.model, self.seeds, self.fingerprint)
+            future = self._executor.submit(self._run, version, counties, horizon, cancel)
+            self._pending[session] = (cancel, future)
+        future.add_done_callback(lambda done: self._forget(session, done))
+        return future
+
+    def _forget(self, session, future):
+        with self._lock:
+            if session in self._pending and self._pending[session][1] is future:
+                del self._pending[session]
+
+    def cancel(self, session=None):
+        """Cancel the running prefetch of ``session``, or of every session when None."""
+        with self._lock:
+            if session is None:
+                pending = list(self._pending.values())
+                self._pending.clear()
+            else:
+                pending = [self._pending.pop(session)] if session in self._pending else []
+        for cancel, future in pending:
+            cancel.set()
+            future.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, version, counties, horizon, cancel):
+        model, seeds, fingerprint = version
+        batch = [seeds[c] for c in counties]
+        preds = forecast_batch(model, batch, horizon, should_stop=cancel.is_set)
+        if preds is None:
+            return []
+        for seed, row in zip(batch, preds):
+            key = ForecastCache.key(fingerprint, seed["county"], horizon)
+            self.cache.put(key, forecast_frame(seed, row))
+        return counties
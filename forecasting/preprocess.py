@@ -0,0 +1,173 @@
+"""The notebook's preprocessing and feature engineering as plain functions.
+
+These are the steps of ``EV_Adotion_Forecasting_Model.ipynb`` as it is
+committed, so they can be benchmarked and rerun without the notebook.
+
+They do not reproduce the shipped ``preprocessed_ev_data.csv``, which was
+written by an earlier run: on the shipped raw export they give 12,573 rows
+against its 11,170. Its ``Percent Electric Vehicles`` is not capped (it
+reaches 100 against an upper bound of about 6.9), its county histories start
+later (Ada in 2018-10 rather than 2018-05) and it has 260 counties rather
+than 269. Every row it does have matches one here on county, date, use and
+EV total. The app and the CLIs keep reading the shipped file.
+
+:func:`preprocess_csv` reads the raw export in chunks instead and bounds
+the outliers with a mergeable quantile sketch (:mod:`forecasting.sketch`),
+so the raw file is read once and the cap never needs the whole raw column
+in memory.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from .engine import TARGET
+from .sketch import QuantileSketch
+
+OUTLIER_COLUMN = "Percent Electric Vehicles"
+RAW_NUMERIC_COLUMNS = [
+    "Battery Electric Vehicles (BEVs)",
+    "Plug-In Hybrid Electric Vehicles (PHEVs)",
+    "Electric Vehicle (EV) Total",
+    "Non-Electric Vehicle Total",
+    "Total Vehicles",
+    "Percent Electric Vehicles",
+]
+
+
+def clean_raw(df):
+    """Parse dates, drop rows without a date or target and fill missing County/State."""
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    df = df[df["Date"].notnull()]
+    df = df[df[TARGET].notnull()]
+    for col in ["County", "State"]:
+        df[col] = df[col].fillna("Unknown")
+    return df
+
+
+def iqr_bounds(values):
+    """Outlier bounds at 1.5 IQR outside the quartiles of ``values``.
+
+    ``values`` is a Series (exact quartiles) or a
+    :class:`~forecasting.sketch.QuantileSketch` (approximate quartiles).
+    """
+    q1 = values.quantile(0.25)
+    q3 = values.quantile(0.75)
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def cap_outliers(df, bounds, column=OUTLIER_COLUMN):
+    """Clip ``column`` to ``(lower, upper)``, keeping every row."""
+    df = df.copy()
+    lower, upper = bounds
+    df[column] = df[column].clip(lower, upper)
+    return df
+
+
+def to_numeric(df):
+    df = df.copy()
+    for col in RAW_NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def _rolling_slope(values):
+    return np.polyfit(range(len(values)), values, 1)[0] if len(values) == 6 else np.nan
+
+
+def engineer_features(df):
+    """Add the date parts, county encoding, lags, rolling stats and growth slope.
+
+    Returns the feature frame (early rows without full lags dropped) and the
+    fitted ``LabelEncoder`` for ``County``.
+    """
+    df = df.copy()
+    df["Year"] = df["Date"].dt.year
+    df["Month"] = df["Date"].dt.month
+    df["Day"] = df["Date"].dt.day
+
+    encoder = LabelEncoder()
+    df["county_encoded"] = encoder.fit_transform(df["County"])
+
+    df = df.sort_values(["County", "Date"])
+    grouped = df.groupby("County")[TARGET]
+    df["months_since_start"] = df.groupby("County").cumcount()
+
+    for lag in [1, 2, 3]:
+        df[f"ev_total_lag{lag}"] = grouped.shift(lag)
+
+    df["ev_total_roll_mean_3"] = grouped.transform(lambda x: x.shift(1).rolling(3).mean())
+    df["ev_total_pct_change_1"] = grouped.pct_change(periods=1, fill_method=None)
+    df["ev_total_pct_change_3"] = grouped.pct_change(periods=3, fill_method=None)
+    for col in ["ev_total_pct_change_1", "ev_total_pct_change_3"]:
+        df[col] = df[col].replace([np.inf, -np.inf], np.nan).fillna(0)
+
+    df["cumulative_ev"] = grouped.cumsum()
+    df["ev_growth_slope"] = df.groupby("County")["cumulative_ev"].transform(
+        lambda x: x.rolling(6).apply(_rolling_slope)
+    )
+
+    df = df.dropna().reset_index(drop=True)
+    return df, encoder
+
+
+def preprocess(raw):
+    """Run the full notebook pipeline on the raw county export."""
+    # As in the notebook, the bounds come from the raw column before cleaning
+    bounds = iqr_bounds(raw[OUTLIER_COLUMN])
+    df = clean_raw(raw)
+    df = cap_outliers(df, bounds)
+    df = to_numeric(df)
+    return engineer_features(df)
+
+
+def _prepare_chunk(raw, k, seed):
+    sketch = QuantileSketch(k, seed).update(pd.to_numeric(raw[OUTLIER_COLUMN], errors="coerce"))
+    return sketch, clean_raw(raw)
+
+
+def preprocess_csv(path, chunksize=100_000, workers=1, k=200, seed=0):
+    """:func:`preprocess` of a raw CSV read in chunks, with sketched outlier bounds.
+
+    Every chunk is sketched and cleaned once, across ``workers`` processes;
+    the merged sketch bounds the cap. The quartiles are within the sketch's
+    rank error (about 1.3% with ``k=200``) of the exact ones.
+
+    Only the quartiles are streamed. The lag features need each county's
+    whole history, so the cleaned chunks are kept, capped one at a time and
+    concatenated: peak memory still grows with the cleaned dataset, as in
+    :func:`preprocess`.
+    """
+    seeds = np.random.SeedSequence(seed)
+    sketch = QuantileSketch(k, seeds.spawn(1)[0])
+    cleaned = []
+
+    def collect(result):
+        chunk_sketch, frame = result
+        sketch.merge(chunk_sketch)
+        cleaned.append(frame)
+
+    chunks = pd.read_csv(path, chunksize=chunksize)
+    if workers == 1:
+        for raw in chunks:
+            collect(_prepare_chunk(raw, k, seeds.spawn(1)[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for raw in chunks:
+                pending.append(pool.submit(_prepare_chunk, raw, k, seeds.spawn(1)[0]))
+                # Only a few raw chunks are in flight at a time
+                if len(pending) >= 2 * workers:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+    bounds = iqr_bounds(sketch)
+    for i, frame in enumerate(cleaned):
+        cleaned[i] = to_numeric(cap_outliers(frame, bounds))
+    df = pd.concat(cleaned, ignore_index=True)
+    cleaned.clear()
+    return engineer_features(df)
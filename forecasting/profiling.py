@@ -0,0 +1,131 @@
+"""Lightweight timing spans for the app's hot path.
+
+Each named section of a rerun is wrapped in ``profiler.span(name)``; every
+duration lands in a rolling window per span so the admin panel can show
+recent percentiles and a latency histogram. When the profiler is disabled
+``span`` returns a shared no-op context manager, so the instrumentation costs
+one attribute check per section.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
+
+logger = logging.getLogger("ev_forecaster.perf")
+
+_NULL_SPAN = nullcontext()
+
+# Histogram bucket edges in milliseconds
+HISTOGRAM_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+
+
+class RollingHistogram:
+    """Durations of the most recent ``window`` occurrences of one span."""
+
+    def __init__(self, window=500):
+        self._samples = deque(maxlen=window)
+        self.total_count = 0
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.total_count += 1
+
+    def summary(self):
+        samples_ms = np.array(self._samples) * 1000
+        if samples_ms.size == 0:
+            return {"count": self.total_count}
+        return {
+            "count": self.total_count,
+            "mean_ms": float(samples_ms.mean()),
+            "p50_ms": float(np.percentile(samples_ms, 50)),
+            "p95_ms": float(np.percentile(samples_ms, 95)),
+            "p99_ms": float(np.percentile(samples_ms, 99)),
+            "max_ms": float(samples_ms.max()),
+        }
+
+    def buckets(self):
+        """Counts per :data:`HISTOGRAM_EDGES_MS` bucket, labelled by upper edge."""
+        counts, _ = np.histogram(np.array(self._samples) * 1000, bins=HISTOGRAM_EDGES_MS)
+        labels = [f"≤{edge:g} ms" if edge != float("inf") else "> 5000 ms" for edge in HISTOGRAM_EDGES_MS[1:]]
+        return dict(zip(labels, counts.tolist()))
+
+
+class _Span:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.record(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class Profiler:
+    """Collects span durations from every session of the app process."""
+
+    def __init__(self, enabled=False, window=500):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds, **fields):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.add(seconds)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"span": name, "ms": round(seconds * 1000, 3), **fields}))
+
+    def observe_predict(self, seconds, batch_size):
+        """Predict observer for :func:`forecasting.engine.add_predict_observer`."""
+        self.record("model.predict", seconds, rows=batch_size)
+
+    def summary(self):
+        """One row per span with rolling percentiles, slowest p95 first."""
+        with self._lock:
+            rows = [{"span": name, **hist.summary()} for name, hist in self._histograms.items()]
+        return sorted(rows, key=lambda row: row.get("p95_ms", 0), reverse=True)
+
+    def buckets(self, name):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            return histogram.buckets() if histogram is not None else {}
+
+    def span_names(self):
+        with self._lock:
+            return sorted(self._histograms)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def configure_perf_log(path):
+    """Write span records as JSON lines to ``path`` (once per process)."""
+    if any(getattr(h, "_ev_perf_log", False) for h in logger.handlers):
+        return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter('{"ts": "%(asctime)s", "record": %(message)s}'))
+    handler._ev_perf_log = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
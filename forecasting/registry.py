@@ -0,0 +1,210 @@
+"""Versioned model registry with hot swapping for the running app.
+
+A registry is a directory of versions plus a pointer to the live one::
+
+    registry/
+        CURRENT                 # name of the live version, replaced atomically
+        v0001/model.pkl
+        v0001/metadata.json     # version, fingerprint, created, metrics
+        v0002/...
+
+:class:`RegistryWatcher` polls ``CURRENT`` from a background thread. When it
+changes, the new version is loaded (and optionally warmed up) off the request
+path, then swapped in with a single reference assignment, so sessions keep
+using the old model until the new one is ready.
+
+Usage::
+
+    python -m forecasting.registry --root model_registry publish forecasting_ev_model.pkl --metrics compact_report.json
+    python -m forecasting.registry --root model_registry list
+    python -m forecasting.registry --root model_registry activate v0001
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+import joblib
+
+from .engine import content_fingerprint
+
+logger = logging.getLogger("ev_forecaster.registry")
+
+POINTER = "CURRENT"
+ARTIFACT = "model.pkl"
+METADATA = "metadata.json"
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as handle:
+        handle.write(text)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    def __init__(self, root):
+        self.root = root
+
+    def versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(os.path.join(self.root, name, METADATA)))
+
+    def current(self):
+        """Name of the live version, or ``None`` for an empty registry."""
+        try:
+            with open(os.path.join(self.root, POINTER)) as handle:
+                return handle.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, METADATA)) as handle:
+            return json.load(handle)
+
+    def artifact(self, version):
+        return os.path.join(self.root, version, ARTIFACT)
+
+    def load(self, version):
+        return joblib.load(self.artifact(version))
+
+    def publish(self, model_path, metrics=None, activate=True):
+        """Copy ``model_path`` in as the next version and return its name."""
+        existing = self.versions()
+        version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+        directory = os.path.join(self.root, version)
+        os.makedirs(directory)
+
+        shutil.copyfile(model_path, self.artifact(version))
+        metadata = {
+            "version": version,
+            "fingerprint": content_fingerprint(self.artifact(version)),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source": os.path.abspath(model_path),
+            "size_bytes": os.path.getsize(model_path),
+            "metrics": metrics or {},
+        }
+        _write_atomic(os.path.join(directory, METADATA), json.dumps(metadata, indent=2, default=float))
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        if version not in self.versions():
+            raise ValueError(f"unknown version {version!r} in {self.root}")
+        os.makedirs(self.root, exist_ok=True)
+        _write_atomic(os.path.join(self.root, POINTER), version + "\n")
+
+
+class RegistryWatcher:
+    """Keep the live registry version loaded and swap in new versions in the background.
+
+    ``prepare(model, fingerprint)`` runs on the watcher thread before a new
+    version goes live (e.g. to pre-compute popular forecasts);
+    ``on_switch(old_fingerprint, new_fingerprint)`` callbacks run right after.
+    """
+
+    def __init__(self, registry, interval=5.0, prepare=None):
+        self.registry = registry
+        self.interval = interval
+        self.prepare = prepare
+        self._callbacks = []
+        self._active = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def active(self):
+        """``(version, fingerprint, model)`` currently being served."""
+        return self._active
+
+    def on_switch(self, callback):
+        self._callbacks.append(callback)
+
+    def start(self):
+        """Load the live version synchronously, then poll for changes."""
+        version = self.registry.current()
+        if version is None:
+            raise FileNotFoundError(f"no active model version in {self.registry.root}")
+        self._active = self._load(version)
+        self._thread = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        """Switch to the registry's live version if it changed; returns True on a switch."""
+        version = self.registry.current()
+        if version is None or version == self._active[0]:
+            return False
+
+        start = time.perf_counter()
+        loaded = self._load(version)
+        if self.prepare is not None:
+            self.prepare(loaded[2], loaded[1])
+        old = self._active
+        # A single reference assignment: readers see the old or the new tuple, never a mix
+        self._active = loaded
+        logger.info("switched model %s -> %s in %.2f s", old[0], version, time.perf_counter() - start)
+        for callback in self._callbacks:
+            callback(old[1], loaded[1])
+        return True
+
+    def _load(self, version):
+        metadata = self.registry.metadata(version)
+        return version, metadata["fingerprint"], self.registry.load(version)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # Keep serving the current version; a broken upload must not take the app down
+                logger.exception("model registry check failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish, list and activate model versions.")
+    parser.add_argument("--root", default="model_registry", help="registry directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    publish = commands.add_parser("publish", help="add a model artifact as the next version")
+    publish.add_argument("model")
+    publish.add_argument("--metrics", help="JSON file stored as the version's metrics (e.g. a compact or retrain report)")
+    publish.add_argument("--no-activate", action="store_true", help="publish without making it live")
+
+    commands.add_parser("list", help="list versions")
+
+    activate = commands.add_parser("activate", help="make a version live (also used to roll back)")
+    activate.add_argument("version")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == "publish":
+        metrics = None
+        if args.metrics:
+            with open(args.metrics) as handle:
+                metrics = json.load(handle)
+        version = registry.publish(args.model, metrics, activate=not args.no_activate)
+        print(f"Published {version}" + ("" if args.no_activate else " (live)"))
+    elif args.command == "activate":
+        registry.activate(args.version)
+        print(f"{args.version} is live")
+    else:
+        current = registry.current()
+        for version in registry.versions():
+            metadata = registry.metadata(version)
+            marker = "*" if version == current else " "
+            print(f"{marker} {version}  {metadata['fingerprint']}  {metadata['created']}  "
+                  f"{metadata['size_bytes'] / 1e6:.1f} MB  {os.path.basename(metadata['source'])}")
+
+
+if __name__ == "__main__":
+    main()
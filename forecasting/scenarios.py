@@ -0,0 +1,120 @@
+"""What-if scenarios evaluated as extra rows of the batched forecast.
+
+The growth multiplier and the cap rewrite each month's prediction before it
+is fed back as the next lag, so their effect compounds through the recursive
+forecast. A shock is a level change: the recursion runs on the unshocked
+path and only the reported months are scaled, so a +20% shock means 20%
+more new EVs each month rather than 20% more every month on top of the last.
+All scenarios for a county are forecast together: one predict call per month
+covers every scenario trajectory.
+
+Usage::
+
+    python -m forecasting.scenarios --shock 0.2 --shock-start 1
+"""
+import argparse
+import sys
+import warnings
+from typing import NamedTuple, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .engine import DEFAULT_HORIZON, build_seeds, forecast_batch
+
+
+class Scenario(NamedTuple):
+    name: str
+    # Multiplier on the model's month-over-month change
+    growth: float = 1.0
+    # Relative change in the reported months from ``shock_start`` (1-based) on
+    shock: float = 0.0
+    shock_start: int = 1
+    # Upper bound on monthly EV totals
+    cap: Optional[float] = None
+
+
+BASELINE = Scenario("Baseline")
+
+PRESETS = [
+    Scenario("Slow adoption", growth=0.8),
+    Scenario("Fast adoption", growth=1.2),
+]
+
+
+def scenario_adjuster(scenarios):
+    """Vectorized ``adjust`` callback for :func:`forecasting.engine.forecast_batch`.
+
+    Applies the growth multiplier and the cap; shocks are applied by
+    :func:`scenario_forecasts` to the reported months only.
+    """
+    growth = np.array([s.growth for s in scenarios], dtype=float)
+    cap = np.array([np.inf if s.cap is None else s.cap for s in scenarios], dtype=float)
+
+    def adjust(step, pred, lag1):
+        # Leave rows with growth 1.0 untouched so the baseline stays bit-identical
+        pred = np.where(growth != 1.0, lag1 + (pred - lag1) * growth, pred)
+        return np.minimum(pred, cap)
+
+    return adjust
+
+
+def shock_factors(scenarios, horizon):
+    """Per-month multipliers ``(len(scenarios), horizon)`` of each scenario's shock."""
+    shock = np.array([s.shock for s in scenarios], dtype=float)[:, None]
+    shock_start = np.array([s.shock_start for s in scenarios])[:, None]
+    return np.where(np.arange(1, horizon + 1) >= shock_start, 1 + shock, 1.0)
+
+
+def scenario_forecasts(model, seeds, scenarios, horizon=DEFAULT_HORIZON):
+    """Forecast ``scenarios[i]`` from ``seeds[i]``; returns ``(len(seeds), horizon)``."""
+    preds = forecast_batch(model, seeds, horizon, adjust=scenario_adjuster(scenarios))
+    cap = np.array([np.inf if s.cap is None else s.cap for s in scenarios], dtype=float)
+    return np.minimum(preds * shock_factors(scenarios, horizon), cap[:, None])
+
+
+def forecast_scenarios(model, seed, scenarios, horizon=DEFAULT_HORIZON):
+    """Forecast every scenario for one county; returns ``(len(scenarios), horizon)``."""
+    return scenario_forecasts(model, [seed] * len(scenarios), scenarios, horizon)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that a shock changes every county's monthly adoption by that fraction.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--shock", type=float, default=0.2)
+    parser.add_argument("--shock-start", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed error of the adoption ratio")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    seeds = build_seeds(df)
+
+    # Every county's baseline and shocked runs share one predict call per month
+    counties = list(seeds)
+    shocked = Scenario("Shock", shock=args.shock, shock_start=args.shock_start)
+    preds = scenario_forecasts(model, [seeds[c] for c in counties] * 2,
+                               [BASELINE] * len(counties) + [shocked] * len(counties), args.horizon)
+    months = slice(args.shock_start - 1, None)
+    baseline = preds[:len(counties), months].sum(axis=1)
+    scenario = preds[len(counties):, months].sum(axis=1)
+    # Counties forecast to add no EVs have no ratio to check
+    moving = baseline > 0
+    errors = np.abs(scenario[moving] / baseline[moving] - (1 + args.shock))
+    worst = errors.max()
+    worst_county = np.array(counties)[moving][errors.argmax()]
+
+    print(f"Shock {args.shock:+.0%} from month {args.shock_start}: monthly adoption ratio is within "
+          f"{worst:.2e} of {1 + args.shock:.2f} for every county (worst: {worst_county})")
+    if worst > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
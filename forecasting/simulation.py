@@ -0,0 +1,184 @@
+"""Monte Carlo trajectories for forecast fan charts.
+
+The point forecast feeds each prediction back as the next lag, so its
+uncertainty never propagates. Here every county is expanded into many
+trajectories that each draw a different prediction at every step, either
+from one randomly chosen tree of the forest (``method="trees"``) or as the
+forest mean plus a bootstrapped backtest residual (``method="residual"``).
+Draws are fed back like the point forecast, all trajectories advance in the
+batched engine, and large county sets are split across a process pool.
+
+Usage::
+
+    python -m forecasting.simulation --paths 1000 --workers 4
+"""
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .compact import CompactForest, backtest_split, compact_forest
+from .engine import DEFAULT_HORIZON, FEATURES, TARGET, build_seeds, forecast_batch
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class TreeSampler:
+    """Model wrapper whose prediction for each row comes from one random tree."""
+
+    accepts_arrays = True
+
+    def __init__(self, forest, rng):
+        self.forest = forest
+        self.rng = rng
+
+    def predict(self, X):
+        tree_index = self.rng.integers(0, self.forest.n_estimators, size=len(X))
+        return self.forest.predict_sampled(X, tree_index)
+
+
+class ResidualSampler:
+    """Model wrapper adding a bootstrapped residual to every prediction."""
+
+    accepts_arrays = True
+
+    def __init__(self, model, residuals, rng):
+        self.model = model
+        self.residuals = np.asarray(residuals, dtype=float)
+        self.rng = rng
+
+    def predict(self, X):
+        if not getattr(self.model, "accepts_arrays", False):
+            X = pd.DataFrame(X, columns=FEATURES)
+        noise = self.rng.choice(self.residuals, size=len(X))
+        # EV counts cannot go negative
+        return np.maximum(self.model.predict(X) + noise, 0)
+
+
+def as_forest(model):
+    """The :class:`CompactForest` form of ``model`` (exact for full forests)."""
+    return model if isinstance(model, CompactForest) else compact_forest(model)
+
+
+def backtest_residuals(model, df):
+    """Residuals of ``model`` on the notebook's hold-out rows."""
+    _, test = backtest_split(df)
+    return (test[TARGET] - model.predict(test[FEATURES])).to_numpy()
+
+
+def simulate(model, seeds, n_paths=1000, horizon=DEFAULT_HORIZON, method="trees",
+             residuals=None, random_state=None):
+    """Simulate ``n_paths`` trajectories per seed; returns ``(len(seeds), n_paths, horizon)``."""
+    rng = np.random.default_rng(random_state)
+    if method == "trees":
+        sampler = TreeSampler(as_forest(model), rng)
+    elif method == "residual":
+        if residuals is None:
+            raise ValueError("method='residual' needs backtest residuals")
+        sampler = ResidualSampler(model, residuals, rng)
+    else:
+        raise ValueError(f"unknown method {method!r}; expected 'trees' or 'residual'")
+
+    rows = [seed for seed in seeds for _ in range(n_paths)]
+    preds = forecast_batch(sampler, rows, horizon)
+    return preds.reshape(len(seeds), n_paths, horizon)
+
+
+# === Process pool ===
+_worker_model = None
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _simulate_chunk(seeds, n_paths, horizon, method, residuals, random_state):
+    return simulate(_worker_model, seeds, n_paths, horizon, method, residuals, random_state)
+
+
+def simulate_parallel(model, seeds, n_paths=1000, horizon=DEFAULT_HORIZON, method="trees",
+                      residuals=None, workers=None, chunk_size=8, random_state=None):
+    """:func:`simulate` split into county chunks across a process pool.
+
+    Each chunk gets its own child seed, so results are reproducible for a
+    given ``random_state`` regardless of the worker count.
+    """
+    if method == "trees":
+        model = as_forest(model)
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    child_seeds = np.random.SeedSequence(random_state).spawn(len(chunks))
+    if workers == 1 or len(chunks) == 1:
+        results = [simulate(model, chunk, n_paths, horizon, method, residuals, child)
+                   for chunk, child in zip(chunks, child_seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model,)) as pool:
+            futures = [pool.submit(_simulate_chunk, chunk, n_paths, horizon, method, residuals, child)
+                       for chunk, child in zip(chunks, child_seeds)]
+            results = [future.result() for future in futures]
+    return np.concatenate(results, axis=0)
+
+
+def fan_percentiles(paths, percentiles=PERCENTILES):
+    """Percentiles of cumulative new EVs per month: ``{p: (n_seeds, horizon)}``."""
+    cumulative = np.cumsum(paths, axis=-1)
+    values = np.percentile(cumulative, percentiles, axis=-2)
+    return dict(zip(percentiles, values))
+
+
+def summarize(seeds, paths, percentiles=PERCENTILES):
+    """Long-format fan chart table: one row per county and forecast month."""
+    fans = fan_percentiles(paths, percentiles)
+    horizon = paths.shape[-1]
+    frames = []
+    for row, seed in enumerate(seeds):
+        frame = pd.DataFrame({
+            "County": seed["county"],
+            "Date": [seed["latest_date"] + pd.DateOffset(months=i) for i in range(1, horizon + 1)],
+        })
+        for p in percentiles:
+            frame[f"p{p}"] = fans[p][row]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate forecast trajectories and report throughput.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--paths", type=int, default=1000, help="trajectories per county")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON)
+    parser.add_argument("--method", choices=["trees", "residual"], default="trees")
+    parser.add_argument("--counties", type=int, help="only the first N counties")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=8, help="counties per worker task")
+    parser.add_argument("--output", help="write the percentile table to this CSV")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    seeds = list(build_seeds(df).values())[:args.counties]
+    residuals = backtest_residuals(model, df) if args.method == "residual" else None
+
+    start = time.perf_counter()
+    paths = simulate_parallel(model, seeds, args.paths, args.horizon, args.method, residuals,
+                              workers=args.workers, chunk_size=args.chunk_size, random_state=0)
+    elapsed = time.perf_counter() - start
+
+    trajectories = len(seeds) * args.paths
+    print(f"{trajectories:,} trajectories x {args.horizon} months ({len(seeds)} counties, "
+          f"{args.workers} workers) in {elapsed:.2f} s: {trajectories / elapsed:,.0f} trajectories/s")
+    if args.output:
+        summarize(seeds, paths).to_csv(args.output, index=False)
+        print(f"Percentiles written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
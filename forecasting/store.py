@@ -0,0 +1,116 @@
+"""Persisted per-county seed store for forecasting without pandas.
+
+A forecast only needs each county's latest state: the last six monthly
+totals, the county code, ``months_since_start``, the latest date and the
+state. :func:`build_store` extracts that once per dataset version into a
+structured NumPy array that is saved next to the dataset, keyed by the
+dataset fingerprint. Later runs load it with ``np.load`` and hand it (or a
+selection of its rows) straight to :func:`forecasting.engine.forecast_batch`.
+"""
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from .engine import HISTORY_WINDOW, build_seeds, file_fingerprint
+
+STORE_DIR = ".feature_store"
+
+
+def seed_dtype(name_length=64):
+    return np.dtype([
+        ("county", f"U{name_length}"),
+        ("state", "U8"),
+        ("county_code", "f8"),
+        # Left-padded with zeros; n_history counts the real months
+        ("history", "f8", (HISTORY_WINDOW,)),
+        ("n_history", "i8"),
+        ("months_since_start", "f8"),
+        ("latest_date", "datetime64[ns]"),
+    ])
+
+
+def build_store(df):
+    """One record per county, sorted by county name."""
+    seeds = build_seeds(df)
+    # Seeds are keyed by county name like the model; a name in several states keeps its
+    # first (see forecasting.hierarchy for the per-(state, county) totals)
+    states = df.groupby("County")["State"].first()
+    records = np.zeros(len(seeds), dtype=seed_dtype(max((len(c) for c in seeds), default=1)))
+    for row, (county, seed) in enumerate(seeds.items()):
+        history = seed["history"]
+        record = records[row]
+        record["county"] = county
+        record["state"] = states[county]
+        record["county_code"] = seed["county_code"]
+        record["history"][HISTORY_WINDOW - len(history):] = history
+        record["n_history"] = len(history)
+        record["months_since_start"] = seed["months_since_start"]
+        record["latest_date"] = np.datetime64(seed["latest_date"], "ns")
+    return records
+
+
+def store_path(data_path):
+    """Where the store of the current version of ``data_path`` lives."""
+    directory = os.path.join(os.path.dirname(os.path.abspath(data_path)), STORE_DIR)
+    name = os.path.splitext(os.path.basename(data_path))[0]
+    return os.path.join(directory, f"{name}-{file_fingerprint(data_path)}.npy")
+
+
+def load_store(data_path, read_data=None):
+    """Load the store for ``data_path``, building and saving it on first use.
+
+    ``read_data(path)`` returns the prepared DataFrame when a build is
+    needed; by default the CSV is read and its dates parsed.
+    """
+    path = store_path(data_path)
+    if os.path.exists(path):
+        return SeedStore(np.load(path))
+
+    if read_data is None:
+        def read_data(data_path):
+            df = pd.read_csv(data_path)
+            df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+            return df.dropna(subset=["Date"])
+    records = build_store(read_data(data_path))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, records)
+    os.replace(tmp, path)
+    return SeedStore(records)
+
+
+class SeedStore(Mapping):
+    """County -> seed mapping over the structured records.
+
+    Items are plain seed dicts like :func:`forecasting.engine.county_seed`
+    returns, so existing callers keep working; :meth:`select` returns the
+    raw records that ``forecast_batch`` consumes without any per-row work.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        self._index = {str(county): row for row, county in enumerate(records["county"])}
+
+    def __getitem__(self, county):
+        record = self.records[self._index[county]]
+        return {
+            "county": county,
+            "county_code": float(record["county_code"]),
+            "history": record["history"][HISTORY_WINDOW - record["n_history"]:].copy(),
+            "months_since_start": float(record["months_since_start"]),
+            "latest_date": pd.Timestamp(record["latest_date"]),
+        }
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def select(self, counties):
+        return self.records[[self._index[c] for c in counties]]
+
+    def states(self):
+        return dict(zip(self._index, (str(s) for s in self.records["state"])))
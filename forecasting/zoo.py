@@ -0,0 +1,181 @@
+"""Per-cluster model zoo with county routing.
+
+One global forest treats ``county_encoded`` as a number, so tiny rural
+counties and the largest metro counties share every split. The zoo
+clusters counties by size and growth profile, trains one smaller forest per
+cluster in a process pool and bundles them with a county -> cluster routing
+table. :func:`forecasting.engine.forecast_batch` routes each county's rows
+once and then calls every sub-model on its own matrix each month.
+
+Usage::
+
+    python -m forecasting.zoo --clusters 4 --trees 50 --workers 4 \\
+        --output forecasting_ev_zoo.pkl --report zoo_report.json
+
+Serve the bundle by pointing ``EV_FORECASTER_MODEL`` at it.
+"""
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from .baseline import county_arrays
+from .engine import FEATURES, TARGET
+
+
+class ModelZoo:
+    """One regressor per county cluster behind a single ``predict``."""
+
+    accepts_arrays = False
+
+    def __init__(self, models, routing, counties, default):
+        self.models = models
+        # county_encoded -> index into models
+        self.routing = routing
+        # County name -> cluster, for reports and the app
+        self.counties = counties
+        # Cluster used for county codes the zoo was not trained on
+        self.default = default
+
+    @property
+    def n_clusters(self):
+        return len(self.models)
+
+    def clusters_of(self, codes):
+        return np.array([self.routing.get(int(code), self.default) for code in codes])
+
+    def route(self, codes):
+        """Group row indices by cluster: ``[(sub_model, rows), ...]``."""
+        clusters = self.clusters_of(codes)
+        return [(self.models[k], np.flatnonzero(clusters == k)) for k in np.unique(clusters)]
+
+    def predict(self, X):
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, columns=FEATURES)
+        pred = np.empty(len(X))
+        for sub_model, rows in self.route(X["county_encoded"].to_numpy()):
+            pred[rows] = sub_model.predict(X.iloc[rows])
+        return pred
+
+
+def county_profiles(df):
+    """Size and growth profile of every county, one row per county."""
+    counties, values = county_arrays(df)
+    recent = values[:, -12:]
+    with warnings.catch_warnings():
+        # Counties without data in a half-year get NaN means, replaced below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        first_half = np.nanmean(recent[:, :6], axis=1)
+        second_half = np.nanmean(recent[:, 6:], axis=1)
+        return pd.DataFrame({
+            "log_total": np.log1p(np.nansum(values, axis=1)),
+            "log_recent": np.log1p(np.nan_to_num(np.nanmean(recent, axis=1))),
+            "growth": np.nan_to_num(np.log1p(second_half) - np.log1p(first_half)),
+            "months": (~np.isnan(values)).sum(axis=1),
+        }, index=pd.Index(counties, name="County"))
+
+
+def cluster_counties(profiles, n_clusters=4, random_state=42):
+    """K-means cluster label for every county from its standardized profile."""
+    from sklearn.cluster import KMeans
+
+    scaled = (profiles - profiles.mean()) / profiles.std(ddof=0).replace(0, 1)
+    labels = KMeans(n_clusters=n_clusters, n_init=10, random_state=random_state).fit_predict(scaled)
+    return pd.Series(labels, index=profiles.index, name="cluster")
+
+
+def _train_cluster(rows, n_estimators, max_depth, random_state):
+    from sklearn.ensemble import RandomForestRegressor
+
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                  random_state=random_state, n_jobs=1)
+    return model.fit(rows[FEATURES], rows[TARGET])
+
+
+def train_zoo(df, n_clusters=4, n_estimators=50, max_depth=None, workers=None, random_state=42, clusters=None):
+    """Cluster the counties of ``df`` and fit one forest per cluster in parallel.
+
+    ``clusters`` (county -> label) reuses an existing assignment instead of
+    clustering ``df`` again.
+    """
+    if clusters is None:
+        clusters = cluster_counties(county_profiles(df), n_clusters, random_state)
+    labels = sorted(clusters.unique())
+    row_clusters = df["County"].map(clusters)
+    parts = [df[row_clusters == label] for label in labels]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_train_cluster, part, n_estimators, max_depth, random_state) for part in parts]
+        models = [future.result() for future in futures]
+
+    index = {label: i for i, label in enumerate(labels)}
+    codes = df.groupby("County")["county_encoded"].first()
+    routing = {int(codes[c]): index[label] for c, label in clusters.items() if c in codes}
+    counties = {c: index[label] for c, label in clusters.items()}
+    default = int(np.argmax([len(part) for part in parts]))
+    return ModelZoo(models, routing, counties, default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a per-cluster model zoo and compare it with the global forest.")
+    parser.add_argument("--model", default="forecasting_ev_model.pkl")
+    parser.add_argument("--data", default="preprocessed_ev_data.csv")
+    parser.add_argument("--output", default="forecasting_ev_zoo.pkl")
+    parser.add_argument("--report", help="write the report as JSON to this path")
+    parser.add_argument("--clusters", type=int, default=4)
+    parser.add_argument("--trees", type=int, default=50, help="trees per cluster model")
+    parser.add_argument("--max-depth", type=int, help="depth cap of the cluster models")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--holdout-months", type=int, default=6, help="most recent months held out for scoring")
+    args = parser.parse_args()
+
+    from .retrain import full_retrain, holdout_split, score
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    model = joblib.load(args.model)
+    df = pd.read_csv(args.data)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+
+    profiles = county_profiles(df)
+    clusters = cluster_counties(profiles, args.clusters)
+    print("Clusters (mean profile):")
+    print(profiles.join(clusters).groupby("cluster").agg(counties=("months", "size"), log_total=("log_total", "mean"),
+                                          growth=("growth", "mean"), months=("months", "mean")).round(2).to_string())
+
+    # Score a zoo trained without the hold-out, then refit on every row
+    train, holdout = holdout_split(df, args.holdout_months)
+    start = time.perf_counter()
+    scored = train_zoo(train, n_estimators=args.trees, max_depth=args.max_depth,
+                       workers=args.workers, clusters=clusters)
+    train_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    global_model = full_retrain(model, train)
+    global_seconds = time.perf_counter() - start
+    rows = [
+        {"model": f"global ({len(global_model.estimators_)} trees)", "train_seconds": global_seconds,
+         **score(global_model, holdout)},
+        {"model": f"zoo ({args.clusters} x {args.trees} trees)", "train_seconds": train_seconds,
+         **score(scored, holdout)},
+    ]
+    print(f"Hold-out: last {args.holdout_months} months, {len(holdout)} rows")
+    print(pd.DataFrame(rows).set_index("model").round(4).to_string())
+
+    zoo = train_zoo(df, n_estimators=args.trees, max_depth=args.max_depth, workers=args.workers, clusters=clusters)
+    joblib.dump(zoo, args.output, compress=3)
+    print(f"Model zoo written to {args.output}")
+    if args.report:
+        with open(args.report, "w") as handle:
+            json.dump({"clusters": {c: int(k) for c, k in zoo.counties.items()}, "results": rows},
+                      handle, indent=2, default=float)
+
+
+if __name__ == "__main__":
+    # Run from the package module so pickles reference forecasting.zoo, not __main__
+    from forecasting.zoo import main as package_main
+    package_main()